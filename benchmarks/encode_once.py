@@ -0,0 +1,91 @@
+"""
+Compare total CPU time of the per-chapter WAV path against encode-once.
+
+Per-chapter path (default pipeline):
+    sf.write int16 WAV per chapter -> merge_audio_files to mp3 -> AAC re-encode
+    of the merged mp3 (the audio half of create_full_video_with_thumbnails).
+Encode-once path:
+    PCM streamed into one StreamingBookEncoder producing mp3 + AAC, followed by
+    a stream-copy remux of the AAC (what the video stage does in this mode).
+
+Synthetic speech-like PCM stands in for Kokoro output, so only the audio
+plumbing is measured. CPU time includes ffmpeg child processes.
+
+Usage (from the repository root):
+    python -m benchmarks.encode_once --chapters 12 --minutes 5
+"""
+import argparse
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from core.services.encoder import StreamingBookEncoder, DEFAULT_SAMPLE_RATE
+from output import merge_audio_files
+
+
+def cpu_seconds():
+    """CPU time (user + system) of this process and its waited-for children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def synthetic_chapter(minutes, seed):
+    """Amplitude-modulated tones, roughly speech-like in level and spectrum."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(minutes * 60 * DEFAULT_SAMPLE_RATE)) / DEFAULT_SAMPLE_RATE
+    carrier = np.sin(2 * np.pi * (180 + 40 * np.sin(2 * np.pi * 0.3 * t)) * t)
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3.0 * t + rng.uniform(0, np.pi))
+    audio = carrier * envelope + 0.02 * rng.standard_normal(t.shape)
+    return (audio / np.max(np.abs(audio)) * 32767 * 0.95).astype(np.int16)
+
+
+def measure(label, func):
+    start_cpu, start_wall = cpu_seconds(), time.perf_counter()
+    func()
+    cpu, wall = cpu_seconds() - start_cpu, time.perf_counter() - start_wall
+    print(f"  {label:<22} cpu {cpu:7.2f}s   wall {wall:7.2f}s")
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chapters', type=int, default=12)
+    parser.add_argument('--minutes', type=float, default=5.0, help='Minutes of audio per chapter')
+    args = parser.parse_args()
+
+    chapters = [synthetic_chapter(args.minutes, seed) for seed in range(args.chapters)]
+    print(f"Book: {args.chapters} chapters x {args.minutes} min")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        chapter_dir = os.path.join(work_dir, 'chapter_audio')
+        os.makedirs(chapter_dir)
+
+        def per_chapter_path():
+            for i, pcm in enumerate(chapters):
+                sf.write(os.path.join(chapter_dir, f"{i:03d}_chapter.wav"), pcm, DEFAULT_SAMPLE_RATE)
+            merged = os.path.join(work_dir, 'legacy', 'book.mp3')
+            merge_audio_files(chapter_dir, merged, 'mp3')
+            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", merged, "-c:a", "aac",
+                            os.path.join(work_dir, 'legacy', 'book_video_audio.m4a')], check=True)
+
+        def encode_once_path():
+            base = os.path.join(work_dir, 'once', 'book')
+            with StreamingBookEncoder(f"{base}.mp3", aac_output=f"{base}.m4a") as encoder:
+                for i, pcm in enumerate(chapters):
+                    encoder.write_chapter(f"{i:03d}_chapter", pcm)
+            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", f"{base}.m4a", "-c:a", "copy",
+                            f"{base}_video_audio.m4a"], check=True)
+
+        legacy_cpu = measure("per-chapter WAV path", per_chapter_path)
+        once_cpu = measure("encode-once path", encode_once_path)
+        print(f"  CPU time saved: {legacy_cpu - once_cpu:.2f}s ({(1 - once_cpu / legacy_cpu) * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark every encoding profile stage by stage over a reference chapter set.
+
+For each profile in ENCODING_PROFILES this runs the output stages with that
+profile and reports wall time, CPU-seconds (this process plus ffmpeg
+children), and output size:
+    audio  - merge_audio_files to mp3
+    aac    - create_m4b_audiobook, encoding the merged mp3 to AAC
+    video  - create_full_video_with_thumbnails
+    shorts - create_shorts
+
+The reference set is a directory of chapter WAVs (e.g. io/input_pool/chapter_audio).
+If none is given, synthetic speech-like chapters are used.
+
+Usage (from the repository root):
+    python -m benchmarks.encoding_profiles [--chapters-dir DIR] [--thumbnail IMG] [--stages audio,aac,video,shorts]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import soundfile as sf
+
+from benchmarks.encode_once import cpu_seconds, synthetic_chapter
+from core.services.encoder import DEFAULT_SAMPLE_RATE
+from core.services.profiles import ENCODING_PROFILES, STAGES
+from output import (merge_audio_files, create_m4b_audiobook, create_full_video_with_thumbnails,
+                    create_shorts, audio_duration_seconds)
+
+
+def output_size(paths):
+    return sum(os.path.getsize(path) for path in paths) / 1e6
+
+
+def run_stage(stage, profile, chapters_dir, thumbnail, work_dir):
+    """Run one stage with one profile; returns the paths of what it wrote."""
+    out_dir = os.path.join(work_dir, profile, stage)
+    merged = os.path.join(work_dir, profile, 'audio', 'book.mp3')
+    if stage == 'audio':
+        timestamps = merge_audio_files(chapters_dir, merged, 'mp3', profile=profile)
+        return [merged], timestamps
+    timestamps = run_stage.timestamps[profile]
+    duration = audio_duration_seconds(merged, timestamps)
+    if stage == 'aac':
+        return [create_m4b_audiobook(merged, timestamps, 'book', out_dir, profile=profile)], None
+    if stage == 'video':
+        os.makedirs(out_dir, exist_ok=True)
+        return [create_full_video_with_thumbnails(merged, thumbnail, 'book', out_dir, duration=duration,
+                                                  profile=profile)], None
+    return create_shorts(merged, 'book', out_dir, duration=duration, profile=profile), None
+run_stage.timestamps = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chapters-dir', help='Directory of chapter WAVs (default: synthetic)')
+    parser.add_argument('--chapters', type=int, default=6, help='Synthetic chapters')
+    parser.add_argument('--minutes', type=float, default=2.0, help='Minutes per synthetic chapter')
+    parser.add_argument('--thumbnail', help='Thumbnail image (default: synthetic test card)')
+    parser.add_argument('--stages', default=','.join(STAGES), help='Comma-separated stages to run')
+    args = parser.parse_args()
+    stages = [stage for stage in STAGES if stage in args.stages.split(',')]
+    if stages and stages[0] != 'audio':
+        stages.insert(0, 'audio') # Every other stage encodes the merged audio
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        chapters_dir = args.chapters_dir
+        if not chapters_dir:
+            chapters_dir = os.path.join(work_dir, 'chapters')
+            os.makedirs(chapters_dir)
+            for i in range(args.chapters):
+                sf.write(os.path.join(chapters_dir, f"{i:03d}_chapter.wav"),
+                         synthetic_chapter(args.minutes, i), DEFAULT_SAMPLE_RATE)
+        thumbnail = args.thumbnail
+        if not thumbnail:
+            thumbnail = os.path.join(work_dir, 'thumbnail.png')
+            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc2=size=1280x720",
+                            "-frames:v", "1", thumbnail], check=True)
+
+        rows = []
+        for profile in ENCODING_PROFILES:
+            for stage in stages:
+                start_cpu, start_wall = cpu_seconds(), time.perf_counter()
+                paths, timestamps = run_stage(stage, profile, chapters_dir, thumbnail, work_dir)
+                rows.append((profile, stage, time.perf_counter() - start_wall, cpu_seconds() - start_cpu,
+                             output_size(paths)))
+                if timestamps:
+                    run_stage.timestamps[profile] = timestamps
+
+        print(f"\n  {'profile':<10} {'stage':<8} {'wall s':>8} {'cpu s':>8} {'size MB':>9}")
+        for profile, stage, wall, cpu, size in rows:
+            print(f"  {profile:<10} {stage:<8} {wall:8.2f} {cpu:8.2f} {size:9.2f}")
+
+
+if __name__ == '__main__':
+    main()
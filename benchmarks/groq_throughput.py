@@ -0,0 +1,69 @@
+"""
+Throughput of GroqModel against AsyncGroqModel on the local stub endpoint.
+
+Both send --requests completions to benchmarks.stub_llm_server:
+    sync    GroqModel, one blocking request at a time
+    async   AsyncGroqModel, --concurrency in flight on the shared pool,
+            --rpm token bucket (0 = unlimited)
+With --error-rate the stub answers that fraction of requests with 429, and
+the async client's retries, failures and peak concurrency are reported.
+
+Usage (from the repository root):
+    python -m benchmarks.groq_throughput --requests 64 --latency 0.2 --concurrency 8 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stub_llm_server import start_stub_server
+
+
+def prompts(count):
+    return [[{"role": "user", "content": f"Prompt {i}: repair this hyphen- ated text."}] for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.2, help='Stub seconds per response')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rpm', type=int, default=0, help='Async requests per minute (0 = no limit)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub answers that are 429s')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, error_rate=args.error_rate)
+    os.environ['GROQ_BASE_URL'] = base_url
+    os.environ.setdefault('GROQ_API_KEY', 'stub')
+    from core.models.groq import GroqModel, AsyncGroqModel, GroqModelError # After pointing them at the stub
+
+    print(f"{args.requests} completions, stub latency {args.latency}s, 429 rate {args.error_rate:.0%}")
+
+    model, failures = GroqModel(), 0
+    start = time.perf_counter()
+    for messages in prompts(args.requests):
+        try:
+            model.generate_response(messages)
+        except GroqModelError:
+            failures += 1
+    wall = time.perf_counter() - start
+    print(f"  sync   {wall:6.2f}s   {args.requests / wall:6.1f} req/s   failures {failures}")
+
+    async def run_async():
+        async_model = AsyncGroqModel(max_concurrency=args.concurrency, requests_per_minute=args.rpm or None,
+                                     burst=args.concurrency)
+        server.max_in_flight = 0
+        start = time.perf_counter()
+        results = await async_model.generate_responses(prompts(args.requests))
+        wall = time.perf_counter() - start
+        await AsyncGroqModel.aclose_shared()
+        failed = sum(isinstance(result, GroqModelError) for result in results)
+        print(f"  async  {wall:6.2f}s   {args.requests / wall:6.1f} req/s   failures {failed}   "
+              f"retries {async_model.stats['retries']}   peak in flight {server.max_in_flight}")
+
+    asyncio.run(run_async())
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark chapter overlap detection on synthetic books with many TOC entries.
+
+Compares the rolling-hash `remove_overlap` against the previous
+line-list implementation (kept here as `legacy_remove_overlap`) and checks
+that both remove the same overlaps when fuzzy matching is disabled.
+
+Usage (from the repository root):
+    python -m benchmarks.overlap --chapters 500 --lines 400 --window 50
+"""
+import argparse
+import random
+import time
+
+from core.services import extract
+from core.services.extract import remove_overlap
+
+
+def legacy_remove_overlap(prev_text, curr_text, num_lines=20):
+    """The original quadratic implementation, for comparison only."""
+    if not prev_text or not curr_text:
+        return prev_text
+    prev_lines = prev_text.splitlines()
+    curr_lines = curr_text.splitlines()
+    if not prev_lines or not curr_lines:
+        return prev_text
+    max_possible_overlap = min(len(prev_lines), len(curr_lines), num_lines)
+    for overlap_size in range(max_possible_overlap, 0, -1):
+        if prev_lines[-overlap_size:] == curr_lines[:overlap_size]:
+            return "\n".join(prev_lines[:-overlap_size])
+    return prev_text
+
+
+def make_chapters(num_chapters, lines_per_chapter, overlap_ratio=0.5, seed=1):
+    """Build cleaned-looking chapter texts where roughly `overlap_ratio` share a page with their successor."""
+    rng = random.Random(seed)
+    words = "the of and to in a is that for it as was with be by on not he this are or his from at which".split()
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(6, 16))).capitalize() + " ."
+
+    chapters = []
+    for _ in range(num_chapters):
+        chapters.append([sentence() for _ in range(lines_per_chapter)])
+    for i in range(1, num_chapters):
+        if rng.random() < overlap_ratio:
+            shared = rng.randint(1, 15) # Chapters starting mid-page repeat the tail of the previous one
+            chapters[i - 1].extend(chapters[i][:shared])
+    return ["\n".join(lines) for lines in chapters]
+
+
+def run(func, chapters, repeat, **kwargs):
+    best = float('inf')
+    results = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(chapters[i], chapters[i + 1], **kwargs) for i in range(len(chapters) - 1)]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chapters', type=int, default=500, help='Number of TOC entries/chapters')
+    parser.add_argument('--lines', type=int, default=400, help='Lines per chapter')
+    parser.add_argument('--window', type=int, default=50, help='Overlap window in lines')
+    parser.add_argument('--repeat', type=int, default=3, help='Best-of-N timing repeats')
+    args = parser.parse_args()
+
+    chapters = make_chapters(args.chapters, args.lines)
+    total_mb = sum(len(c) for c in chapters) / 1e6
+    print(f"Synthetic book: {args.chapters} chapters, {args.lines} lines each ({total_mb:.1f} MB), window={args.window}")
+
+    # Silence the per-overlap log line while timing
+    extract.print = lambda *a, **k: None
+    try:
+        legacy_time, legacy_results = run(legacy_remove_overlap, chapters, args.repeat, num_lines=args.window)
+        exact_time, exact_results = run(remove_overlap, chapters, args.repeat, num_lines=args.window, fuzzy=False)
+        fuzzy_time, _ = run(remove_overlap, chapters, args.repeat, num_lines=args.window, fuzzy=True)
+    finally:
+        del extract.print
+
+    removed = sum(1 for i, r in enumerate(exact_results) if r != chapters[i])
+    print(f"  legacy (splitlines + slice scan): {legacy_time * 1000:8.1f} ms")
+    print(f"  rolling hash, exact             : {exact_time * 1000:8.1f} ms  ({legacy_time / exact_time:.1f}x)")
+    print(f"  rolling hash, fuzzy             : {fuzzy_time * 1000:8.1f} ms  ({legacy_time / fuzzy_time:.1f}x)")
+    print(f"  overlaps removed: {removed} / {len(chapters) - 1}")
+    print(f"  results identical to legacy (exact mode): {exact_results == legacy_results}")
+
+
+if __name__ == '__main__':
+    main()
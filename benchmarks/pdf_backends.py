@@ -0,0 +1,83 @@
+"""
+Compare PDF text-extraction backends on the books/ PDFs.
+
+For every backend in PDF_TEXT_BACKENDS this reports pages/sec (best of N),
+peak memory, output size and how far the output differs from the default
+'blocks' backend. Each backend runs in a fresh process so peak RSS numbers
+are not polluted by earlier runs.
+
+Usage (from the repository root):
+    python -m benchmarks.pdf_backends [--repeat 3] [pdf ...]
+"""
+import argparse
+import difflib
+import glob
+import multiprocessing
+import resource
+import time
+import tracemalloc
+
+import fitz
+
+from core.services.extract import DEFAULT_PDF_BACKEND, PDF_TEXT_BACKENDS, extract_pdf_text_by_page
+
+
+def run_backend(pdf_path, backend, repeat):
+    """Worker: extract all pages `repeat` times, return timing, memory and the page texts."""
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best = float('inf')
+    pages = None
+    tracemalloc.start()
+    for _ in range(repeat):
+        doc = fitz.open(pdf_path) # Re-open so MuPDF's page cache doesn't favour later runs
+        start = time.perf_counter()
+        pages = extract_pdf_text_by_page(doc, backend=backend)
+        best = min(best, time.perf_counter() - start)
+        doc.close()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'seconds': best,
+        'pages': len(pages),
+        'rss_delta_mb': (peak_rss_kb - baseline_rss_kb) / 1024,
+        'python_peak_mb': python_peak / 1e6,
+        'text': pages,
+    }
+
+
+def diff_size(reference_pages, pages):
+    """Characters on added/removed lines when diffing against the reference, page by page."""
+    changed = 0
+    for ref, out in zip(reference_pages, pages):
+        for line in difflib.unified_diff(ref.splitlines(), out.splitlines(), lineterm='', n=0):
+            if line[:1] in '+-' and not line.startswith(('+++', '---')):
+                changed += len(line) - 1
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='*', help='PDF files (default: books/**/*.pdf)')
+    parser.add_argument('--repeat', type=int, default=3, help='Best-of-N timing repeats')
+    args = parser.parse_args()
+    pdfs = args.pdfs or sorted(glob.glob('books/**/*.pdf', recursive=True))
+
+    context = multiprocessing.get_context('spawn')
+    for pdf_path in pdfs:
+        print(f"\n{pdf_path}")
+        print(f"  {'backend':<12} {'pages/s':>9} {'rss MB':>8} {'py MB':>7} {'chars':>9} {'diff chars':>11}")
+        results = {}
+        for backend in PDF_TEXT_BACKENDS:
+            with context.Pool(1) as pool:
+                results[backend] = pool.apply(run_backend, (pdf_path, backend, args.repeat))
+        reference = results[DEFAULT_PDF_BACKEND]['text']
+        for backend, result in results.items():
+            pages_per_sec = result['pages'] / result['seconds'] if result['seconds'] else float('inf')
+            chars = sum(len(page) for page in result['text'])
+            print(f"  {backend:<12} {pages_per_sec:9.1f} {result['rss_delta_mb']:8.1f} "
+                  f"{result['python_peak_mb']:7.1f} {chars:9d} {diff_size(reference, result['text']):11d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Scaling suite: time the text and audio stages on synthetic books of growing size.
+
+For every size in --sizes (pages) a PDF and an EPUB are generated with
+benchmarks.synthetic_books, then these stages are timed:
+    pdf_pages            extract_pdf_text_by_page over the whole PDF
+    join_wrapped_lines   on the whole book's raw page text
+    clean_pipeline       on the whole book's raw page text
+    remove_overlap       over every pair of consecutive TOC chapters
+    extract_pdf          extract_book on the PDF (TOC chapters, cleaning, saving)
+    extract_epub         extract_book on the EPUB
+    stub_tts             silence of each chapter's estimated spoken length, as FLAC
+    merge_audio_files    merging the stub chapters into one FLAC
+The stub TTS stands in for Kokoro so the merge sees realistic chapter
+counts and lengths; --samplerate scales its audio down (frames are what the
+merge's cost depends on) so thousands of pages stay quick to run.
+
+A least-squares fit of log(time) against log(pages) gives each stage's
+scaling exponent; stages above SUPERLINEAR_EXPONENT are flagged and the
+suite exits with status 1.
+
+Usage (from the repository root):
+    python -m benchmarks.scaling --sizes 10,50,250,1000,5000 --toc-depth 2
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import fitz
+import numpy as np
+import soundfile as sf
+
+from benchmarks.synthetic_books import BookSpec, write_pdf, write_epub
+from core.services.extract import (extract_book, extract_pdf_text_by_page, join_wrapped_lines, clean_pipeline,
+                                   remove_overlap, deduplicate_toc, estimate_spoken_duration)
+from output import merge_audio_files
+
+SUPERLINEAR_EXPONENT = 1.25 # Flag stages whose time grows faster than pages ** this
+MIN_TIMED_SECONDS = 0.005 # Shorter timings are too noisy to fit
+STUB_BLOCK_FRAMES = 1 << 20
+
+
+def timed(func, *args, repeat=1, **kwargs):
+    """Best wall time of `repeat` runs, with the stage's console output suppressed. Returns (seconds, result)."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def toc_chapter_texts(toc, pages):
+    """Raw text of each TOC chapter, split like structure_pdf_by_toc splits it."""
+    toc = deduplicate_toc(toc)
+    texts = []
+    for i, (_, _, start) in enumerate(toc):
+        end = max(start - 1, toc[i + 1][2] - 2) if i + 1 < len(toc) else len(pages) - 1
+        texts.append("\n".join(pages[start - 1:end + 1]))
+    return texts
+
+
+def overlap_pass(chapters):
+    return [remove_overlap(chapters[i], chapters[i + 1]) for i in range(len(chapters) - 1)]
+
+
+def stub_tts(text_dir, audio_dir, samplerate):
+    """Write silence of each chapter's estimated spoken duration, like Kokoro would write speech."""
+    os.makedirs(audio_dir, exist_ok=True)
+    silence = np.zeros(STUB_BLOCK_FRAMES, dtype=np.int16)
+    frames_total = 0
+    for filename in sorted(f for f in os.listdir(text_dir) if f.endswith('.txt')):
+        with open(os.path.join(text_dir, filename), 'r', encoding='utf-8') as f:
+            frames = max(1, round(estimate_spoken_duration(f.read()) * samplerate))
+        with sf.SoundFile(os.path.join(audio_dir, f"{os.path.splitext(filename)[0]}.flac"), 'w',
+                          samplerate=samplerate, channels=1, format='FLAC', subtype='PCM_16') as out:
+            for start in range(0, frames, STUB_BLOCK_FRAMES):
+                out.write(silence[:min(STUB_BLOCK_FRAMES, frames - start)])
+        frames_total += frames
+    return frames_total
+
+
+def run_size(pages, args, work_dir):
+    spec = BookSpec(pages, args.chapter_pages, args.toc_depth, args.number_density, args.mid_page_ratio)
+    base = os.path.join(work_dir, f"book_{pages}p")
+    write_pdf(spec, f"{base}.pdf")
+    write_epub(spec, f"{base}.epub")
+
+    timings = {}
+    doc = fitz.open(f"{base}.pdf")
+    timings['pdf_pages'], page_texts = timed(extract_pdf_text_by_page, doc, repeat=args.repeat)
+    toc = doc.get_toc()
+    doc.close()
+    raw_text = "\n".join(page_texts)
+    timings['join_wrapped_lines'], _ = timed(join_wrapped_lines, raw_text, repeat=args.repeat)
+    timings['clean_pipeline'], _ = timed(clean_pipeline, raw_text, repeat=args.repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        chapters = [clean_pipeline(text) for text in toc_chapter_texts(toc, page_texts)]
+    timings['remove_overlap'], _ = timed(overlap_pass, chapters, repeat=args.repeat)
+
+    pdf_text_dir, epub_text_dir = f"{base}_pdf_text", f"{base}_epub_text"
+    timings['extract_pdf'], _ = timed(extract_book, f"{base}.pdf", output_dir=pdf_text_dir)
+    timings['extract_epub'], _ = timed(extract_book, f"{base}.epub", output_dir=epub_text_dir)
+    timings['stub_tts'], frames = timed(stub_tts, pdf_text_dir, f"{base}_audio", args.samplerate)
+    timings['merge_audio_files'], _ = timed(merge_audio_files, f"{base}_audio", f"{base}_book.flac", 'flac')
+    return timings, {'toc_entries': len(toc), 'chapters': len(os.listdir(pdf_text_dir)), 'audio_hours': frames / args.samplerate / 3600}
+
+
+def scaling_exponent(sizes, seconds):
+    """Slope of log(seconds) over log(size), from the timings long enough to measure."""
+    points = [(math.log(n), math.log(t)) for n, t in zip(sizes, seconds) if t >= MIN_TIMED_SECONDS]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if spread else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,50,250,1000,5000', help='Comma-separated page counts')
+    parser.add_argument('--chapter-pages', type=float, default=8, help='Mean pages per leaf chapter')
+    parser.add_argument('--toc-depth', type=int, default=2)
+    parser.add_argument('--number-density', type=float, default=0.02)
+    parser.add_argument('--mid-page-ratio', type=float, default=0.3)
+    parser.add_argument('--samplerate', type=int, default=1000, help='Stub TTS sample rate')
+    parser.add_argument('--repeat', type=int, default=1, help='Best-of-N for the in-memory stages')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated books and outputs')
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    work_dir = tempfile.mkdtemp(prefix='scaling_')
+    results = {}
+    try:
+        for pages in sizes:
+            timings, info = run_size(pages, args, work_dir)
+            results[pages] = timings
+            print(f"{pages:6d} pages  {info['toc_entries']:5d} TOC entries  {info['chapters']:5d} chapters  "
+                  f"{info['audio_hours']:7.1f} h audio  " + "  ".join(f"{stage} {t:.3f}s" for stage, t in timings.items()))
+    finally:
+        if args.keep:
+            print(f"Outputs kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    stages = list(results[sizes[0]])
+    flagged = []
+    print(f"\n{'stage':<20}" + "".join(f"{pages:>10d}p" for pages in sizes) + f"{'exponent':>10}")
+    for stage in stages:
+        seconds = [results[pages][stage] for pages in sizes]
+        exponent = scaling_exponent(sizes, seconds)
+        super_linear = exponent is not None and exponent > SUPERLINEAR_EXPONENT
+        if super_linear:
+            flagged.append(stage)
+        print(f"{stage:<20}" + "".join(f"{t:10.3f}s" for t in seconds)
+              + (f"{exponent:10.2f}" if exponent is not None else f"{'-':>10}") + ("  SUPER-LINEAR" if super_linear else ""))
+    if flagged:
+        print(f"\nSuper-linear scaling (exponent > {SUPERLINEAR_EXPONENT}): {', '.join(flagged)}")
+        sys.exit(1)
+    print(f"\nAll stages scale at most as pages ** {SUPERLINEAR_EXPONENT}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare single-pass, parallel shorts generation with the per-short ffmpeg loop.
+
+A synthetic book of the requested length (mp3, like the merged audiobook) is
+turned into shorts by both modes of create_shorts. The report gives wall time,
+CPU time of the ffmpeg processes, and the number of shorts produced.
+
+Usage (from the repository root):
+    python -m benchmarks.shorts --hours 5 [--workers 4] [--skip-legacy]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+from output import create_shorts
+
+
+def synthetic_book(path, hours):
+    """Speech-level noise at Kokoro's sample rate, encoded to mp3 by ffmpeg."""
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi",
+                    "-i", f"anoisesrc=color=pink:amplitude=0.1:sample_rate=24000:duration={hours * 3600}",
+                    "-ac", "1", path], check=True)
+
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, default=5.0, help='Length of the synthetic book')
+    parser.add_argument('--workers', type=int, default=None, help='Worker pool size (default: SHORTS_MAX_WORKERS)')
+    parser.add_argument('--skip-legacy', action='store_true', help='Only run the single-pass mode')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        book = os.path.join(work_dir, 'book.mp3')
+        synthetic_book(book, args.hours)
+        print(f"Book: {args.hours} h")
+        print(f"  {'mode':<12} {'wall s':>9} {'ffmpeg cpu s':>13} {'shorts':>7}")
+
+        modes = [('single-pass', True)] + ([] if args.skip_legacy else [('per-short', False)])
+        for label, single_pass in modes:
+            output_dir = os.path.join(work_dir, label)
+            start_cpu, start_wall = children_cpu_seconds(), time.perf_counter()
+            shorts = create_shorts(book, 'Benchmark Book', output_dir, single_pass=single_pass,
+                                   max_workers=args.workers)
+            wall, cpu = time.perf_counter() - start_wall, children_cpu_seconds() - start_cpu
+            print(f"  {label:<12} {wall:9.1f} {cpu:13.1f} {len(shorts):7d}")
+
+
+if __name__ == '__main__':
+    main()
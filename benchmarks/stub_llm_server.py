@@ -0,0 +1,106 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint (Groq's included).
+
+Every POST to a path ending in /chat/completions is answered after --latency
+seconds with the last user message, hyphenation repaired ("exam- ple" becomes
+"example"; lines are never joined) and closed with the repair stage's end
+marker, so the text-repair stage can be exercised without a provider
+account. --error-rate answers that fraction of requests with HTTP 429 to
+exercise retries.
+
+Point GroqModel at it with:
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub python main.py ... --repair-text
+
+Usage (from the repository root):
+    python -m benchmarks.stub_llm_server --port 8765 --latency 0.2
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.services.repair import END_MARKER
+
+HYPHENATION = re.compile(r'(\w)-[ \t]+(\w)')
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like a real provider
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency)
+            if not self.path.endswith('/chat/completions'):
+                return self._reply(404, {'error': {'message': f'Unknown path {self.path}'}})
+            if server.error_rate and random.random() < server.error_rate:
+                return self._reply(429, {'error': {'message': 'Rate limit reached', 'type': 'rate_limit'}},
+                                   {'Retry-After': '0.1'})
+            user = [m['content'] for m in body.get('messages', []) if m.get('role') == 'user']
+            content = HYPHENATION.sub(r'\1\2', user[-1] if user else '') + f"\n{END_MARKER}"
+            self._reply(200, {
+                'id': f'stub-{server.requests}', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency=0.2, error_rate=0.0):
+    """
+    Serve the stub on a background thread.
+
+    Returns:
+        tuple: (server, base_url). server.requests and server.max_in_flight count
+               the traffic; call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubChatHandler)
+    server.daemon_threads = True
+    server.latency, server.error_rate = latency, error_rate
+    server.lock = threading.Lock()
+    server.requests = server.in_flight = server.max_in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    args = parser.parse_args()
+    server, base_url = start_stub_server(args.port, args.latency, args.error_rate)
+    print(f"Stub chat completions endpoint on {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Generate synthetic PDF and EPUB books of a chosen size.
+
+Books are built from random sentences laid out like a printed book: running
+header and page number outside the body area, lines wrapped at a fixed width
+with some words hyphenated across lines, and a table of contents nested
+toc_depth levels deep (parts > chapters > sections). Sizes are controlled by
+the page count, the mean pages per leaf chapter (jittered +-50%), the share
+of chapters that start mid-page (so neighbouring chapters share a page) and
+the share of words that are numbers (years, amounts, decimals).
+
+The PDF is written with PyMuPDF; the EPUB 3 is zipped by hand (mimetype,
+container.xml, OPF, nav document and one XHTML document per leaf chapter).
+
+Usage (from the repository root):
+    python -m benchmarks.synthetic_books --pages 500 --toc-depth 2 --out /tmp/books
+"""
+import argparse
+import html
+import os
+import random
+import zipfile
+
+import fitz
+
+LINES_PER_PAGE = 40
+LINE_WIDTH = 80 # Characters per printed line
+PAGE_SIZE = (595, 842) # A4 in points
+BODY_TOP = 80 # First baseline, below extract.HEADER_THRESHOLD
+LINE_HEIGHT = 17.5
+FONT_SIZE = 10
+CHILDREN_PER_LEVEL = 4 # Chapters per part, parts per volume, ...
+LEVEL_NAMES = ("Chapter", "Part", "Book", "Volume") # Leaf level first
+WORDS = ("the river ran past old mills and quiet farms while travellers spoke of distant cities "
+         "markets harbours winter roads lanterns bridges letters soldiers merchants and long "
+         "evenings spent reading by the fire under heavy wooden beams").split()
+
+
+class BookSpec:
+    """Size and shape of a synthetic book."""
+
+    def __init__(self, pages=100, chapter_pages=8, toc_depth=1, number_density=0.02, mid_page_ratio=0.3,
+                 title="Synthetic Book", seed=0):
+        self.pages = pages
+        self.chapter_pages = chapter_pages
+        self.toc_depth = max(1, min(toc_depth, len(LEVEL_NAMES)))
+        self.number_density = number_density
+        self.mid_page_ratio = mid_page_ratio
+        self.title = title
+        self.seed = seed
+
+
+def _number(rng):
+    kind = rng.random()
+    if kind < 0.4:
+        return str(rng.randint(1500, 2024)) # Year
+    if kind < 0.7:
+        return str(rng.randint(2, 999))
+    if kind < 0.85:
+        return f"${rng.randint(1, 99)},{rng.randint(0, 999):03d}"
+    return f"{rng.randint(0, 99)}.{rng.randint(0, 99)}"
+
+
+def _paragraph(rng, number_density):
+    sentences = []
+    for _ in range(rng.randint(3, 7)):
+        words = [_number(rng) if rng.random() < number_density else rng.choice(WORDS)
+                 for _ in range(rng.randint(8, 20))]
+        sentences.append(" ".join(words).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def _wrap(paragraph, rng):
+    """Wrap at LINE_WIDTH, hyphenating some long words across the line end."""
+    lines, line = [], ""
+    for word in paragraph.split():
+        if len(line) + 1 + len(word) <= LINE_WIDTH:
+            line = f"{line} {word}" if line else word
+            continue
+        room = LINE_WIDTH - len(line) - 2
+        if len(word) >= 7 and room >= 3 and rng.random() < 0.5:
+            cut = min(room, len(word) - 3)
+            lines.append(f"{line} {word[:cut]}-")
+            line = word[cut:]
+        else:
+            lines.append(line)
+            line = word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _headings(leaf_index, depth):
+    """TOC entries (level, title) that open before leaf chapter leaf_index."""
+    entries = []
+    for level in range(1, depth):
+        span = CHILDREN_PER_LEVEL ** (depth - level)
+        if leaf_index % span == 0:
+            entries.append((level, f"{LEVEL_NAMES[depth - level]} {leaf_index // span + 1}"))
+    entries.append((depth, f"{LEVEL_NAMES[0]} {leaf_index + 1}"))
+    return entries
+
+
+def layout_book(spec):
+    """
+    Lay the book out on pages.
+
+    Returns:
+        tuple: (pages, toc, chapters) where pages is a list of line lists,
+               toc is PyMuPDF's [[level, title, page], ...] and chapters is a
+               list of (toc entries, paragraphs) per leaf chapter, for the EPUB.
+    """
+    rng = random.Random(spec.seed)
+    pages, toc, chapters = [[]], [], []
+    leaf = 0
+    while len(pages) <= spec.pages:
+        target = max(1, round(spec.chapter_pages * rng.uniform(0.5, 1.5)))
+        if pages[-1] and rng.random() >= spec.mid_page_ratio:
+            pages.append([]) # Chapter starts on a new page
+        headings = _headings(leaf, spec.toc_depth)
+        toc.extend([level, title, len(pages)] for level, title in headings)
+        paragraphs = []
+        lines = [title for _, title in headings] + [""]
+        start_page = len(pages)
+        while len(pages) - start_page < target and len(pages) <= spec.pages:
+            paragraph = _paragraph(rng, spec.number_density)
+            paragraphs.append(paragraph)
+            lines += _wrap(paragraph, rng) + [""]
+            while len(lines) >= LINES_PER_PAGE - len(pages[-1]):
+                room = LINES_PER_PAGE - len(pages[-1])
+                pages[-1].extend(lines[:room])
+                lines = lines[room:]
+                pages.append([])
+        pages[-1].extend(lines)
+        chapters.append((headings, paragraphs))
+        leaf += 1
+    pages = pages[:spec.pages]
+    toc = [entry for entry in toc if entry[2] <= spec.pages]
+    return pages, toc, chapters
+
+
+def write_pdf(spec, path):
+    """Write the book as a PDF with a nested TOC. Returns the number of TOC entries."""
+    pages, toc, _ = layout_book(spec)
+    doc = fitz.open()
+    for number, lines in enumerate(pages, start=1):
+        page = doc.new_page(width=PAGE_SIZE[0], height=PAGE_SIZE[1])
+        page.insert_text((72, 30), spec.title, fontsize=8) # Running header
+        page.insert_text((PAGE_SIZE[0] / 2, PAGE_SIZE[1] - 20), str(number), fontsize=8) # Page number
+        if lines:
+            page.insert_text((72, BODY_TOP), "\n".join(lines), fontsize=FONT_SIZE, lineheight=LINE_HEIGHT / FONT_SIZE)
+    doc.set_toc(toc)
+    doc.save(path, garbage=1, deflate=True)
+    doc.close()
+    return len(toc)
+
+
+def write_epub(spec, path):
+    """Write the book as an EPUB 3, one spine document per leaf chapter. Returns the number of chapters."""
+    _, _, chapters = layout_book(spec)
+    with zipfile.ZipFile(path, 'w') as epub:
+        epub.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        epub.writestr('META-INF/container.xml',
+                      '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                      '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+                      '</rootfiles></container>')
+        manifest, spine, nav = [], [], []
+        for i, (headings, paragraphs) in enumerate(chapters, start=1):
+            name = f"chapter{i:05d}.xhtml"
+            body = "".join(f"<h{min(level, 6)}>{html.escape(title)}</h{min(level, 6)}>" for level, title in headings)
+            body += "".join(f"<p>{html.escape(paragraph)}</p>" for paragraph in paragraphs)
+            epub.writestr(f"OEBPS/{name}", '<?xml version="1.0" encoding="utf-8"?>'
+                          f'<html xmlns="http://www.w3.org/1999/xhtml"><head><title>{html.escape(headings[-1][1])}</title></head>'
+                          f'<body>{body}</body></html>', compress_type=zipfile.ZIP_DEFLATED)
+            manifest.append(f'<item id="c{i}" href="{name}" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="c{i}"/>')
+            nav.append(f'<li><a href="{name}">{html.escape(headings[-1][1])}</a></li>')
+        epub.writestr('OEBPS/nav.xhtml', '<?xml version="1.0" encoding="utf-8"?>'
+                      '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops"><body>'
+                      f'<nav epub:type="toc"><ol>{"".join(nav)}</ol></nav></body></html>')
+        epub.writestr('OEBPS/content.opf', '<?xml version="1.0" encoding="utf-8"?>'
+                      '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">'
+                      f'<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>{html.escape(spec.title)}</dc:title>'
+                      '<dc:identifier id="id">synthetic</dc:identifier><dc:language>en</dc:language></metadata>'
+                      f'<manifest><item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>{"".join(manifest)}</manifest>'
+                      f'<spine>{"".join(spine)}</spine></package>')
+    return len(chapters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--chapter-pages', type=float, default=8, help='Mean pages per leaf chapter')
+    parser.add_argument('--toc-depth', type=int, default=1)
+    parser.add_argument('--number-density', type=float, default=0.02, help='Share of words that are numbers')
+    parser.add_argument('--mid-page-ratio', type=float, default=0.3, help='Share of chapters starting mid-page')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='.', help='Output directory')
+    args = parser.parse_args()
+
+    spec = BookSpec(args.pages, args.chapter_pages, args.toc_depth, args.number_density, args.mid_page_ratio, seed=args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    base = os.path.join(args.out, f"synthetic_{args.pages}p")
+    toc_entries = write_pdf(spec, f"{base}.pdf")
+    chapters = write_epub(spec, f"{base}.epub")
+    print(f"{base}.pdf: {args.pages} pages, {toc_entries} TOC entries")
+    print(f"{base}.epub: {chapters} chapters")
+
+
+if __name__ == '__main__':
+    main()
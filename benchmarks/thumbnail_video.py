@@ -0,0 +1,86 @@
+"""
+Compare the still-image and per-frame renderings of the full-length thumbnail video.
+
+Both modes of create_full_video_with_thumbnails run on the same thumbnail and
+audio. The report gives encode time, file size, and the PSNR of a frame taken
+from the middle of each video against the composited reference frame.
+Both modes lose the same detail to yuv420p chroma subsampling, so equal PSNR
+values mean the still-image video looks the same as the per-frame one.
+
+Usage (from the repository root):
+    python -m benchmarks.thumbnail_video --minutes 10 [--thumbnail path.jpg] [--audio book.mp3]
+"""
+import argparse
+import os
+import re
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from output import create_full_video_with_thumbnails, render_thumbnail_frame
+
+SAMPLE_RATE = 24000
+
+
+def synthetic_thumbnail(path):
+    """A 1280x720 test card, so the scale/pad step has work to do."""
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc2=size=1280x720",
+                    "-frames:v", "1", path], check=True)
+
+
+def synthetic_audio(path, minutes):
+    """Speech-level noise, encoded the way the pipeline's merged book is (mp3)."""
+    wav_path = f"{path}.wav"
+    rng = np.random.default_rng(0)
+    audio = (0.1 * rng.standard_normal(int(minutes * 60 * SAMPLE_RATE))).astype(np.float32)
+    sf.write(wav_path, audio, SAMPLE_RATE)
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", wav_path, path], check=True)
+    os.remove(wav_path)
+
+
+def frame_psnr(video_path, reference_png, at_seconds):
+    """PSNR (dB) of the frame at `at_seconds` against the reference image."""
+    result = subprocess.run(
+        ["ffmpeg", "-ss", str(at_seconds), "-i", video_path, "-i", reference_png,
+         "-frames:v", "1", "-lavfi", "[0:v]format=rgb24[a];[1:v]format=rgb24[b];[a][b]psnr", "-f", "null", "-"],
+        capture_output=True, text=True, check=True)
+    match = re.search(r"average:(\S+)", result.stderr)
+    return float(match.group(1)) if match else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=10.0, help='Length of the synthetic audio')
+    parser.add_argument('--thumbnail', help='Thumbnail image (default: synthetic test card)')
+    parser.add_argument('--audio', help='Book audio (default: synthetic mp3)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        thumbnail = args.thumbnail or os.path.join(work_dir, 'thumbnail.png')
+        audio = args.audio or os.path.join(work_dir, 'book.mp3')
+        if not args.thumbnail:
+            synthetic_thumbnail(thumbnail)
+        if not args.audio:
+            synthetic_audio(audio, args.minutes)
+        duration = sf.info(audio).duration
+        reference = render_thumbnail_frame(thumbnail, 'Benchmark Book', os.path.join(work_dir, 'reference.png'))
+        print(f"Audio: {duration / 60:.1f} min")
+        print(f"  {'mode':<10} {'seconds':>8} {'size MB':>8} {'PSNR dB':>8}")
+
+        for label, still_image in (('per-frame', False), ('still', True)):
+            output_dir = os.path.join(work_dir, label)
+            os.makedirs(output_dir)
+            start = time.perf_counter()
+            video = create_full_video_with_thumbnails(audio, thumbnail, 'Benchmark Book', output_dir,
+                                                      still_image=still_image)
+            seconds = time.perf_counter() - start
+            size_mb = os.path.getsize(video) / 1e6
+            psnr = frame_psnr(video, reference, duration / 2)
+            print(f"  {label:<10} {seconds:8.2f} {size_mb:8.2f} {psnr:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
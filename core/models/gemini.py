@@ -1,44 +1,147 @@
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from core.services.cache import make_cache_key, load_cache_entry, save_cache_entry
 
-class GeminiModel:
-    @staticmethod
-    def initialize():
+# --- Configuration ---
+DEFAULT_GEMINI_MODEL = "gemini-1.5-flash"
+DEFAULT_GENERATION_CONFIG = {
+    'temperature': 0.5,
+    'top_p': 0.80,
+    'top_k': 64,
+    'max_output_tokens': 128,
+}
+GEMINI_BATCH_WORKERS = 4 # Concurrent generate_content calls in generate_batch
+GEMINI_CACHE_NAMESPACE = "gemini" # On-disk response cache (core.services.cache)
+GEMINI_MEMORY_CACHE_ENTRIES = 1024 # Responses kept in process, least recently used dropped first
+
+# google.generativeai takes noticeable time to import, so it is only loaded
+# (and configured, once per process) when a model is first requested.
+_genai = None
+_models = {} # (model name, generation config JSON) -> GenerativeModel
+_responses = OrderedDict() # response cache key -> text
+_lock = threading.Lock()
+
+def _load_genai():
+    """Import and configure google.generativeai on first use. Call with _lock held."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        from dotenv import load_dotenv
         load_dotenv()
         genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-        
-        generation_config = genai.GenerationConfig(
-            temperature=0.5,
-            top_p=0.80,
-            top_k=64,
-            max_output_tokens=128,
-        )
-        
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            # system_instruction="""You are a knowledgeable and precise AI assistant focused on providing information about website content.
-
-            # Guidelines:
-            # - Only answer questions based on the provided website content
-            # - Keep your answers as short as possible
-            # - Provide clear, concise, and accurate responses in short single line responses
-            # - Use a professional and helpful tone
-            # - If multiple interpretations are possible, ask for clarification
-            # - Format responses in a structured and easy-to-read manner
-            # - If the question is not related to the website content, politely inform the user
-            # - If the question is not clear, ask for clarification
-            # - Act like a QnA bot
-            # - Answer in a conversational manner
-            
-            # Do not:
-            # - Make assumptions beyond the provided content
-            # - Include external information or personal opinions
-            # - Provide information that wasn't specifically requested
-            # - Speculate about information that isn't clearly stated
-            # - Respond with long answers""",
-
-            generation_config=generation_config,
-        )
-        
-        return model
\ No newline at end of file
+        _genai = genai
+    return _genai
+
+def _config_key(generation_config):
+    return json.dumps(generation_config, sort_keys=True)
+
+def get_gemini_model(model_name=DEFAULT_GEMINI_MODEL, generation_config=None):
+    """
+    Return the process-wide GenerativeModel for a model name and generation config.
+
+    The first call imports and configures the SDK; later calls with the same
+    name and config (dict, DEFAULT_GENERATION_CONFIG if None) return the same
+    instance. Safe to call from several threads.
+    """
+    generation_config = dict(generation_config or DEFAULT_GENERATION_CONFIG)
+    key = (model_name, _config_key(generation_config))
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            genai = _load_genai()
+            model = genai.GenerativeModel(
+                model_name=model_name,
+                # system_instruction="""You are a knowledgeable and precise AI assistant focused on providing information about website content.
+
+                # Guidelines:
+                # - Only answer questions based on the provided website content
+                # - Keep your answers as short as possible
+                # - Provide clear, concise, and accurate responses in short single line responses
+                # - Use a professional and helpful tone
+                # - If multiple interpretations are possible, ask for clarification
+                # - Format responses in a structured and easy-to-read manner
+                # - If the question is not related to the website content, politely inform the user
+                # - If the question is not clear, ask for clarification
+                # - Act like a QnA bot
+                # - Answer in a conversational manner
+
+                # Do not:
+                # - Make assumptions beyond the provided content
+                # - Include external information or personal opinions
+                # - Provide information that wasn't specifically requested
+                # - Speculate about information that isn't clearly stated
+                # - Respond with long answers""",
+
+                generation_config=genai.GenerationConfig(**generation_config),
+            )
+            _models[key] = model
+        return model
+
+def _remember(key, text):
+    with _lock:
+        _responses[key] = text
+        _responses.move_to_end(key)
+        while len(_responses) > GEMINI_MEMORY_CACHE_ENTRIES:
+            _responses.popitem(last=False)
+
+def _recall(key):
+    with _lock:
+        if key in _responses:
+            _responses.move_to_end(key)
+            return _responses[key]
+    return None
+
+def generate_batch(prompts, model_name=DEFAULT_GEMINI_MODEL, generation_config=None, cache_dir=None,
+                   max_workers=GEMINI_BATCH_WORKERS):
+    """
+    Generate responses for many prompts, concurrently and with per-prompt caching.
+
+    A prompt is answered from the in-process cache, then from cache_dir (if
+    set), and only otherwise sent; repeated prompts in the batch are sent
+    once. Failed prompts are not cached.
+
+    Returns:
+        list: One entry per prompt, in order: the response text, or the exception it failed with.
+    """
+    generation_config = dict(generation_config or DEFAULT_GENERATION_CONFIG)
+    keys = [make_cache_key(GEMINI_CACHE_NAMESPACE, model_name, generation_config, prompt) for prompt in prompts]
+    results, pending = {}, {}
+    for key, prompt in zip(keys, prompts):
+        if key in results or key in pending:
+            continue
+        text = _recall(key)
+        if text is None:
+            entry = load_cache_entry(cache_dir, GEMINI_CACHE_NAMESPACE, key)
+            text = entry['text'] if entry is not None else None
+        if text is not None:
+            results[key] = text
+        else:
+            pending[key] = prompt
+
+    if pending:
+        model = get_gemini_model(model_name, generation_config)
+
+        def generate(item):
+            key, prompt = item
+            try:
+                text = model.generate_content(prompt).text
+            except Exception as e:
+                return key, e
+            save_cache_entry(cache_dir, GEMINI_CACHE_NAMESPACE, key, {'text': text})
+            return key, text
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+            results.update(executor.map(generate, pending.items()))
+    for key, text in results.items():
+        if not isinstance(text, Exception):
+            _remember(key, text)
+    return [results[key] for key in keys]
+
+class GeminiModel:
+    @staticmethod
+    def initialize(model_name=DEFAULT_GEMINI_MODEL, generation_config=None):
+        """The shared GenerativeModel (see get_gemini_model); kept for existing callers."""
+        return get_gemini_model(model_name, generation_config)
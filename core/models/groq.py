@@ -1,32 +1,213 @@
-from groq import Groq
+from groq import Groq, AsyncGroq, APIStatusError, APIConnectionError
 from dotenv import load_dotenv
 import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import httpx
 
 # Load environment variables
 load_dotenv()
 
+# --- Configuration ---
+DEFAULT_MODEL = "mixtral-8x7b-32768"
+GROQ_MAX_CONCURRENCY = 8 # Requests in flight per AsyncGroqModel
+GROQ_MAX_CONNECTIONS = 32 # Size of the shared connection pool
+GROQ_REQUESTS_PER_MINUTE = 30 # Token-bucket refill rate (Groq's free tier)
+GROQ_BURST = 5 # Requests that may start back to back before the bucket throttles
+GROQ_MAX_RETRIES = 4 # Retries after the first attempt, for 429, 5xx and connection errors
+GROQ_BACKOFF_BASE = 0.5 # Seconds; attempt n waits a random time in [0, base * 2**n] (full jitter)
+GROQ_BACKOFF_MAX = 20.0
+GROQ_TIMEOUT = 60.0 # Seconds per request
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class GroqModelError(Exception):
+    """
+    A failed completion, never mistaken for content.
+
+    Attributes:
+        status_code (int or None): HTTP status, None for connection errors and timeouts.
+        retryable (bool): Whether the failure was transient (rate limit, 5xx, network).
+        attempts (int): Requests made before giving up.
+    """
+
+    def __init__(self, message, status_code=None, retryable=False, attempts=1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.attempts = attempts
+
+def _model_error(e, attempts):
+    if isinstance(e, APIStatusError):
+        return GroqModelError(f"Groq API error: {e.message}", e.status_code,
+                              e.status_code in RETRYABLE_STATUS, attempts)
+    if isinstance(e, APIConnectionError):
+        return GroqModelError(f"Groq connection error: {e}", None, True, attempts)
+    return GroqModelError(f"Groq request failed: {e}", None, False, attempts)
+
+def _retry_delay(e, attempt):
+    """Server-requested Retry-After if present, else exponential backoff with full jitter."""
+    response = getattr(e, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), GROQ_BACKOFF_MAX)
+    except ValueError:
+        pass # An HTTP date; fall back to backoff
+    return random.uniform(0, min(GROQ_BACKOFF_MAX, GROQ_BACKOFF_BASE * 2 ** attempt))
+
 class GroqModel:
+    _clients = {} # (api_key, base_url) -> Groq, shared so instances reuse one connection pool
+    _clients_lock = threading.Lock()
+
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.model = "mixtral-8x7b-32768"
+        self.client = self._shared_client(os.getenv("GROQ_API_KEY"), os.getenv("GROQ_BASE_URL"))
+        self.model = DEFAULT_MODEL
+
+    @classmethod
+    def _shared_client(cls, api_key, base_url):
+        with cls._clients_lock:
+            if (api_key, base_url) not in cls._clients:
+                cls._clients[(api_key, base_url)] = Groq(api_key=api_key, base_url=base_url, timeout=GROQ_TIMEOUT)
+            return cls._clients[(api_key, base_url)]
+
+    def generate_response(self, messages, temperature=0.7, max_tokens=1024):
+        """
+        Return the completion text.
 
-    def generate_response(self, messages):
+        Raises:
+            GroqModelError: If the request fails (after the SDK's own retries).
+        """
         try:
             chat_completion = self.client.chat.completions.create(
                 messages=messages,
                 model=self.model,
-                temperature=0.7,
-                max_tokens=1024,
+                temperature=temperature,
+                max_tokens=max_tokens,
             )
-            
+
             return chat_completion.choices[0].message.content
-        
+
         except Exception as e:
-            print(f"Error generating response: {str(e)}")
-            return "Sorry, I encountered an error while processing your request."
+            raise _model_error(e, self.client.max_retries + 1) from e
+
+    def set_model(self, model_name):
+        """
+        Change the model being used
+        """
+        self.model = model_name
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock: # Waiters are served in order
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class AsyncGroqModel:
+    """
+    Async GroqModel for many concurrent completions.
+
+    Instances in the same event loop share one AsyncGroq client and its
+    connection pool. Each instance keeps at most max_concurrency requests in
+    flight, starts them through a token bucket of requests_per_minute, and
+    retries rate limits, 5xx and connection errors with jittered backoff
+    (honouring Retry-After). Failures raise GroqModelError.
+    """
+    _clients = weakref.WeakKeyDictionary() # event loop -> {(api_key, base_url): AsyncGroq}
+
+    def __init__(self, model=DEFAULT_MODEL, max_concurrency=GROQ_MAX_CONCURRENCY,
+                 requests_per_minute=GROQ_REQUESTS_PER_MINUTE, burst=GROQ_BURST, max_retries=GROQ_MAX_RETRIES):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_retries = max_retries
+        self.api_key = os.getenv("GROQ_API_KEY")
+        self.base_url = os.getenv("GROQ_BASE_URL")
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0}
+        self._limits = weakref.WeakKeyDictionary() # event loop -> (semaphore, bucket)
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        clients = self._clients.setdefault(loop, {})
+        key = (self.api_key, self.base_url)
+        if key not in clients:
+            http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS,
+                                                                max_keepalive_connections=GROQ_MAX_CONNECTIONS))
+            clients[key] = AsyncGroq(api_key=self.api_key, base_url=self.base_url, timeout=GROQ_TIMEOUT,
+                                     max_retries=0, http_client=http_client) # Retries are ours
+        return clients[key]
+
+    def _loop_limits(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._limits:
+            rate = self.requests_per_minute / 60.0 if self.requests_per_minute else None
+            self._limits[loop] = (asyncio.Semaphore(self.max_concurrency), TokenBucket(rate, self.burst))
+        return self._limits[loop]
+
+    async def generate_response(self, messages, temperature=0.7, max_tokens=1024):
+        """
+        Return the completion text.
+
+        Raises:
+            GroqModelError: On a non-retryable error, or when retries are exhausted.
+        """
+        semaphore, bucket = self._loop_limits()
+        client = self._client()
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await bucket.acquire()
+                self.stats['requests'] += 1
+                try:
+                    completion = await client.chat.completions.create(
+                        messages=messages, model=self.model, temperature=temperature, max_tokens=max_tokens)
+                    return completion.choices[0].message.content
+                except Exception as e:
+                    error = _model_error(e, attempt + 1)
+                    if not error.retryable or attempt == self.max_retries:
+                        self.stats['failures'] += 1
+                        raise error from e
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(_retry_delay(e, attempt))
+
+    async def generate_responses(self, message_lists, **kwargs):
+        """
+        Run many completions concurrently.
+
+        Returns:
+            list: One entry per message list, in order: the completion text, or the
+                  GroqModelError it failed with.
+        """
+        tasks = [self.generate_response(messages, **kwargs) for messages in message_lists]
+        return await asyncio.gather(*tasks, return_exceptions=True)
 
     def set_model(self, model_name):
         """
         Change the model being used
         """
         self.model = model_name
+
+    @classmethod
+    async def aclose_shared(cls):
+        """Close the shared clients of the running event loop."""
+        for client in cls._clients.pop(asyncio.get_running_loop(), {}).values():
+            await client.close()
@@ -17,7 +17,8 @@ import torch
 # 🇯🇵 'j' => Japanese: pip install misaki[ja]
 # 🇧🇷 'p' => Brazilian Portuguese pt-br
 # 🇨🇳 'z' => Mandarin Chinese: pip install misaki[zh]
-pipeline = KPipeline(lang_code='a') # <= make sure lang_code matches voice, reference above.
+# pipeline = KPipeline(lang_code='a') # <= make sure lang_code matches voice, reference above.
+# (Not built at import time: take one from pipeline_pool below instead.)
 
 # This text is for demonstration purposes only, unseen during training
 # text = '''
@@ -70,12 +71,64 @@ import torch
 import soundfile as sf
 import re # Needed for split_pattern if used differently
 import traceback # For more detailed error logging
+from core.services.levels import write_chapter_levels, LoudnessMeter, loudness_gains, PeakLimiter
+from core.services.alignment import chapter_segments_path, write_chapter_segments
+from core.services.memory import SpillBuffer
+from core.services.pipelines import PipelinePool
 
 # --- Constants ---
 DEFAULT_SAMPLE_RATE = 24000
+NORMALIZE_PEAK = 0.95 # Chapters are peak-normalized to 95% of full scale
+# Intermediate chapter formats written chunk by chunk during synthesis: extension -> (soundfile format, subtype)
+STREAMED_CHAPTER_FORMATS = {
+    '.flac': ('FLAC', 'PCM_16'), # Lossless at the final bit depth; 24-bit mostly stores float noise and outgrows WAV
+    '.opus': ('OGG', 'OPUS'),
+}
+OPUS_COMPRESSION_LEVEL = 0.5 # libsndfile maps this to ~130 kbps for mono speech
+KOKORO_REPO_ID = 'hexgrad/Kokoro-82M'
+
+# --- Pipeline Pool ---
+
+def _pipeline_bytes(pipeline):
+    """Weights held by a KPipeline's model (parameters and buffers), or None if it has none."""
+    model = getattr(pipeline, 'model', None)
+    if not isinstance(model, torch.nn.Module):
+        return None
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+# Process-wide warm KPipelines keyed by (lang_code, device, repo_id); callers hold one exclusively until released
+pipeline_pool = PipelinePool(
+    lambda lang_code, device, repo_id: KPipeline(lang_code=lang_code, device=device, repo_id=repo_id),
+    size_of=_pipeline_bytes,
+)
+
+def acquire_pipeline(lang_code, device, repo_id=KOKORO_REPO_ID):
+    """Take a KPipeline from pipeline_pool, reporting whether it was warm. Pass it to pipeline_pool.release() when done."""
+    print(f"  Initializing Kokoro pipeline for lang='{lang_code}' on device='{device}'...")
+    init_start_time = time.time()
+    pipeline, saved_seconds = pipeline_pool.acquire(lang_code, device, repo_id)
+    if saved_seconds:
+        print(f"  Reused warm pipeline from pool (saved {saved_seconds:.2f}s of initialization).")
+    else:
+        print(f"  Pipeline initialized in {time.time() - init_start_time:.2f}s.")
+    return pipeline
+
+def _report_pipeline_pool():
+    stats = pipeline_pool.stats()
+    print(f"  Pipeline pool      : {stats['built']} built ({stats['init_seconds']:.2f}s), {stats['reused']} reused "
+          f"(saved {stats['saved_seconds']:.2f}s), {stats['evicted']} evicted, {stats['idle']} idle ({stats['mb']:.0f} MB)")
 
 # --- Helper Functions ---
 
+def _open_chapter_writer(output_path):
+    """Open a soundfile writer for a streamed chapter format, on a temp path next to output_path."""
+    sf_format, subtype = STREAMED_CHAPTER_FORMATS[os.path.splitext(output_path)[1].lower()]
+    temp_path = f"{output_path}.part"
+    options = {'compression_level': OPUS_COMPRESSION_LEVEL} if subtype == 'OPUS' else {}
+    return temp_path, sf.SoundFile(temp_path, 'w', samplerate=DEFAULT_SAMPLE_RATE, channels=1,
+                                   format=sf_format, subtype=subtype, **options)
+
 def available_voices():
     """Return the hard-coded list of available Kokoro voice identifiers."""
     # This list should ideally be kept up-to-date with Kokoro's supported voices
@@ -104,7 +157,8 @@ def generate_audio_for_file_kokoro(
     split_pattern=r'\n+',
     cancellation_flag=None,
     chunk_progress_callback=None, # Renamed for clarity: reports chunk progress
-    pause_event=None
+    pause_event=None,
+    audio_sink=None
 ):
     """
     Generates audio for a single text file using a pre-initialized Kokoro pipeline.
@@ -119,6 +173,28 @@ def generate_audio_for_file_kokoro(
         cancellation_flag (callable): Function returning True to cancel.
         chunk_progress_callback (callable): Callback reporting (chars_in_chunk, chunk_duration).
         pause_event (threading.Event): Event to pause processing.
+        audio_sink (callable, optional): Receives (int16 audio blocks, segments) instead of the
+            audio being written to output_path (e.g. StreamingBookEncoder.write_chapter).
+
+    If output_path has a STREAMED_CHAPTER_FORMATS extension (.flac, .opus) and
+    there is no audio_sink, every chunk is written as soon as it is synthesized,
+    un-normalized, and the file appears under its final name only when complete.
+    WAV output keeps the legacy path: chunks are held in memory (spilled to a
+    temp file next to output_path near the memory budget) and written
+    peak-normalized.
+
+    Each chunk is also fed to a LoudnessMeter, and both file formats get a
+    levels sidecar (chapter_levels_path) with the exact frame count, peak and
+    loudness histogram, from which merge_audio_files levels the whole book
+    without decoding the chapters again. An audio_sink receives the chapter
+    already at TARGET_LOUDNESS_LUFS, since encode-once has no merge step;
+    its peaks above LOUDNESS_PEAK_CEILING are limited (PeakLimiter) rather
+    than the chapter being lowered, so chapters stay level with each other.
+
+    Every chunk's text (the pipeline's graphemes) and exact position are
+    recorded as [start_frame, frames, text] segments. They are saved next to
+    the chapter (chapter_segments_path) or handed to the audio_sink, so the
+    merge can emit a seek index and subtitles without forced alignment.
 
     Returns:
         bool: True if audio generation was successful and saved, False otherwise.
@@ -143,7 +219,13 @@ def generate_audio_for_file_kokoro(
         raise InterruptedError("Processing cancelled by user.")
     if pause_event: pause_event.wait() # Wait if paused
 
-    audio_chunks = []
+    audio_chunks = SpillBuffer(spill_dir=os.path.dirname(output_path) or None) # Spills to disk near the memory budget
+    streamed = audio_sink is None and os.path.splitext(output_path)[1].lower() in STREAMED_CHAPTER_FORMATS
+    writer, temp_path = None, None
+    peak, frames_written = 0.0, 0
+    meter = LoudnessMeter(DEFAULT_SAMPLE_RATE)
+    segments = [] # [start_frame, frames, text] per chunk, in chapter samples
+    chapter_frames = 0
     total_chars_in_file = len(text) # Approx total chars for this file
     chars_processed_in_file = 0
     start_synth_time = time.time()
@@ -162,7 +244,20 @@ def generate_audio_for_file_kokoro(
             # Process the audio chunk
             if isinstance(audio, torch.Tensor):
                 audio = audio.cpu().numpy() # Move to CPU and convert to NumPy if needed
-            audio_chunks.append(audio)
+            chunk_frames = len(audio)
+            segments.append([chapter_frames, chunk_frames, gs or ""])
+            chapter_frames += chunk_frames
+            meter.add(audio)
+            audio = np.asarray(audio, dtype=np.float32)
+            if audio.size:
+                peak = max(peak, float(np.max(np.abs(audio))))
+            if streamed:
+                if writer is None:
+                    temp_path, writer = _open_chapter_writer(output_path)
+                writer.write(np.clip(audio, -1.0, 1.0))
+                frames_written += len(audio)
+            else:
+                audio_chunks.append(audio)
 
             # Update progress based on this chunk
             chars_in_chunk = len(gs) if gs else 0 # Length of graphemes in the chunk
@@ -178,36 +273,107 @@ def generate_audio_for_file_kokoro(
     except Exception as e:
         print(f"      Error during Kokoro pipeline processing for '{os.path.basename(input_path)}': {e}")
         traceback.print_exc() # Print detailed traceback for debugging
+        _discard_chapter_writer(writer, temp_path)
+        audio_chunks.close()
         return False # Indicate failure for this file
+    except BaseException: # Cancellation: never leave a partial chapter behind
+        _discard_chapter_writer(writer, temp_path)
+        audio_chunks.close()
+        raise
+
+    if streamed:
+        success = _finish_chapter_writer(writer, temp_path, output_path, peak, frames_written, meter, input_path)
+        if success:
+            _save_segments(output_path, segments)
+        return success
 
-    if not audio_chunks:
+    if not audio_chunks.frames:
         print(f"      Warning: No audio chunks generated for '{os.path.basename(input_path)}'.")
+        audio_chunks.close()
         return False
 
-    # Concatenate, Normalize, and Save
+    # Normalize and Save, block by block (the chunks may have been spilled to disk)
     try:
-        print(f"      Concatenating {len(audio_chunks)} audio chunks...")
-        combined_audio = np.concatenate(audio_chunks)
-
         # Normalize audio to prevent clipping and fit int16 range
-        max_abs_val = np.max(np.abs(combined_audio))
-        if max_abs_val > 0: # Avoid division by zero for silent audio
-             # Normalize to ~95% of max range to leave some headroom
-             normalized_audio = (combined_audio / max_abs_val * 32767 * 0.95).astype(np.int16)
+        gain = NORMALIZE_PEAK / peak if peak > 0 else 1.0 # Avoid division by zero for silent audio
+        levels = _chapter_levels(audio_chunks.frames, peak, gain, meter)
+        if audio_sink:
+            # Later chapters are not synthesized yet, so no book-wide gain can be lowered for a loud one:
+            # every chapter goes to the target and one ceiling is enforced by the limiter instead
+            loudness = loudness_gains([levels], peak_ceiling=None)
+            if loudness:
+                gain = loudness[0][0] * gain
+            print(f"      Streaming audio to encoder...")
+            audio_sink(((np.clip(block, -1.0, 1.0) * 32767).astype(np.int16)
+                        for block in _limited_blocks(audio_chunks.blocks(), gain)), segments)
         else:
-             normalized_audio = combined_audio.astype(np.int16) # Already silent
-
-        print(f"      Saving audio to '{os.path.basename(output_path)}'...")
-        sf.write(output_path, normalized_audio, DEFAULT_SAMPLE_RATE)
+            # Normalize to ~95% of max range to leave some headroom
+            print(f"      Saving audio to '{os.path.basename(output_path)}'...")
+            with sf.SoundFile(output_path, 'w', samplerate=DEFAULT_SAMPLE_RATE, channels=1, subtype='PCM_16') as out:
+                for block in audio_chunks.blocks():
+                    out.write((block * gain * 32767).astype(np.int16))
+            write_chapter_levels(output_path, levels)
+            _save_segments(output_path, segments)
         # Removed verbose "Audio saved to..." log from here
 
     except Exception as e:
         print(f"      Error concatenating or saving audio for '{os.path.basename(output_path)}': {e}")
         return False
+    finally:
+        audio_chunks.close()
 
     return True # Indicate success for this file
 
 
+def _limited_blocks(blocks, gain):
+    """Apply gain to a chapter's float blocks and limit their peaks as one stream."""
+    limiter = PeakLimiter(DEFAULT_SAMPLE_RATE)
+    for block in blocks:
+        yield limiter.process(block * gain)
+    yield limiter.flush()
+
+def _save_segments(output_path, segments):
+    """Write a chapter's segment index next to its audio file."""
+    chapter_name = os.path.splitext(os.path.basename(output_path))[0]
+    write_chapter_segments(chapter_segments_path(os.path.dirname(output_path), chapter_name),
+                           segments, DEFAULT_SAMPLE_RATE)
+
+def _discard_chapter_writer(writer, temp_path):
+    """Close and delete an unfinished streamed chapter."""
+    if writer is not None:
+        writer.close()
+    if temp_path and os.path.exists(temp_path):
+        os.remove(temp_path)
+
+def _chapter_levels(frames, peak, applied_gain, meter):
+    """The levels sidecar of a chapter whose stored samples are the synthesized audio * applied_gain."""
+    return {
+        'frames': frames,
+        'samplerate': DEFAULT_SAMPLE_RATE,
+        'peak': peak,
+        'applied_gain': applied_gain,
+        'gain': NORMALIZE_PEAK / (peak * applied_gain) if peak > 0 else 1.0, # Peak normalization, if loudness can't be used
+        'loudness': meter.histogram(),
+    }
+
+def _finish_chapter_writer(writer, temp_path, output_path, peak, frames, meter, input_path):
+    """Publish a streamed chapter and its levels sidecar. Returns True on success."""
+    if writer is None or frames == 0:
+        print(f"      Warning: No audio chunks generated for '{os.path.basename(input_path)}'.")
+        _discard_chapter_writer(writer, temp_path)
+        return False
+    try:
+        writer.close()
+        write_chapter_levels(output_path, _chapter_levels(frames, peak, 1.0, meter))
+        os.replace(temp_path, output_path)
+        print(f"      Streamed {frames / DEFAULT_SAMPLE_RATE:.1f}s of audio to '{os.path.basename(output_path)}'")
+    except Exception as e:
+        print(f"      Error finishing audio for '{os.path.basename(output_path)}': {e}")
+        _discard_chapter_writer(None, temp_path)
+        return False
+    return True
+
+
 # --- Main Function for Processing a Directory ---
 
 def generate_audiobooks_kokoro(
@@ -216,12 +382,14 @@ def generate_audiobooks_kokoro(
     voice,               # Voice identifier (e.g., "am_liam")
     device="cuda",       # Device for TTS computation ('cuda' or 'cpu')
     output_dir=None,     # Optional: Defaults to 'input_dir_audio' sibling folder
-    audio_format=".wav", # Output audio format (ensure soundfile supports it)
+    audio_format=".wav", # Output audio format: .wav, or .flac/.opus written while synthesizing
     speed=1.0,
     split_pattern=r'\n+',
     progress_callback=None,      # Callback for overall progress (percentage, current_file, index, total)
     cancellation_flag=None,
     pause_event=None,
+    encoder=None,                # Optional StreamingBookEncoder: encode-once mode
+    chapter_callback=None,       # Called with (base_name, output_path) after each chapter file is written
     # Removed file_callback (merged into progress_callback)
     # Removed update_estimate_callback (handled internally if needed or by UI)
 ):
@@ -234,16 +402,25 @@ def generate_audiobooks_kokoro(
         voice (str): Kokoro voice identifier (e.g., 'am_liam').
         device (str): Computation device ('cuda' or 'cpu').
         output_dir (str, optional): Directory to save audio files. Defaults to sibling directory.
-        audio_format (str): File extension for audio output (e.g., '.wav', '.mp3').
+        audio_format (str): File extension for audio output. '.wav' is written normalized
+            once a chapter is complete; '.flac' (lossless) and '.opus' (~130 kbps) are
+            written chunk by chunk during synthesis, with a levels sidecar the merge uses.
         speed (float): Speech speed multiplier.
         split_pattern (str): Regex for splitting text for TTS processing.
         progress_callback (callable, optional): Reports overall progress.
             Receives: (overall_percentage, current_filename, current_index, total_files).
         cancellation_flag (callable, optional): Function returning True to cancel.
         pause_event (threading.Event, optional): Event to pause processing.
+        encoder (StreamingBookEncoder, optional): If given, each chapter's PCM is streamed
+            into this encoder in file order instead of being written as a separate audio
+            file, so the book is encoded exactly once. The caller closes the encoder.
+        chapter_callback (callable, optional): Called with (chapter base name, output path)
+            as soon as each chapter's audio file is complete (not in encode-once mode),
+            e.g. to publish a preview while the rest of the book is synthesized.
 
     Returns:
-        list[str]: List of paths to successfully generated audio files.
+        list[str]: List of paths to successfully generated audio files
+                   (chapter base names when streaming into an encoder).
 
     Raises:
         FileNotFoundError: If input_dir does not exist.
@@ -286,11 +463,8 @@ def generate_audiobooks_kokoro(
     # --- Initialize Kokoro Pipeline ---
     pipeline = None # Define outside try block
     try:
-        print(f"  Initializing Kokoro pipeline for lang='{lang_code}' on device='{device}'...")
-        init_start_time = time.time()
         # *** CRUCIAL: Assuming KPipeline accepts 'device' argument ***
-        pipeline = KPipeline(lang_code=lang_code, device=device, repo_id='hexgrad/Kokoro-82M')
-        print(f"  Pipeline initialized in {time.time() - init_start_time:.2f}s.")
+        pipeline = acquire_pipeline(lang_code, device)
     except AssertionError as e:
          # Catch assertion errors specifically, often related to invalid lang_code
          print(f"  Error: Invalid language code '{lang_code}' provided for KPipeline.")
@@ -364,6 +538,9 @@ def generate_audiobooks_kokoro(
                 chars, duration, text_file, i, total_files
             )
 
+            # In encode-once mode the chapter goes straight into the book encoder
+            audio_sink = (lambda audio, segments, name=base_name: encoder.write_chapter(name, audio, segments)) if encoder else None
+
             success = generate_audio_for_file_kokoro(
                 input_path=input_path,
                 pipeline=pipeline,
@@ -373,14 +550,17 @@ def generate_audiobooks_kokoro(
                 split_pattern=split_pattern,
                 cancellation_flag=cancellation_flag,
                 chunk_progress_callback=file_chunk_callback, # Use the context-aware lambda
-                pause_event=pause_event
+                pause_event=pause_event,
+                audio_sink=audio_sink
             )
 
             file_elapsed_time = time.time() - file_start_time
             if success:
                 print(f"   Successfully processed '{text_file}' in {file_elapsed_time:.2f}s")
-                generated_files.append(output_path)
+                generated_files.append(base_name if encoder else output_path)
                 files_processed_successfully += 1
+                if chapter_callback and not encoder:
+                    chapter_callback(base_name, output_path)
             else:
                 print(f"   Failed to process '{text_file}' (check logs above)")
 
@@ -401,6 +581,8 @@ def generate_audiobooks_kokoro(
         total_process_time = time.time() - start_process_time
         print(f"  Successfully generated: {files_processed_successfully} / {total_files} files")
         print(f"  Total time elapsed  : {total_process_time:.2f} seconds")
+        pipeline_pool.release(pipeline)
+        _report_pipeline_pool()
         # Ensure progress reaches 100% only if fully completed without cancellation/error
         if files_processed_successfully == total_files and not (cancellation_flag and cancellation_flag()):
              if progress_callback: progress_callback(100, "Completed", total_files, total_files)
@@ -459,8 +641,7 @@ def generate_audio_for_all_voices_kokoro(
     # --- Initialize Pipeline Once ---
     pipeline = None
     try:
-        print(f"  Initializing Kokoro pipeline for lang='{lang_code}' on device='{device}'...")
-        pipeline = KPipeline(lang_code=lang_code, device=device)
+        pipeline = acquire_pipeline(lang_code, device)
     except Exception as e:
         print(f"  Error initializing Kokoro pipeline: {e}")
         traceback.print_exc()
@@ -540,6 +721,7 @@ def generate_audio_for_all_voices_kokoro(
          traceback.print_exc()
     finally:
          print("\n--- Voice Test Generation Finished ---")
+         pipeline_pool.release(pipeline)
          # Ensure 100% is reported if fully completed
          if not (cancellation_flag and cancellation_flag()):
               if progress_callback: progress_callback(100, "Completed", total_voices, total_voices)
@@ -590,6 +772,7 @@ def test_single_voice_kokoro(
         return None
 
     temp_file_path = None # Define outside try
+    pipeline = None
     try:
         # --- Create Temporary File ---
         with tempfile.NamedTemporaryFile(mode='w+', suffix='.txt', delete=False, encoding='utf-8') as temp_file:
@@ -598,10 +781,8 @@ def test_single_voice_kokoro(
         print(f"  Created temp input file: '{temp_file_path}'")
 
         # --- Initialize Pipeline ---
-        pipeline = None
         try:
-            print(f"  Initializing Kokoro pipeline...")
-            pipeline = KPipeline(lang_code=lang_code, device=device)
+            pipeline = acquire_pipeline(lang_code, device)
         except Exception as e:
             print(f"  Error initializing Kokoro pipeline: {e}")
             traceback.print_exc()
@@ -665,6 +846,7 @@ def test_single_voice_kokoro(
         if progress_callback: progress_callback(None, "Error", 1, 1)
         return None
     finally:
+        pipeline_pool.release(pipeline)
         # --- Clean up Temporary File ---
         if temp_file_path and os.path.exists(temp_file_path):
             try:
@@ -0,0 +1,120 @@
+import os
+import json
+import textwrap
+
+# --- Configuration ---
+CHAPTER_SEGMENTS_SUFFIX = ".segments.json" # Per-chapter chunk index written during synthesis
+SEEK_INDEX_VERSION = 1
+SUBTITLE_LINE_WIDTH = 42 # Characters per subtitle line
+SPOKEN_CHARS_PER_SECOND = 15.0 # ~150 words/min narration, used to estimate spoken duration
+
+# --- Spoken Duration Estimate ---
+
+def estimate_spoken_duration(text, chars_per_second=SPOKEN_CHARS_PER_SECOND):
+    """Estimate how long text takes to read aloud, in seconds, from its character count."""
+    return len(text) / chars_per_second if text else 0.0
+
+# --- Chapter Segment Index ---
+
+def chapter_segments_path(chapter_audio_dir, chapter_name):
+    """The index depends only on the synthesized text, so it is named after the chapter, not the audio format."""
+    return os.path.join(chapter_audio_dir, f"{chapter_name}{CHAPTER_SEGMENTS_SUFFIX}")
+
+def write_chapter_segments(path, segments, samplerate):
+    """
+    Save a chapter's chunk index.
+
+    Args:
+        path (str): Sidecar path (chapter_segments_path).
+        segments (list): [start_frame, frames, text] per synthesized chunk, in chapter samples.
+        samplerate (int): Sample rate the frame counts refer to.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'samplerate': samplerate, 'segments': segments}, f, ensure_ascii=False, separators=(',', ':'))
+
+def read_chapter_segments(path):
+    """Load a chapter's chunk index, or None if the chapter has none."""
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable segment index '{path}': {e}")
+        return None
+
+def rebase_chapter_segments(chapter_audio_dir, timestamps):
+    """
+    Build the book-level segment list from the per-chapter indexes.
+
+    Chapter offsets are the cumulative exact frame counts ('frames' in the
+    timestamps), so positions stay sample-accurate over the whole book.
+
+    Returns:
+        tuple: (samplerate, list of [chapter_index, start_frame, frames, text]) in book
+               samples; (None, []) if no chapter has an index.
+    """
+    samplerate, segments, offset = None, [], 0
+    for chapter_index, timestamp in enumerate(timestamps):
+        index = read_chapter_segments(chapter_segments_path(chapter_audio_dir, timestamp['chapter']))
+        chapter_rate = (index or {}).get('samplerate') or samplerate
+        frames = timestamp.get('frames')
+        if frames is None and chapter_rate: # Encoded chapters without an exact count
+            frames = round(timestamp['duration'] * chapter_rate)
+        if index:
+            samplerate = samplerate or index['samplerate']
+            if index['samplerate'] != samplerate:
+                print(f"Warning: Skipping segment index of {timestamp['chapter']} ({index['samplerate']} Hz, book is {samplerate} Hz)")
+            else:
+                segments.extend([chapter_index, offset + start, length, text] for start, length, text in index['segments'])
+        offset += frames or 0
+    return samplerate, segments
+
+# --- Book Outputs ---
+
+def write_seek_index(path, book_name, timestamps, samplerate, segments):
+    """
+    Write the compact seek index: chapter names plus one
+    [chapter_index, start_frame, frames, text] row per segment, in book samples.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    index = {
+        'version': SEEK_INDEX_VERSION,
+        'book_name': book_name,
+        'samplerate': samplerate,
+        'chapters': [timestamp['chapter'] for timestamp in timestamps],
+        'segments': segments,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    return path
+
+def _cue_time(frame, samplerate, decimal_separator):
+    milliseconds = round(1000 * frame / samplerate)
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_separator}{milliseconds:03d}"
+
+def _cues(samplerate, segments):
+    for _, start, frames, text in segments:
+        text = textwrap.fill(" ".join(text.split()), SUBTITLE_LINE_WIDTH)
+        if text:
+            yield start, start + frames, text
+
+def write_srt(path, samplerate, segments):
+    """Write one SRT cue per synthesized chunk."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for number, (start, end, text) in enumerate(_cues(samplerate, segments), start=1):
+            f.write(f"{number}\n{_cue_time(start, samplerate, ',')} --> {_cue_time(end, samplerate, ',')}\n{text}\n\n")
+    return path
+
+def write_vtt(path, samplerate, segments):
+    """Write one WebVTT cue per synthesized chunk."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("WEBVTT\n\n")
+        for start, end, text in _cues(samplerate, segments):
+            f.write(f"{_cue_time(start, samplerate, '.')} --> {_cue_time(end, samplerate, '.')}\n{text}\n\n")
+    return path
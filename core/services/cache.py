@@ -0,0 +1,106 @@
+import os
+import sys
+import gzip
+import json
+import hashlib
+import inspect
+import tempfile
+
+# --- Configuration ---
+DEFAULT_CACHE_DIR = "io/cache" # Base directory for all on-disk caches
+CACHE_FORMAT_VERSION = 1 # Bump when the on-disk entry layout changes
+HASH_CHUNK_SIZE = 1024 * 1024 # Read source files in 1 MiB chunks when hashing
+
+# --- Hashing Helpers ---
+
+def file_content_hash(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """Return the SHA-256 hex digest of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_cache_key(*parts):
+    """
+    Build a stable cache key from JSON-serializable parts.
+
+    The parts are serialized with sorted keys so dicts of settings hash the
+    same regardless of insertion order.
+    """
+    payload = json.dumps([CACHE_FORMAT_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def source_fingerprint(*objects):
+    """
+    Hash the source code of modules/functions so cached results are invalidated
+    automatically whenever that code changes.
+
+    Falls back to the object's qualified name when source is unavailable
+    (e.g. running from a frozen build), which keeps caching usable but means
+    only CACHE_FORMAT_VERSION bumps will invalidate entries.
+    """
+    digest = hashlib.sha256()
+    for obj in objects:
+        if isinstance(obj, str): # Allow passing module names
+            obj = sys.modules.get(obj, obj)
+        try:
+            source = inspect.getsource(obj)
+        except (TypeError, OSError):
+            source = getattr(obj, '__qualname__', getattr(obj, '__name__', repr(obj)))
+        digest.update(source.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+# --- Entry Storage ---
+
+def _entry_path(cache_dir, namespace, key):
+    """Entries are fanned out by the first two key characters to keep directories small."""
+    return os.path.join(cache_dir, namespace, key[:2], f"{key}.json.gz")
+
+def load_cache_entry(cache_dir, namespace, key):
+    """
+    Load a cached entry.
+
+    Returns:
+        The stored object, or None on a miss or an unreadable entry.
+    """
+    if not cache_dir:
+        return None
+    path = _entry_path(cache_dir, namespace, key)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        # A corrupt entry is treated as a miss; it will be overwritten on the next save
+        print(f"    Warning: Ignoring unreadable cache entry '{path}': {e}")
+        return None
+
+def save_cache_entry(cache_dir, namespace, key, value):
+    """
+    Store a JSON-serializable value as a gzip-compressed entry.
+
+    The entry is written to a temporary file and renamed into place so a
+    concurrent reader never sees a partially written file.
+
+    Returns:
+        str or None: Path of the written entry, or None if caching is disabled or failed.
+    """
+    if not cache_dir:
+        return None
+    path = _entry_path(cache_dir, namespace, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as temp_file:
+            temp_path = temp_file.name
+            with gzip.GzipFile(fileobj=temp_file, mode='wb', compresslevel=6, mtime=0) as gz:
+                gz.write(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        os.replace(temp_path, path)
+        return path
+    except Exception as e:
+        print(f"    Warning: Could not write cache entry '{path}': {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import threading
+
+from core.services.cache import file_content_hash, make_cache_key
+from core.services.levels import chapter_levels_path
+from core.services.alignment import chapter_segments_path, SPOKEN_CHARS_PER_SECOND
+
+# --- Configuration ---
+JOB_FILE = "job.json"
+JOB_FORMAT_VERSION = 1
+LEASE_SECONDS = 120 # A lease whose heartbeat is older than this may be taken over
+HEARTBEAT_FRACTION = 0.25 # Heartbeat every LEASE_SECONDS * HEARTBEAT_FRACTION
+POLL_SECONDS = 2.0 # Idle workers and the coordinator re-check the job this often
+
+# Job directory layout (on a filesystem every host mounts):
+#   job.json              chapters, their keys (text hash + synthesis settings) and the settings
+#   text/<chapter>.txt    chapter text, copied from the extraction output
+#   leases/<chapter>.lease  claim by one worker; its mtime is the heartbeat
+#   work/<worker>/        a worker's uncommitted output
+#   audio/                committed chapter audio + sidecars (process_output's chapter_audio_dir)
+#   done/<chapter>.json   commit markers; failed/<chapter>.json for chapters that could not be synthesized
+
+def _job_path(job_dir, *parts):
+    return os.path.join(job_dir, *parts)
+
+def _write_json_atomic(path, value):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None # Missing, or replaced/removed while we read it
+
+def job_audio_dir(job_dir):
+    """Where committed chapters are; pass it to process_output as chapter_audio_dir."""
+    return _job_path(job_dir, 'audio')
+
+def make_worker_id():
+    """Unique per process, readable in lease files: host-pid-random."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+# --- Job ---
+
+def create_job(job_dir, text_dir, book_name, voice, lang_code, audio_format='.flac', speed=1.0,
+               lease_seconds=LEASE_SECONDS, priority_seconds=None):
+    """
+    Turn the extracted chapters in text_dir into a job on the shared directory.
+
+    Workers take chapters longest first, which keeps the end of the job from
+    waiting on one long straggler. With priority_seconds (e.g. for a preview),
+    the opening chapters holding that much estimated audio, and at least the
+    first chapter, are taken first, in book order.
+
+    Chapters whose text and settings are unchanged since an earlier job in the
+    same directory keep their committed audio, so an interrupted job resumes;
+    audio of chapters that are no longer part of the book, or in another
+    format, is removed.
+
+    Returns:
+        dict: The job description written to job.json.
+    """
+    for sub in ('text', 'leases', 'work', 'audio', 'done', 'failed'):
+        os.makedirs(_job_path(job_dir, sub), exist_ok=True)
+    settings = {'voice': voice, 'lang_code': lang_code, 'audio_format': audio_format, 'speed': speed}
+    chapters = []
+    for filename in sorted(f for f in os.listdir(text_dir) if f.lower().endswith('.txt')):
+        shutil.copyfile(os.path.join(text_dir, filename), _job_path(job_dir, 'text', filename))
+        text_hash = file_content_hash(os.path.join(text_dir, filename))
+        chapters.append({'name': os.path.splitext(filename)[0], 'key': make_cache_key(text_hash, settings),
+                         'chars': os.path.getsize(os.path.join(text_dir, filename)), 'priority': False})
+    if priority_seconds is not None:
+        opening_seconds = 0.0
+        for chapter in chapters:
+            if chapter is not chapters[0] and opening_seconds >= priority_seconds:
+                break
+            chapter['priority'] = True
+            opening_seconds += chapter['chars'] / SPOKEN_CHARS_PER_SECOND
+    # Only this book's chapters in this format stay; the merge must not see other formats
+    audio_dir = _job_path(job_dir, 'audio')
+    keep = {os.path.basename(path) for chapter in chapters
+            for path in _chapter_outputs(audio_dir, chapter['name'], audio_format)}
+    for filename in os.listdir(audio_dir):
+        if filename not in keep:
+            os.remove(os.path.join(audio_dir, filename))
+    # A failed chapter gets another chance in a new job
+    for filename in os.listdir(_job_path(job_dir, 'failed')):
+        os.remove(_job_path(job_dir, 'failed', filename))
+    job = {
+        'format_version': JOB_FORMAT_VERSION,
+        'book_name': book_name,
+        **settings,
+        'lease_seconds': lease_seconds,
+        'chapters': chapters,
+    }
+    _write_json_atomic(_job_path(job_dir, JOB_FILE), job)
+    print(f"  Job: {len(chapters)} chapters in '{job_dir}'")
+    return job
+
+def load_job(job_dir):
+    job = _read_json(_job_path(job_dir, JOB_FILE))
+    if job is None:
+        raise FileNotFoundError(f"No job found in '{job_dir}'")
+    return job
+
+def job_status(job_dir, job=None):
+    """
+    Returns:
+        dict: Chapter names grouped as 'done', 'failed' and 'pending' (including leased).
+    """
+    job = job or load_job(job_dir)
+    status = {'done': [], 'failed': [], 'pending': []}
+    for chapter in job['chapters']:
+        done = _read_json(_job_path(job_dir, 'done', f"{chapter['name']}.json"))
+        failed = _read_json(_job_path(job_dir, 'failed', f"{chapter['name']}.json"))
+        if done and done.get('key') == chapter['key']:
+            status['done'].append(chapter['name'])
+        elif failed and failed.get('key') == chapter['key']:
+            status['failed'].append(chapter['name'])
+        else:
+            status['pending'].append(chapter['name'])
+    return status
+
+def wait_for_job(job_dir, poll_seconds=POLL_SECONDS, workers=(), chapter_callback=None):
+    """
+    Block until every chapter is done or failed.
+
+    Args:
+        workers (list of subprocess.Popen): Local workers; waiting stops early (with
+            chapters still pending) if all of them have exited.
+        chapter_callback (callable, optional): Called with (chapter name, committed audio path)
+            once for every chapter that is done.
+
+    Returns:
+        dict: The final job_status.
+    """
+    job = load_job(job_dir)
+    reported, announced = None, set()
+    while True:
+        status = job_status(job_dir, job)
+        if chapter_callback:
+            for name in status['done']:
+                if name not in announced:
+                    announced.add(name)
+                    chapter_callback(name, os.path.join(job_audio_dir(job_dir), f"{name}{job['audio_format']}"))
+        progress = (len(status['done']), len(status['failed']))
+        if progress != reported:
+            print(f"  Job progress: {progress[0]} done, {progress[1]} failed, {len(status['pending'])} pending")
+            reported = progress
+        if not status['pending']:
+            return status
+        if workers and all(worker.poll() is not None for worker in workers):
+            print("  Warning: All local workers exited with chapters still pending")
+            return status
+        time.sleep(poll_seconds)
+
+# --- Leases ---
+
+class Lease:
+    """
+    A worker's claim on one chapter.
+
+    The lease file is created with O_EXCL, so only one worker can hold it.
+    A heartbeat thread touches it every lease_seconds * HEARTBEAT_FRACTION;
+    a lease not touched for lease_seconds (crashed or partitioned worker) can
+    be taken over by anyone. The holder checks its token before committing,
+    so a worker whose lease was taken over discards its result.
+    """
+
+    def __init__(self, job_dir, chapter_name, worker_id, lease_seconds):
+        self.path = _job_path(job_dir, 'leases', f"{chapter_name}.lease")
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.token = uuid.uuid4().hex
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _create(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'token': self.token, 'worker': self.worker_id, 'claimed': time.time()}, f)
+        return True
+
+    def _take_over_expired(self):
+        """Remove the current lease file if its heartbeat stopped. Returns True if it was removed."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: # Age and owner from the same file
+                age = time.time() - os.fstat(f.fileno()).st_mtime
+                try:
+                    stale = json.load(f)
+                except ValueError:
+                    # Being written by the worker that just created it, or left empty by one
+                    # that crashed before writing it; only the latter ages past lease_seconds
+                    stale = {}
+        except FileNotFoundError:
+            return True
+        if age < self.lease_seconds:
+            return False
+        # Rename instead of delete: of several workers racing for the same lease, one wins
+        moved = f"{self.path}.expired.{self.token}"
+        try:
+            os.rename(self.path, moved)
+        except FileNotFoundError:
+            return True
+        if (_read_json(moved) or {}).get('token') != stale.get('token'):
+            # Another worker replaced the stale lease with a live one in the meantime: put it back
+            try:
+                os.link(moved, self.path)
+            except OSError:
+                pass
+            os.remove(moved)
+            return False
+        os.remove(moved)
+        print(f"    Lease of '{os.path.basename(self.path)}' held by {stale.get('worker', '?')} expired; taking over")
+        return True
+
+    def acquire(self):
+        if self._create() or (self._take_over_expired() and self._create()):
+            self._heartbeat = threading.Thread(target=self._beat, name='lease-heartbeat', daemon=True)
+            self._heartbeat.start()
+            return True
+        return False
+
+    def _beat(self):
+        while not self._stop.wait(self.lease_seconds * HEARTBEAT_FRACTION):
+            if not self.held():
+                return
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def held(self):
+        return (_read_json(self.path) or {}).get('token') == self.token
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+        if self.held():
+            os.remove(self.path)
+
+# --- Worker ---
+
+def _chapter_outputs(directory, chapter_name, audio_format):
+    """The files a synthesized chapter consists of: audio last, so it is committed last."""
+    audio_path = os.path.join(directory, f"{chapter_name}{audio_format}")
+    return [chapter_segments_path(directory, chapter_name), chapter_levels_path(audio_path), audio_path]
+
+def _commit_chapter(job_dir, work_dir, chapter, job, worker_id, seconds):
+    for src in _chapter_outputs(work_dir, chapter['name'], job['audio_format']):
+        if os.path.exists(src):
+            os.replace(src, _job_path(job_dir, 'audio', os.path.basename(src)))
+    _write_json_atomic(_job_path(job_dir, 'done', f"{chapter['name']}.json"), {
+        'key': chapter['key'], 'worker': worker_id, 'seconds': round(seconds, 2), 'committed': time.time(),
+    })
+
+def run_worker(job_dir, device="cuda", worker_id=None, poll_seconds=POLL_SECONDS, pipeline=None):
+    """
+    Claim, synthesize and commit chapters of a job until none are left.
+
+    Any number of workers, on any hosts sharing job_dir, may run at once.
+    A worker that finds every remaining chapter leased by others waits,
+    taking over leases that expire.
+
+    Args:
+        pipeline (KPipeline, optional): A pipeline to use; by default one is taken from the
+            shared pipeline pool (warm if this process already built one) and returned at the end.
+
+    Returns:
+        list[str]: Names of the chapters this worker committed.
+    """
+    from core.providers.kokoro import pipeline_pool, acquire_pipeline, generate_audio_for_file_kokoro # Only workers need the TTS stack
+    job = load_job(job_dir)
+    worker_id = worker_id or make_worker_id()
+    work_dir = _job_path(job_dir, 'work', worker_id)
+    os.makedirs(work_dir, exist_ok=True)
+    print(f"\n--- Worker {worker_id} on job '{job['book_name']}' ---")
+    # Priority (preview) chapters first in book order, then longest first
+    claim_order = sorted(job['chapters'], key=lambda c: (not c['priority'], 0 if c['priority'] else -c['chars']))
+    committed = []
+    pooled = None # A pipeline taken from the pool, returned when the worker stops
+    try:
+        while True:
+            pending = set(job_status(job_dir, job)['pending'])
+            if not pending:
+                break
+            lease, chapter = None, None
+            for candidate in claim_order:
+                if candidate['name'] in pending:
+                    lease = Lease(job_dir, candidate['name'], worker_id, job['lease_seconds'])
+                    if lease.acquire():
+                        chapter = candidate
+                        break
+            if chapter is None:
+                time.sleep(poll_seconds) # Everything left is leased by other workers
+                continue
+            try:
+                if chapter['name'] not in job_status(job_dir, job)['pending']:
+                    continue # Committed by a worker whose lease we took over
+                if pipeline is None:
+                    pipeline = pooled = acquire_pipeline(job['lang_code'], device)
+                print(f"  [{worker_id}] Synthesizing '{chapter['name']}'")
+                start = time.time()
+                success = generate_audio_for_file_kokoro(
+                    input_path=_job_path(job_dir, 'text', f"{chapter['name']}.txt"),
+                    pipeline=pipeline,
+                    voice=job['voice'],
+                    output_path=os.path.join(work_dir, f"{chapter['name']}{job['audio_format']}"),
+                    speed=job['speed'],
+                )
+                if not lease.held():
+                    print(f"  [{worker_id}] Lost the lease on '{chapter['name']}'; discarding its audio")
+                elif success:
+                    _commit_chapter(job_dir, work_dir, chapter, job, worker_id, time.time() - start)
+                    committed.append(chapter['name'])
+                    print(f"  [{worker_id}] Committed '{chapter['name']}' in {time.time() - start:.1f}s")
+                else:
+                    _write_json_atomic(_job_path(job_dir, 'failed', f"{chapter['name']}.json"),
+                                       {'key': chapter['key'], 'worker': worker_id, 'failed': time.time()})
+            finally:
+                for leftover in _chapter_outputs(work_dir, chapter['name'], job['audio_format']):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                lease.release()
+    finally:
+        pipeline_pool.release(pooled)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"--- Worker {worker_id} finished: {len(committed)} chapter(s) committed ---")
+    return committed
@@ -0,0 +1,134 @@
+import os
+import subprocess
+import numpy as np
+
+from core.services.profiles import stage_settings, audio_codec_args, mp3_codec_args
+
+# --- Configuration ---
+DEFAULT_SAMPLE_RATE = 24000 # Kokoro output rate
+
+class StreamingBookEncoder:
+    """
+    Single long-lived ffmpeg process that encodes a whole book as it is synthesized.
+
+    Chapters are written as int16 PCM to ffmpeg's stdin in reading order. One
+    decode-free pass produces both the final audiobook file (format from its
+    extension, e.g. mp3) and, optionally, an AAC stream in an .m4a that later
+    stages remux instead of re-encoding. Chapter timestamps are computed from
+    the exact sample counts written, with the same millisecond rounding that
+    merge_audio_files uses. Codec settings come from the 'audio' and 'aac'
+    stages of the encoding profile.
+
+    Usage:
+        with StreamingBookEncoder('book.mp3', aac_output='book.m4a') as encoder:
+            encoder.write_chapter('01_Intro', pcm_int16)
+        result = encoder.result  # {'audio_file', 'aac_file', 'timestamps', 'total_frames', 'samplerate', 'segments'}
+    """
+
+    def __init__(self, audio_output, aac_output=None, samplerate=DEFAULT_SAMPLE_RATE, channels=1, profile=None):
+        self.audio_output = audio_output
+        self.aac_output = aac_output
+        self.samplerate = samplerate
+        self.channels = channels
+        self.profile = profile
+        self.timestamps = []
+        self.segments = [] # [chapter_index, start_frame, frames, text] in book samples
+        self.total_frames = 0
+        self.result = None
+        self._position_ms = 0
+        self._process = None
+
+    def start(self):
+        """Launch the encoder process."""
+        for path in filter(None, [self.audio_output, self.aac_output]):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            if os.path.lexists(path):
+                os.remove(path) # May be a link into the store from the last publish; never write through it
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(self.samplerate), "-ac", str(self.channels),
+            "-i", "pipe:0",
+            "-map", "0:a", *mp3_codec_args(self.audio_output, self.profile), self.audio_output,
+        ]
+        if self.aac_output:
+            command += ["-map", "0:a", *audio_codec_args(stage_settings(self.profile, 'aac')), "-movflags", "+faststart", self.aac_output]
+        print(f"  Starting streaming encoder -> {self.audio_output}" + (f" + {self.aac_output}" if self.aac_output else ""))
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        return self
+
+    def write_chapter(self, chapter_name, pcm, segments=None):
+        """
+        Append one chapter's audio and record its timestamp.
+
+        Args:
+            chapter_name (str): Name recorded in the timestamps (e.g. the text file's base name).
+            pcm (np.ndarray or iterable of np.ndarray): int16 samples, shape (frames,) or
+                (frames, channels), or consecutive blocks of them (written as they come).
+            segments (list, optional): [start_frame, frames, text] chunks in chapter samples;
+                rebased into book samples.
+        """
+        if self._process is None:
+            self.start()
+        frames = 0
+        for block in [pcm] if isinstance(pcm, np.ndarray) else pcm:
+            block = np.ascontiguousarray(block, dtype='<i2')
+            self._process.stdin.write(block.tobytes())
+            frames += block.shape[0]
+        duration_ms = round(1000 * frames / self.samplerate)
+
+        chapter_index = len(self.timestamps)
+        self.timestamps.append({
+            'chapter': chapter_name,
+            'start_time': self._position_ms / 1000.0,
+            'end_time': (self._position_ms + duration_ms) / 1000.0,
+            'duration': duration_ms / 1000.0,
+            'frames': frames
+        })
+        for start, length, text in segments or []:
+            self.segments.append([chapter_index, self.total_frames + start, length, text])
+        self._position_ms += duration_ms
+        self.total_frames += frames
+
+    def close(self):
+        """
+        Flush and finish encoding.
+
+        Returns:
+            dict: {'audio_file', 'aac_file', 'timestamps', 'total_frames', 'samplerate', 'segments'}.
+
+        Raises:
+            RuntimeError: If ffmpeg exits with an error.
+        """
+        if self.result is not None:
+            return self.result
+        if self._process is None:
+            raise RuntimeError("No audio was written to the streaming encoder")
+        self._process.stdin.close()
+        return_code = self._process.wait()
+        if return_code != 0:
+            raise RuntimeError(f"ffmpeg encoder exited with code {return_code} while writing {self.audio_output}")
+        self.result = {
+            'audio_file': self.audio_output,
+            'aac_file': self.aac_output,
+            'timestamps': self.timestamps,
+            'total_frames': self.total_frames,
+            'samplerate': self.samplerate,
+            'segments': self.segments,
+        }
+        return self.result
+
+    def abort(self):
+        """Stop the encoder without finalizing (e.g. on cancellation)."""
+        if self._process and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -2,25 +2,56 @@ import fitz # PyMuPDF
 import regex as re
 import os
 import sys
+import string
 import zipfile
 import tempfile
 import time
 import unicodedata # For normalization
-from bs4 import BeautifulSoup # For improved EPUB parsing
+from lxml import etree # Streaming EPUB parsing
+from concurrent.futures import ProcessPoolExecutor
 from num2words import num2words
 import traceback # For detailed error logging if needed
+from core.services.cache import (
+    file_content_hash, make_cache_key, source_fingerprint,
+    load_cache_entry, save_cache_entry,
+)
+from core.services.memory import governor
+from core.services.alignment import SPOKEN_CHARS_PER_SECOND, estimate_spoken_duration
 
 # --- Configuration ---
 HEADER_THRESHOLD = 50 # Pixels from top to ignore
 FOOTER_THRESHOLD = 50 # Pixels from bottom to ignore
+DEFAULT_PDF_BACKEND = "blocks" # PDF text-extraction backend (see PDF_TEXT_BACKENDS)
+PDF_FAST_TEXT_FLAGS = fitz.TEXT_MEDIABOX_CLIP | fitz.TEXT_CID_FOR_UNKNOWN_UNICODE # No ligatures, whitespace or images
 # MIN_BLOCK_WIDTH_RATIO = 0.1 # Minimum block width relative to page width (Removed for now, can be noisy)
 # MIN_BLOCK_HEIGHT_RATIO = 0.1 # Minimum block height relative to page height (Removed for now, can be noisy)
-OVERLAP_CHECK_LINES = 20 # Number of lines to check for overlap between chapters
+OVERLAP_CHECK_LINES = 50 # Number of lines to check for overlap between chapters
+OVERLAP_HASH_BASE = 1_000_003 # Rolling hash base for overlap detection
+OVERLAP_HASH_MOD = (1 << 61) - 1 # Mersenne prime modulus for the rolling hash
+OVERLAP_NORMALIZE_TABLE = str.maketrans({c: ' ' for c in string.punctuation + '…'}) # Punctuation ignored by fuzzy overlap matching
+HEURISTIC_TARGET_DURATION = 15 * 60 # Target spoken length (seconds) of heuristically split chapters
+HEURISTIC_MIN_RATIO = 0.5 # Segments are cut between MIN_RATIO and MAX_RATIO times the target length
+HEURISTIC_MAX_RATIO = 1.5
+HEURISTIC_CUT_BONUS = {'heading': 0.75, 'paragraph': 0.25, 'line': 0.0} # Preference for each kind of cut point
+HEURISTIC_MIN_CHUNK_LENGTH = 100 # Avoid tiny fragments being called chapters
+HEADING_MAX_LENGTH = 80 # Longer lines are never treated as headings
+HEADING_PATTERN = re.compile( # "Chapter 4", "PART TWO", "Prologue", ...
+    r'^(?:chapter|part|book|section)\s+(?:\d+|(?-i:[IVXLCDM]+))\b|^(?:chapter|part|book|section)\s+[A-Za-z]+$|^(?:prologue|epilogue|introduction|preface|foreword|afterword|appendix)\b',
+    re.IGNORECASE)
+ROMAN_HEADING_PATTERN = re.compile(r'^[IVXLC]+\.?$') # Bare roman numeral headings (case-sensitive)
+HTML_SKIP_TAGS = {'script', 'style'} # Elements whose text is never extracted
+HTML_FEED_CHUNK_SIZE = 64 * 1024 # Bytes fed to the streaming HTML parser at a time
+EPUB_MAX_WORKERS = min(8, os.cpu_count() or 1) # Worker processes for EPUB spine documents
+EPUB_QUEUE_PER_WORKER = 2 # Spine documents queued ahead per worker (fewer near the memory budget)
+PDF_MEMORY_CHECK_PAGES = 50 # Pages between memory-budget checks during PDF extraction
+CLEAN_PIPELINE_VERSION = 1 # Bump to force re-extraction even if the code fingerprint is unchanged
+
+_pipeline_version = None # Memoized result of cleaning_pipeline_version()
 
 # --- Text Cleaning and Processing Functions ---
 # ... (Keep normalize_text, expand_abbreviations_and_initials, convert_numbers,
 #      handle_sentence_ends_and_pauses, remove_artifacts, join_wrapped_lines,
-#      basic_html_to_text, clean_pipeline - all UNCHANGED) ...
+#      clean_pipeline - all UNCHANGED) ...
 
 def normalize_text(text):
     """Apply Unicode normalization and fix common problematic characters."""
@@ -185,24 +216,68 @@ def join_wrapped_lines(text):
     return '\n'.join(filter(None, [line.strip() for line in result_lines]))
 
 
-def basic_html_to_text(html_content):
-    """Extract text from HTML using BeautifulSoup, removing scripts/styles."""
-    soup = BeautifulSoup(html_content, 'html.parser')
+class _HtmlTextCollector:
+    """
+    lxml parser target that collects text nodes in document order without
+    building a tree. Mirrors BeautifulSoup's get_text(separator='\\n', strip=True):
+    each text run between two tags is stripped and kept if non-empty.
+    """
+    def __init__(self):
+        self.parts = []
+        self._buffer = []
+        self._skip_depth = 0 # > 0 while inside <script>/<style>
+
+    def _flush(self):
+        if self._buffer:
+            text = "".join(self._buffer).strip()
+            if text:
+                self.parts.append(text)
+            self._buffer = []
+
+    def start(self, tag, attrib):
+        self._flush()
+        if tag.rsplit('}', 1)[-1].lower() in HTML_SKIP_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag):
+        self._flush()
+        if tag.rsplit('}', 1)[-1].lower() in HTML_SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data):
+        if not self._skip_depth:
+            self._buffer.append(data)
+
+    def close(self):
+        self._flush()
+        return self.parts
+
+def stream_html_to_text(html_content, chunk_size=HTML_FEED_CHUNK_SIZE):
+    """
+    Extract text from HTML/XHTML with lxml's event-driven parser, skipping scripts/styles.
 
-    # Remove script and style elements
-    for script_or_style in soup(["script", "style"]):
-        script_or_style.decompose()
+    No tree is built: the document is fed to the parser in chunks and text is
+    collected as it streams.
+
+    Args:
+        html_content (str | bytes): The document. Bytes are decoded as UTF-8 (ignoring errors).
+        chunk_size (int): Number of bytes fed to the parser at a time.
+    """
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('utf-8', errors='ignore')
+    # Re-encode so the parser sees clean UTF-8 regardless of any encoding declaration
+    data = html_content.encode('utf-8')
 
-    # Get text, joining paragraphs/blocks with double newlines
-    # Use strip=True to remove extra whitespace around tags
-    # Use separator='\n' to ensure block elements get newlines between them
-    text = soup.get_text(separator='\n', strip=True)
+    parser = etree.HTMLParser(target=_HtmlTextCollector(), encoding='utf-8', remove_comments=True)
+    for offset in range(0, len(data), chunk_size):
+        parser.feed(data[offset:offset + chunk_size])
+    parts = parser.close() if data else []
 
+    text = "\n".join(parts)
     # Collapse multiple spaces resulting from inline tags
     text = re.sub(r'[ \t]+', ' ', text)
     # Collapse multiple newlines into max two (paragraph break)
     text = re.sub(r'\n\s*\n', '\n\n', text)
-
     return text
 
 def clean_pipeline(text):
@@ -229,37 +304,111 @@ def clean_pipeline(text):
     # print("--- After final cleanup ---\n", text[:500]) # Debug
     return text
 
+def cleaning_pipeline_version():
+    """
+    Version string for the cleaning/structuring code, used in extraction cache keys.
+
+    Combines CLEAN_PIPELINE_VERSION with a fingerprint of this module's source,
+    so any edit to the cleaning or chapter-structuring code invalidates
+    previously cached chapters automatically.
+    """
+    global _pipeline_version
+    if _pipeline_version is None:
+        _pipeline_version = f"{CLEAN_PIPELINE_VERSION}-{source_fingerprint(__name__)}"
+    return _pipeline_version
+
 # --- PDF Extraction ---
+# Each backend takes a fitz.Page and returns that page's text with headers/footers
+# removed: one line per text block, internal whitespace collapsed. Backends are
+# selected by name through PDF_TEXT_BACKENDS (see extract_book's pdf_backend).
+
+def _in_body(y0, y1, page_height):
+    """True if a box with vertical extent [y0, y1] is outside the header/footer bands."""
+    return not (y1 < HEADER_THRESHOLD or y0 > page_height - FOOTER_THRESHOLD)
+
+def _join_block_texts(block_texts):
+    """Collapse whitespace inside each block and join non-empty blocks with newlines."""
+    cleaned = (re.sub(r'\s+', ' ', text).strip() for text in block_texts)
+    return "\n".join(text for text in cleaned if text)
+
+def pdf_page_text_blocks(page, flags=fitz.TEXTFLAGS_TEXT):
+    """Original backend: get_text("blocks") filtered by block position."""
+    page_height = page.rect.height
+    blocks = page.get_text("blocks", flags=flags)
+    return _join_block_texts(text for x0, y0, x1, y1, text, *_ in blocks if _in_body(y0, y1, page_height))
+
+def pdf_page_text_blocks_fast(page):
+    """get_text("blocks") with ligature, whitespace and image flags off."""
+    return pdf_page_text_blocks(page, flags=PDF_FAST_TEXT_FLAGS)
+
+def pdf_page_text_plain(page):
+    """
+    get_text("text") clipped to the body area. MuPDF does the header/footer
+    filtering via the clip rectangle, so partially clipped blocks keep their
+    inner lines (the blocks backend drops or keeps whole blocks).
+    """
+    rect = page.rect
+    clip = fitz.Rect(rect.x0, rect.y0 + HEADER_THRESHOLD, rect.x1, rect.y1 - FOOTER_THRESHOLD)
+    text = page.get_text("text", flags=PDF_FAST_TEXT_FLAGS | fitz.TEXT_PARAGRAPH_BREAK, clip=clip)
+    # Paragraph breaks come out as blank lines; treat each paragraph like a block
+    return _join_block_texts(text.split("\n\n"))
+
+def pdf_page_text_words(page):
+    """get_text("words"), filtered per word and regrouped by block number."""
+    page_height = page.rect.height
+    blocks = {}
+    for x0, y0, x1, y1, word, block_no, *_ in page.get_text("words", flags=PDF_FAST_TEXT_FLAGS):
+        if _in_body(y0, y1, page_height):
+            blocks.setdefault(block_no, []).append(word)
+    return _join_block_texts(" ".join(words) for words in blocks.values())
+
+def pdf_page_text_rawdict(page):
+    """get_text("rawdict"): character-level output, included mainly as a benchmark baseline."""
+    page_height = page.rect.height
+    block_texts = []
+    for block in page.get_text("rawdict", flags=PDF_FAST_TEXT_FLAGS)["blocks"]:
+        x0, y0, x1, y1 = block["bbox"]
+        if block.get("type", 0) != 0 or not _in_body(y0, y1, page_height):
+            continue
+        block_texts.append(" ".join(
+            "".join(char["c"] for span in line["spans"] for char in span["chars"])
+            for line in block["lines"]
+        ))
+    return _join_block_texts(block_texts)
+
+PDF_TEXT_BACKENDS = {
+    'blocks': pdf_page_text_blocks,
+    'blocks_fast': pdf_page_text_blocks_fast,
+    'text': pdf_page_text_plain,
+    'words': pdf_page_text_words,
+    'rawdict': pdf_page_text_rawdict,
+}
+
+def get_pdf_text_backend(name):
+    """Look up a PDF text-extraction backend by name."""
+    try:
+        return PDF_TEXT_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown PDF text backend: '{name}'. Available: {', '.join(PDF_TEXT_BACKENDS)}") from None
 
-def extract_pdf_text_by_page(doc):
+def extract_pdf_text_by_page(doc, backend=DEFAULT_PDF_BACKEND):
     """
     Extracts text page by page from PDF, filtering headers/footers.
 
+    Args:
+        doc (fitz.Document): The opened PDF.
+        backend (str): Name of the PDF_TEXT_BACKENDS entry used per page.
+
     Returns:
         list[str]: A list where each element is the text content of a page.
     """
+    page_text_func = get_pdf_text_backend(backend)
     all_pages_text = []
     for page_num in range(len(doc)):
         page = doc.load_page(page_num)
-        page_height = page.rect.height
-        # page_width = page.rect.width # Not currently used but available
-
-        # Extract text blocks
-        blocks = page.get_text("blocks", flags=fitz.TEXTFLAGS_TEXT) # Basic flags
-        filtered_lines = []
-        for block in blocks:
-            x0, y0, x1, y1, text, *_ = block
-            # Filter by position (header/footer)
-            if y1 < HEADER_THRESHOLD or y0 > page_height - FOOTER_THRESHOLD:
-                continue
-
-            # Simple text cleaning per block (remove excess internal whitespace)
-            cleaned_block_text = re.sub(r'\s+', ' ', text).strip()
-            if cleaned_block_text:
-                filtered_lines.append(cleaned_block_text)
-
-        page_text = "\n".join(filtered_lines) # Join blocks with newline for structure within page
-        all_pages_text.append(page_text)
+        all_pages_text.append(page_text_func(page))
+        if page_num % PDF_MEMORY_CHECK_PAGES == 0 and governor.near_budget():
+            fitz.TOOLS.store_shrink(100) # Near the memory budget: drop MuPDF's cached fonts/images
     return all_pages_text
 
 # --- TOC and Chapter Structuring ---
@@ -287,37 +436,77 @@ def deduplicate_toc(toc):
             print(f"    Info: Duplicate TOC entry page removed: Level {level}, '{title}', Page {page_number}")
     return deduplicated_toc
 
-def remove_overlap(prev_text, curr_text, num_lines=OVERLAP_CHECK_LINES):
+def normalize_overlap_line(line):
+    """Normalize a line for fuzzy overlap matching (case, punctuation and spacing insensitive)."""
+    return ' '.join(line.casefold().translate(OVERLAP_NORMALIZE_TABLE).split())
+
+def _line_hashes(lines, fuzzy):
+    """Map lines to integer hashes in [0, OVERLAP_HASH_MOD) for the rolling hash."""
+    if fuzzy:
+        lines = [normalize_overlap_line(line) for line in lines]
+    # Python's str hash is stable within a process, which is all we need here
+    return [hash(line) % OVERLAP_HASH_MOD for line in lines], lines
+
+def remove_overlap(prev_text, curr_text, num_lines=OVERLAP_CHECK_LINES, fuzzy=False):
     """
     Checks if the end of prev_text overlaps with the start of curr_text
     and returns prev_text with the overlap removed. Based on line comparison.
-    """
-    if not prev_text or not curr_text:
-        return prev_text
 
-    prev_lines = prev_text.splitlines()
-    curr_lines = curr_text.splitlines()
+    Only the chapter boundaries are examined: the last `num_lines` lines of
+    prev_text and the first `num_lines` lines of curr_text. Every candidate
+    overlap size is compared in O(1) using polynomial rolling hashes over the
+    line sequence, so the whole check is linear in the window size. Hash
+    matches are verified line by line before anything is removed, and an
+    overlap only counts if one of its lines has letters or digits: a scene
+    break like '* * *' matching a blank or punctuation-only opening line is
+    not an overlap.
 
-    # Don't check if either text is too short
-    if not prev_lines or not curr_lines:
+    Args:
+        prev_text (str): Cleaned text of the previous chapter.
+        curr_text (str): Cleaned text of the current chapter.
+        num_lines (int): Maximum number of overlapping lines to look for.
+        fuzzy (bool): Opt-in. If True, lines are compared after normalize_overlap_line,
+                      so differences in case, punctuation or spacing still match.
+                      The default compares lines exactly, like the original scan.
+    """
+    if not prev_text or not curr_text or num_lines < 1:
         return prev_text
 
-    max_possible_overlap = min(len(prev_lines), len(curr_lines), num_lines)
-
-    for overlap_size in range(max_possible_overlap, 0, -1):
-        # Compare last `overlap_size` lines of prev with first `overlap_size` lines of curr
-        prev_suffix = prev_lines[-overlap_size:]
-        curr_prefix = curr_lines[:overlap_size]
-
-        # Basic check: are the lines identical?
-        # More robust checks could involve fuzzy matching, but start simple.
-        if prev_suffix == curr_prefix:
-            print(f"    Overlap detected ({overlap_size} lines). Removing from previous chapter end.")
-            # Return previous text excluding the overlapping lines
-            return "\n".join(prev_lines[:-overlap_size])
-
-    # No overlap found
-    return prev_text
+    # Split only the edges we need instead of the whole chapter texts
+    prev_parts = prev_text.rsplit('\n', num_lines)
+    curr_lines = curr_text.split('\n', num_lines)[:num_lines]
+    # rsplit leaves the untouched head as the first element when the text is long enough
+    prev_head = prev_parts[0] if len(prev_parts) > num_lines else None
+    prev_tail = prev_parts[1:] if prev_head is not None else prev_parts
+
+    max_possible_overlap = min(len(prev_tail), len(curr_lines))
+    prev_hashes, prev_keys = _line_hashes(prev_tail[-max_possible_overlap:], fuzzy)
+    curr_hashes, curr_keys = _line_hashes(curr_lines[:max_possible_overlap], fuzzy)
+
+    # suffix_hash[k] / prefix_hash[k] hash the last / first k lines, with the first
+    # line of the sequence carrying the highest power so both are comparable.
+    best_overlap = 0
+    has_content = False # Whether the last k lines include a line that normalizes to something
+    suffix_hash = 0
+    prefix_hash = 0
+    power = 1
+    for k in range(1, max_possible_overlap + 1):
+        suffix_hash = (prev_hashes[-k] * power + suffix_hash) % OVERLAP_HASH_MOD
+        prefix_hash = (prefix_hash * OVERLAP_HASH_BASE + curr_hashes[k - 1]) % OVERLAP_HASH_MOD
+        power = (power * OVERLAP_HASH_BASE) % OVERLAP_HASH_MOD
+        has_content = has_content or bool(prev_keys[-k] if fuzzy else normalize_overlap_line(prev_keys[-k]))
+        if has_content and suffix_hash == prefix_hash and prev_keys[-k:] == curr_keys[:k]:
+            best_overlap = k # Keep going: the largest overlap wins, like the original scan
+
+    if not best_overlap:
+        return prev_text # No overlap found
+
+    print(f"    Overlap detected ({best_overlap} lines). Removing from previous chapter end.")
+    # Return previous text excluding the overlapping lines
+    kept_tail = prev_tail[:-best_overlap]
+    if prev_head is None:
+        return "\n".join(kept_tail)
+    return "\n".join([prev_head, *kept_tail])
 
 
 def structure_pdf_by_toc(deduplicated_toc, all_pages_text):
@@ -402,81 +591,265 @@ def structure_pdf_by_toc(deduplicated_toc, all_pages_text):
     return final_chapters
 
 # --- Heuristic Chapter Splitting (Fallback for PDF without TOC) ---
-def split_text_into_heuristic_chapters(full_raw_text):
+
+def is_heading_line(line):
+    """Heuristic check for chapter-like heading lines ("CHAPTER IV", "Part Two", short ALL CAPS lines)."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > HEADING_MAX_LENGTH:
+        return False
+    if HEADING_PATTERN.match(stripped) or ROMAN_HEADING_PATTERN.match(stripped):
+        return True
+    # Short ALL CAPS lines with at least a couple of letters (e.g. "THE RIVER")
+    letters = [c for c in stripped if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters) and not stripped.endswith(('.', ','))
+
+def _cut_point_kind(prev_line, line):
+    """Classify the boundary *before* `line` as 'heading', 'paragraph' or 'line'."""
+    if is_heading_line(line):
+        return 'heading'
+    if not line.strip() or not prev_line.strip() or re.search(r'[.!?:"\'»)]$', prev_line.strip()):
+        return 'paragraph'
+    return 'line' # Mid-sentence wrap: only used when a cut is forced
+
+def split_text_into_heuristic_chapters(full_raw_text, target_duration=HEURISTIC_TARGET_DURATION, chars_per_second=SPOKEN_CHARS_PER_SECOND):
     """
-    Attempts to split raw text into chapters based on heuristics like
-    multiple newlines or potential chapter-like headings.
+    Splits raw text into chapter-sized segments of roughly equal spoken duration.
+
+    Spoken duration is estimated from character counts. Each segment is cut
+    within [0.5, 1.5] x target_duration, at the candidate boundary with the
+    best score: heading-like lines are preferred, then paragraph breaks, and
+    a mid-sentence line break is only used when no better cut exists. A short
+    trailing segment is merged into the previous one. Balanced segments keep
+    per-file overhead low and let synthesis be spread evenly across workers.
 
     Args:
         full_raw_text (str): The combined raw text from all PDF pages.
+        target_duration (float): Target spoken length per segment, in seconds.
+        chars_per_second (float): Speaking rate used for the duration estimate.
 
     Returns:
-        list[dict]: List of chapters [{'title': 'Chapter N', 'text': cleaned_chunk}, ...],
-                    or an empty list if splitting fails or text is empty.
+        list[dict]: List of chapters [{'title': 'Chapter_N', 'level': None, 'text': cleaned_chunk,
+                    'estimated_duration': seconds}, ...], or an empty list if the text is empty.
     """
     if not full_raw_text or not full_raw_text.strip():
         return []
 
-    print("    Attempting heuristic chapter splitting...")
+    target_chars = max(1, int(target_duration * chars_per_second))
+    min_chars = target_chars * HEURISTIC_MIN_RATIO
+    max_chars = target_chars * HEURISTIC_MAX_RATIO
+    print(f"    Attempting duration-balanced chapter splitting (target ~{target_duration / 60:.1f} min, ~{target_chars} chars)...")
 
-    # --- Strategy 1: Split by multiple newlines (common section break) ---
-    # Use 3 or more newlines as a strong indicator of a major break.
-    # This needs to happen *before* aggressive whitespace cleaning.
-    potential_chunks = re.split(r'\n\s*\n+', full_raw_text) # 3+ newlines with optional whitespace
+    lines = full_raw_text.split('\n')
+    # offsets[i] = number of characters (including newlines) before line i
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+
+    # --- Choose cut points ---
+    segments = [] # (start_line, end_line) pairs, end exclusive
+    seg_start = 0
+    best_cut = None # (cost, line_index)
+    i = seg_start + 1
+    while i < len(lines):
+        seg_chars = offsets[i] - offsets[seg_start]
+        if seg_chars >= min_chars:
+            kind = _cut_point_kind(lines[i - 1], lines[i])
+            cost = abs(seg_chars - target_chars) / target_chars - HEURISTIC_CUT_BONUS[kind]
+            if best_cut is None or cost < best_cut[0]:
+                best_cut = (cost, i)
+        if seg_chars >= max_chars:
+            cut = best_cut[1] if best_cut else i
+            segments.append((seg_start, cut))
+            seg_start, best_cut = cut, None
+            i = seg_start + 1 # Re-scan lines after the cut as part of the next segment
+            continue
+        i += 1
+
+    # The remainder becomes the last segment, merged into the previous one if it is too short
+    if segments and offsets[len(lines)] - offsets[seg_start] < min_chars:
+        segments[-1] = (segments[-1][0], len(lines))
+    else:
+        segments.append((seg_start, len(lines)))
 
-    # --- Refine Chunks (Basic filtering) ---
+    # --- Clean each segment ---
     chapters = []
-    chapter_count = 0
-    min_chunk_length = 100 # Avoid tiny fragments being called chapters
-
-    for i, chunk in enumerate(potential_chunks):
-        trimmed_chunk = chunk.strip()
-        if len(trimmed_chunk) > min_chunk_length:
-            chapter_count += 1
-            # Apply the full cleaning pipeline *to each chunk*
-            cleaned_chunk_text = clean_pipeline(trimmed_chunk)
-            if cleaned_chunk_text: # Ensure cleaning didn't make it empty
-                chapters.append({
-                    'title': f'Chapter_{chapter_count}', # Generic title
-                    'level': None, # No level info available
-                    'text': cleaned_chunk_text
-                })
-        # else: # Optional: Log discarded small chunks
-            # print(f"      Discarding small chunk {i+1} (length {len(trimmed_chunk)})")
-
-
-    # --- Alternative/Future Strategy (More Complex): Look for Header Patterns ---
-    # This would involve regex for "CHAPTER X", "Part Y", lines in ALL CAPS, etc.
-    # Requires more careful implementation to avoid false positives.
-    # Example (conceptual, not fully implemented):
-    # chapter_start_pattern = r'^\s*(?:CHAPTER|PART)\s+[IVXLCDM\d]+.*$|^\s*[A-Z\s]{5,}\s*$' # Regex for CHAPTER X or ALL CAPS lines
-    # if not chapters: # Only if newline split failed
-    #    lines = full_raw_text.splitlines()
-    #    current_chapter_lines = []
-    #    for line in lines:
-    #        if re.match(chapter_start_pattern, line, re.IGNORECASE) and current_chapter_lines:
-    #             # Found potential new chapter, process the previous one
-    #             # ... (logic to save previous chapter, clean it, etc.) ...
-    #             current_chapter_lines = [line]
-    #        else:
-    #             current_chapter_lines.append(line)
-    #    # Process the last chapter
+    for start, end in segments:
+        trimmed_chunk = "\n".join(lines[start:end]).strip()
+        if len(trimmed_chunk) <= HEURISTIC_MIN_CHUNK_LENGTH:
+            continue # Avoid tiny fragments being called chapters
+        # Apply the full cleaning pipeline *to each chunk*
+        cleaned_chunk_text = clean_pipeline(trimmed_chunk)
+        if cleaned_chunk_text: # Ensure cleaning didn't make it empty
+            chapters.append({
+                'title': f'Chapter_{len(chapters) + 1}', # Generic title
+                'level': None, # No level info available
+                'text': cleaned_chunk_text,
+                'estimated_duration': round(estimate_spoken_duration(cleaned_chunk_text, chars_per_second), 1)
+            })
 
     if chapters:
-        print(f"    Heuristically split into {len(chapters)} potential chapters.")
+        durations = [chap['estimated_duration'] / 60 for chap in chapters]
+        print(f"    Heuristically split into {len(chapters)} segments "
+              f"({min(durations):.1f}-{max(durations):.1f} min, estimated).")
     else:
         print("    Heuristic splitting did not yield significant chapters.")
 
     return chapters
 
 # --- EPUB Extraction ---
-# ... (Keep parse_epub_content UNCHANGED) ...
-def parse_epub_content(epub_path, progress_callback=None):
+
+EPUB_OPS_NS = 'http://www.idpf.org/2007/ops' # Namespace of the EPUB3 epub:type attribute
+EPUB_CONTENT_EXTENSIONS = ('.html', '.xhtml', '.htm')
+
+def _epub_zip_path(base_path, href):
+    """Resolve an href relative to a directory inside the EPUB zip."""
+    return os.path.normpath(os.path.join(base_path, href)).replace('\\', '/')
+
+def _parse_epub_xml(content):
+    """Parse an OPF/NCX/nav document with lxml, tolerating minor XML errors."""
+    return etree.fromstring(content, parser=etree.XMLParser(recover=True, resolve_entities=False, huge_tree=True))
+
+def _element_text(element):
+    """Equivalent of BeautifulSoup get_text(strip=True) for an lxml element."""
+    return "".join(part.strip() for part in element.itertext())
+
+def read_epub_toc_map(epub_zip, nav_full_path):
+    """
+    Build a map of content file paths (inside the zip) to titles from the
+    EPUB3 nav document or the EPUB2 NCX.
+
+    Returns:
+        dict: {content_path: title}. Empty if the TOC file can't be parsed.
+    """
+    toc_map = {}
+    try:
+        nav_root = _parse_epub_xml(epub_zip.read(nav_full_path))
+        if nav_root is None:
+            return toc_map
+        nav_dir = os.path.dirname(nav_full_path)
+
+        # EPUB3 Nav: Look for <nav epub:type="toc"> links
+        nav_elements = list(nav_root.iter('{*}nav', 'nav'))
+        nav_element = next((nav for nav in nav_elements
+                            if 'toc' in (nav.get(f'{{{EPUB_OPS_NS}}}type') or nav.get('epub:type') or '').split()),
+                           nav_elements[0] if nav_elements else None) # Fallback to first nav
+        if nav_element is not None:
+            print(f"  Parsing EPUB3 Nav TOC from '{nav_full_path}'...")
+            for link in nav_element.iter('{*}a', 'a'):
+                href = link.get('href')
+                if href:
+                    # Resolve relative href against nav file path, store without fragment
+                    toc_map[_epub_zip_path(nav_dir, href).split('#')[0]] = _element_text(link)
+        # EPUB2 NCX: Look for <navPoint> elements
+        elif next(nav_root.iter('{*}navMap'), None) is not None:
+            print(f"  Parsing EPUB2 NCX TOC from '{nav_full_path}'...")
+            for nav_point in nav_root.iter('{*}navPoint'):
+                content = nav_point.find('{*}content')
+                nav_label = nav_point.find('{*}navLabel')
+                if content is not None and nav_label is not None:
+                    src = content.get('src')
+                    if src:
+                        # Resolve relative src against NCX file path, store without fragment
+                        toc_map[_epub_zip_path(nav_dir, src).split('#')[0]] = _element_text(nav_label)
+    except Exception as toc_e:
+        print(f"    Warning: Could not parse TOC file '{nav_full_path}': {toc_e}")
+    return toc_map
+
+def read_epub_spine(epub_zip):
     """
-    Extracts and cleans text content from EPUB using BeautifulSoup.
+    Resolve the reading order of an EPUB from its OPF manifest and spine.
 
     Returns:
-        list[dict]: A list of chapters, each with 'title' (filename) and 'text'.
+        tuple: (spine_entries, toc_map) where spine_entries is a list of
+               (idref, content_path, relative_href) in reading order and
+               toc_map maps content paths to nav/NCX titles.
+    """
+    # Find the OPF file (usually content.opf)
+    opf_path = None
+    try:
+        container_root = _parse_epub_xml(epub_zip.read('META-INF/container.xml'))
+        rootfile = next(container_root.iter('{*}rootfile'), None) if container_root is not None else None
+        if rootfile is not None and rootfile.get('full-path'):
+            opf_path = rootfile.get('full-path')
+    except KeyError:
+        pass # No container.xml, search manually below
+    if not opf_path:
+        opf_path = next((item for item in epub_zip.namelist() if item.lower().endswith('.opf')), None)
+
+    if not opf_path:
+        print("  Error: Could not find OPF file in EPUB via container.xml or direct search.")
+        # Fallback: process all HTML/XHTML files naively, assuming alphabetical order is spine order
+        content_files = sorted(f for f in epub_zip.namelist() if f.lower().endswith(EPUB_CONTENT_EXTENSIONS))
+        print(f"  Falling back to processing {len(content_files)} HTML files found.")
+        return [(f, f, f) for f in content_files], {}
+
+    print(f"  Found OPF file: '{opf_path}'")
+    opf_root = _parse_epub_xml(epub_zip.read(opf_path))
+    manifest_items = {}
+    nav_href = None
+    for item in opf_root.iter('{*}item'):
+        item_id = item.get('id')
+        item_href = item.get('href')
+        if item_id and item_href:
+            manifest_items[item_id] = {'href': item_href, 'media-type': item.get('media-type') or ''}
+            if 'nav' in (item.get('properties') or '').split():
+                nav_href = item_href # EPUB3 Nav document
+
+    spine = next(opf_root.iter('{*}spine'), None)
+    if spine is not None:
+        spine_order_refs = [itemref.get('idref') for itemref in spine.iter('{*}itemref')]
+    else:
+        print("  Warning: Could not find <spine> in OPF. Extraction order might be incorrect.")
+        # Fallback: Use manifest items that are HTML, sorted by href which often includes numbers
+        spine_order_refs = sorted((id for id, item in manifest_items.items() if 'html' in item['media-type']),
+                                  key=lambda idref: manifest_items[idref]['href'])
+
+    print(f"  Found {len(manifest_items)} manifest items and {len(spine_order_refs)} spine references.")
+    # Base path is the directory containing the OPF file
+    epub_base_path = os.path.dirname(opf_path)
+
+    # --- NCX/Nav TOC Parsing (for titles) ---
+    if not nav_href: # Try EPUB2 NCX
+        spine_toc_id = spine.get('toc') if spine is not None else None
+        if spine_toc_id and spine_toc_id in manifest_items:
+            nav_href = manifest_items[spine_toc_id]['href']
+    toc_map = read_epub_toc_map(epub_zip, _epub_zip_path(epub_base_path, nav_href)) if nav_href else {}
+
+    spine_entries = []
+    for idref in spine_order_refs:
+        item = manifest_items.get(idref)
+        if not item:
+            print(f"    Skipping spine item: ID '{idref}' not found in manifest.")
+            continue
+        item_media_type = item['media-type']
+        if 'html' not in item_media_type and 'xml' not in item_media_type: # Allow xhtml and xml
+            print(f"    Skipping non-HTML/XML spine item: {idref} ({item_media_type})")
+            continue
+        relative_href = item['href']
+        # Construct full path within zip relative to OPF directory
+        spine_entries.append((idref, _epub_zip_path(epub_base_path, relative_href), relative_href))
+    return spine_entries, toc_map
+
+def process_epub_document(html_content):
+    """Decode, extract and clean one spine document. Runs in a worker process."""
+    return clean_pipeline(stream_html_to_text(html_content))
+
+def parse_epub_content(epub_path, progress_callback=None, max_workers=EPUB_MAX_WORKERS):
+    """
+    Extracts and cleans text content from EPUB.
+
+    Spine documents are read from the zip only when they are queued, then
+    decoded, stream-parsed with lxml and cleaned concurrently on a process
+    pool, so only the queued documents are in memory at once. Results are
+    reassembled in spine order; titles come from the EPUB3 nav or EPUB2 NCX.
+
+    Args:
+        epub_path (str): Path to the EPUB file.
+        progress_callback (callable, optional): Receives progress percentage (10-95).
+        max_workers (int): Worker processes for spine documents. 1 processes serially in-process.
+
+    Returns:
+        list[dict]: A list of chapters, each with 'title' (TOC title or filename) and 'text'.
     """
     chapters = []
     print(f"  Processing EPUB: '{os.path.basename(epub_path)}'")
@@ -484,160 +857,69 @@ def parse_epub_content(epub_path, progress_callback=None):
 
     try:
         with zipfile.ZipFile(epub_path, 'r') as epub_zip:
-            # Find the OPF file (usually content.opf)
-            opf_path = None
-            container_xml = epub_zip.read('META-INF/container.xml').decode('utf-8')
-            container_soup = BeautifulSoup(container_xml, 'xml')
-            opf_relative_path = container_soup.find('rootfile')
-            if opf_relative_path and opf_relative_path.get('full-path'):
-                 opf_path = opf_relative_path.get('full-path')
-            else: # Fallback: search manually
-                for item in epub_zip.namelist():
-                     if item.lower().endswith('.opf'):
-                        opf_path = item
-                        break
-
-            if not opf_path:
-                print("  Error: Could not find OPF file in EPUB via container.xml or direct search.")
-                # Fallback: process all HTML/XHTML files naively
-                content_files = sorted([f for f in epub_zip.namelist() if f.lower().endswith(('.html', '.xhtml', '.htm'))])
-                manifest_items = {} # No manifest known
-                spine_order = content_files # Assume alphabetical order is spine order
-                opf_soup = None
-                epub_base_path = '' # No reliable base path
-                print(f"  Falling back to processing {len(content_files)} HTML files found.")
+            spine_entries, toc_map = read_epub_spine(epub_zip)
 
-            else:
-                print(f"  Found OPF file: '{opf_path}'")
-                # Parse OPF to get manifest and spine
-                opf_content = epub_zip.read(opf_path).decode('utf-8', errors='ignore')
-                opf_soup = BeautifulSoup(opf_content, 'xml') # Use 'xml' parser for OPF
-                manifest_items = {}
-                for item in opf_soup.find('manifest').find_all('item'):
-                    item_id = item.get('id')
-                    item_href = item.get('href')
-                    if item_id and item_href:
-                         manifest_items[item_id] = {'href': item_href, 'media-type': item.get('media-type')}
-
-                spine = opf_soup.find('spine')
-                spine_order_refs = []
-                if spine:
-                    spine_order_refs = [item.get('idref') for item in spine.find_all('itemref')]
-                else:
-                     print("  Warning: Could not find <spine> in OPF. Extraction order might be incorrect.")
-                     # Fallback: Use manifest items that are HTML, hoping order is somewhat meaningful
-                     spine_order_refs = [id for id, item in manifest_items.items() if 'html' in item.get('media-type', '')]
-                     # Attempt to sort by href, often includes numbers
-                     spine_order_refs.sort(key=lambda idref: manifest_items[idref]['href'])
-
-
-                print(f"  Found {len(manifest_items)} manifest items and {len(spine_order_refs)} spine references.")
-                # Base path is the directory containing the OPF file
-                epub_base_path = os.path.dirname(opf_path) if '/' in opf_path else ''
-
-            # --- NCX/Nav TOC Parsing (Optional but good for titles) ---
-            toc_map = {} # Map hrefs to titles
-            nav_href = None
-            # Try EPUB3 Nav document first
-            nav_item = opf_soup.find('item', {'properties': 'nav'}) if opf_soup else None
-            if nav_item:
-                nav_href = nav_item.get('href')
-            else: # Try EPUB2 NCX
-                spine_toc_id = spine.get('toc') if spine else None
-                if spine_toc_id and spine_toc_id in manifest_items:
-                    nav_href = manifest_items[spine_toc_id].get('href')
-
-            if nav_href:
+            def read_document(index):
+                """A spine document's bytes, read when it is queued (zip access stays on this thread)."""
+                idref, content_path, _ = spine_entries[index]
                 try:
-                    nav_full_path = os.path.normpath(os.path.join(epub_base_path, nav_href)).replace('\\', '/')
-                    nav_content = epub_zip.read(nav_full_path).decode('utf-8', errors='ignore')
-                    nav_soup = BeautifulSoup(nav_content, 'lxml') # Use lxml for potentially complex nav
-
-                    # EPUB3 Nav: Look for <nav type="toc"> links
-                    nav_element = nav_soup.find('nav', {'epub:type': 'toc'}) or nav_soup.find('nav') # Fallback to first nav
-                    if nav_element:
-                         print(f"  Parsing EPUB3 Nav TOC from '{nav_full_path}'...")
-                         for link in nav_element.find_all('a'):
-                             href = link.get('href')
-                             title = link.get_text(strip=True)
-                             if href:
-                                 # Resolve relative href against nav file path
-                                 abs_href = os.path.normpath(os.path.join(os.path.dirname(nav_full_path), href)).replace('\\', '/')
-                                 # Store base filename as key
-                                 toc_map[abs_href.split('#')[0]] = title # Remove fragment
-                    # EPUB2 NCX: Look for <navPoint> elements
-                    elif nav_soup.find('navMap'):
-                         print(f"  Parsing EPUB2 NCX TOC from '{nav_full_path}'...")
-                         for nav_point in nav_soup.find_all('navPoint'):
-                             content = nav_point.find('content')
-                             nav_label = nav_point.find('navLabel')
-                             if content and nav_label:
-                                 src = content.get('src')
-                                 title = nav_label.get_text(strip=True)
-                                 if src:
-                                     # Resolve relative src against NCX file path
-                                     abs_src = os.path.normpath(os.path.join(os.path.dirname(nav_full_path), src)).replace('\\', '/')
-                                     # Store base filename as key
-                                     toc_map[abs_src.split('#')[0]] = title # Remove fragment
-                except Exception as toc_e:
-                    print(f"    Warning: Could not parse TOC file '{nav_href}': {toc_e}")
-
-
-            # --- Process files in spine order ---
-            total_files_in_spine = len(spine_order_refs)
-            processed_spine_files = 0
-
-            for i, idref in enumerate(spine_order_refs):
-                item = manifest_items.get(idref)
-                if not item:
-                    # If using fallback where spine_order contains filenames directly
-                    if idref in epub_zip.namelist() and idref.lower().endswith(('.html','.xhtml','.htm')):
-                        content_path = idref
-                        relative_href = idref # Use filename itself
-                        item_media_type = 'application/xhtml+xml' # Assume HTML
+                    return epub_zip.read(content_path)
+                except KeyError:
+                    print(f"    Error: File path not found in zip for idref '{idref}': '{content_path}'")
+                    return None
+
+            # --- Decode + extract + clean concurrently, consume in spine order ---
+            total_files_in_spine = len(spine_entries)
+            workers = max(1, min(max_workers or 1, total_files_in_spine))
+            print(f"  Processing {total_files_in_spine} spine documents with {workers} worker(s)...")
+            executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+            try:
+                # Documents are queued a few ahead of the consumer; near the memory
+                # budget nothing more is queued until the worker results drain
+                futures = [None] * total_files_in_spine # None for documents missing from the zip
+                submitted = 0
+                for processed_spine_files, (idref, content_path, relative_href) in enumerate(spine_entries):
+                    while executor and submitted < total_files_in_spine and (
+                            submitted <= processed_spine_files
+                            or (submitted < processed_spine_files + workers * EPUB_QUEUE_PER_WORKER and not governor.near_budget())):
+                        html_content = read_document(submitted)
+                        if html_content is not None:
+                            futures[submitted] = executor.submit(process_epub_document, html_content)
+                        submitted += 1
+                    if progress_callback:
+                        progress_callback(10 + int((processed_spine_files / max(1, total_files_in_spine)) * 80))
+                    if executor:
+                        future = futures[processed_spine_files]
+                        futures[processed_spine_files] = None # Its result is released once consumed
+                        if future is None:
+                            continue # Missing from the zip (reported when it was read)
                     else:
-                         print(f"    Skipping spine item: ID '{idref}' not found in manifest.")
-                         continue
-                else:
-                    item_media_type = item.get('media-type', '')
-                    if 'html' not in item_media_type and 'xml' not in item_media_type: # Allow xhtml and xml
-                        print(f"    Skipping non-HTML/XML spine item: {idref} ({item_media_type})")
-                        continue
-                    relative_href = item.get('href')
-                    # Construct full path within zip relative to OPF directory
-                    content_path = os.path.normpath(os.path.join(epub_base_path, relative_href)).replace('\\', '/')
-
-                if progress_callback:
-                    progress_callback(10 + int((processed_spine_files / max(1, total_files_in_spine)) * 80))
-
-                try:
-                    html_content = epub_zip.read(content_path).decode('utf-8', errors='ignore')
+                        html_content = read_document(processed_spine_files)
+                        if html_content is None:
+                            continue
                     print(f"    [{processed_spine_files+1}/{total_files_in_spine}] Reading: '{content_path}'")
-                    # Extract text using BeautifulSoup
-                    raw_text = basic_html_to_text(html_content)
-                    # Apply full cleaning pipeline
-                    cleaned_text = clean_pipeline(raw_text)
+                    try:
+                        cleaned_text = future.result() if executor else process_epub_document(html_content)
+                    except Exception as e:
+                        print(f"    Error processing content file '{content_path}': {e}")
+                        continue
 
                     if cleaned_text: # Only add chapter if it has content
-                         # Use TOC title if available, otherwise fallback to filename
-                         chapter_title = toc_map.get(content_path, os.path.basename(relative_href))
-                         chapters.append({
-                             'title': chapter_title,
-                             'text': cleaned_text
-                         })
-                         extracted_files_count += 1
+                        # Use TOC title if available, otherwise fallback to filename
+                        chapter_title = toc_map.get(content_path, os.path.basename(relative_href))
+                        chapters.append({
+                            'title': chapter_title,
+                            'text': cleaned_text
+                        })
+                        extracted_files_count += 1
                     else:
-                         print(f"      No text content extracted from '{content_path}'.")
-                    processed_spine_files += 1
-
-                except KeyError:
-                    print(f"    Error: File path not found in zip for idref '{idref}': '{content_path}'")
-                except Exception as e:
-                    print(f"    Error processing content file '{content_path}': {e}")
-                    # traceback.print_exc() # Uncomment for detailed debug
+                        print(f"      No text content extracted from '{content_path}'.")
+            finally:
+                if executor:
+                    executor.shutdown(cancel_futures=True)
 
-            print(f"  Successfully extracted text from {extracted_files_count} content files.")
-            if progress_callback: progress_callback(95) # Near end before saving
+        print(f"  Successfully extracted text from {extracted_files_count} content files.")
+        if progress_callback: progress_callback(95) # Near end before saving
 
     except zipfile.BadZipFile:
         print(f"  Error: File is not a valid ZIP archive (or EPUB is corrupted): '{epub_path}'")
@@ -690,11 +972,16 @@ def save_chapters_generic(chapters, book_name, output_dir):
     print(f"  Finished saving chapters.")
 
 def save_whole_book_text(full_text, book_name, output_dir):
-    """Cleans and saves the entire book text to a single file."""
-    os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, f"{book_name}_full_text.txt")
+    """Cleans and saves the entire book text to a single file. Returns the cleaned text."""
     print(f"  Cleaning full text...")
     cleaned_full_text = clean_pipeline(full_text) # Apply cleaning pipeline
+    write_whole_book_text(cleaned_full_text, book_name, output_dir)
+    return cleaned_full_text
+
+def write_whole_book_text(cleaned_full_text, book_name, output_dir):
+    """Saves already-cleaned whole book text to a single file."""
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"{book_name}_full_text.txt")
     print(f"  Saving full text to '{output_file}'...")
     try:
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -703,10 +990,38 @@ def save_whole_book_text(full_text, book_name, output_dir):
     except Exception as e:
         print(f"  Error saving full text: {e}")
 
+def save_extraction_result(result, book_name, output_dir):
+    """
+    Writes a (possibly cached) extraction result to output_dir.
+
+    Args:
+        result (dict): Either {'chapters': [...]} or {'whole_text': str}.
+        book_name (str): Safe book name used for whole-text filenames.
+        output_dir (str): Directory to save the files in.
+    """
+    if result.get('chapters'):
+        save_chapters_generic(result['chapters'], book_name, output_dir)
+    elif result.get('whole_text') is not None:
+        write_whole_book_text(result['whole_text'], book_name, output_dir)
+    else:
+        print("  Extraction result is empty, nothing to save.")
+
+# --- Extraction Cache ---
+
+def pdf_page_extraction_settings(backend=DEFAULT_PDF_BACKEND):
+    """Settings that affect extract_pdf_text_by_page output (part of the raw-page cache key)."""
+    return {
+        'header_threshold': HEADER_THRESHOLD,
+        'footer_threshold': FOOTER_THRESHOLD,
+        'backend': backend,
+        'extractor': source_fingerprint(extract_pdf_text_by_page, get_pdf_text_backend(backend), _join_block_texts),
+    }
+
 
 # --- Main Extraction Function ---
 
-def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="extracted_books", progress_callback=None):
+def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="extracted_books", progress_callback=None, cache_dir=None,
+                 heuristic_target_duration=HEURISTIC_TARGET_DURATION, pdf_backend=DEFAULT_PDF_BACKEND):
     """
     Extracts text from PDF or EPUB files, cleans it, and saves chapters or whole text
     directly into the specified output_dir.
@@ -728,6 +1043,14 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
                           base is `output_dir`.
         progress_callback (callable, optional): A function to call with progress percentage
                                                 (0-100) or None on error. Defaults to None.
+        cache_dir (str, optional): Directory for the extraction cache. When set, raw PDF
+                                   page text and cleaned results are cached keyed on the
+                                   source file's content hash, the extraction settings and
+                                   the cleaning-pipeline version. None disables caching.
+        heuristic_target_duration (float): Target spoken length in seconds of chapters
+                                           produced by heuristic splitting (PDF without TOC).
+        pdf_backend (str): PDF text-extraction backend, one of PDF_TEXT_BACKENDS
+                           ('blocks', 'blocks_fast', 'text', 'words', 'rawdict').
 
     Returns:
         str: The absolute path to the output directory used.
@@ -756,18 +1079,44 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
     print(f"    Output directory       : {absolute_output_dir}")
     print(f"    Use TOC                : {use_toc}")
     print(f"    Extraction Mode        : {extract_mode}")
+    if file_ext == '.pdf':
+        print(f"    PDF Backend            : {pdf_backend}")
+    print(f"    Cache directory        : {cache_dir or 'disabled'}")
 
     try:
-        if file_ext == '.pdf':
+        # --- Extraction Cache Lookup ---
+        # The result key covers everything that changes the cleaned output, so a hit
+        # lets us skip opening the document, page extraction and clean_pipeline entirely.
+        source_hash = file_content_hash(file_path) if cache_dir else None
+        result_key = make_cache_key(
+            'result', file_ext, source_hash, use_toc, extract_mode, heuristic_target_duration,
+            pdf_page_extraction_settings(pdf_backend) if file_ext == '.pdf' else None,
+            cleaning_pipeline_version()
+        ) if cache_dir else None
+
+        cached_result = load_cache_entry(cache_dir, 'extract_results', result_key) if cache_dir else None
+        if cached_result is not None:
+            print(f"  Cache hit: reusing cleaned extraction result ({result_key[:12]}).")
+            if progress_callback: progress_callback(85)
+            save_extraction_result(cached_result, safe_book_name, absolute_output_dir)
+
+        elif file_ext == '.pdf':
             print("  Processing PDF file...")
             if progress_callback: progress_callback(5)
             doc = fitz.open(file_path)
             print(f"  Opened PDF. Pages: {len(doc)}")
 
             if progress_callback: progress_callback(10)
-            # Always extract page by page first
-            all_pages_text = extract_pdf_text_by_page(doc)
-            print(f"  Extracted raw text from {len(all_pages_text)} pages.")
+            # Always extract page by page first (raw pages are cached independently of
+            # cleaning settings, so e.g. toggling use_toc doesn't re-parse the PDF)
+            pages_key = make_cache_key('pages', source_hash, pdf_page_extraction_settings(pdf_backend)) if cache_dir else None
+            all_pages_text = load_cache_entry(cache_dir, 'pdf_pages', pages_key) if cache_dir else None
+            if all_pages_text is not None:
+                print(f"  Cache hit: reusing raw text for {len(all_pages_text)} pages.")
+            else:
+                all_pages_text = extract_pdf_text_by_page(doc, backend=pdf_backend)
+                print(f"  Extracted raw text from {len(all_pages_text)} pages ({pdf_backend} backend).")
+                if cache_dir: save_cache_entry(cache_dir, 'pdf_pages', pages_key, all_pages_text)
             if progress_callback: progress_callback(40)
 
             # --- Chapter Logic ---
@@ -796,32 +1145,37 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
                 if not toc_used:
                     if progress_callback: progress_callback(50) # Show progress for heuristic attempt
                     full_raw_text = "\n".join(all_pages_text) # Combine raw pages
-                    pdf_chapters = split_text_into_heuristic_chapters(full_raw_text)
+                    pdf_chapters = split_text_into_heuristic_chapters(full_raw_text, target_duration=heuristic_target_duration)
                     if progress_callback: progress_callback(85)
 
                 # --- Save Chapters (if found by either method) ---
                 if pdf_chapters:
+                    extraction_result = {'chapters': pdf_chapters}
                     save_chapters_generic(pdf_chapters, safe_book_name, absolute_output_dir)
                 else:
                     # If STILL no chapters after TOC and heuristic, save as whole
                     print("  No chapters found via TOC or heuristics. Saving as whole book text.")
                     full_raw_text = "\n".join(all_pages_text) # Combine raw pages again (splitter might have failed)
-                    save_whole_book_text(full_raw_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                    cleaned_full_text = save_whole_book_text(full_raw_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                    extraction_result = {'whole_text': cleaned_full_text}
 
             # --- Whole Book Mode ---
             else: # extract_mode == "whole"
                 print("  Saving PDF as whole book text.")
                 if progress_callback: progress_callback(60)
                 full_text = "\n".join(all_pages_text) # Join all pages extracted earlier
-                save_whole_book_text(full_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                cleaned_full_text = save_whole_book_text(full_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                extraction_result = {'whole_text': cleaned_full_text}
 
             doc.close()
+            if cache_dir: save_cache_entry(cache_dir, 'extract_results', result_key, extraction_result)
             if progress_callback: progress_callback(95)
 
         elif file_ext == '.epub':
             # --- EPUB Processing (largely unchanged) ---
             print("  Processing EPUB file...")
             epub_chapters = parse_epub_content(file_path, progress_callback)
+            extraction_result = None
 
             if not epub_chapters:
                  print("  Warning: No content extracted from EPUB.")
@@ -829,6 +1183,7 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
             if extract_mode == "chapters":
                  if epub_chapters:
                      save_chapters_generic(epub_chapters, safe_book_name, absolute_output_dir)
+                     extraction_result = {'chapters': epub_chapters}
                  else:
                      print("  No EPUB chapters extracted, nothing to save in chapter mode.")
             else: # extract_mode == "whole"
@@ -836,10 +1191,15 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
                      print("  Combining EPUB chapters into whole book text...")
                      # Join chapters with double newline for paragraph separation between files
                      full_text = "\n\n".join([chap['text'] for chap in epub_chapters if chap.get('text')])
-                     save_whole_book_text(full_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                     cleaned_full_text = save_whole_book_text(full_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                     extraction_result = {'whole_text': cleaned_full_text}
                  else:
                       print("  No EPUB content extracted, nothing to save in whole book mode.")
 
+            # Only cache non-empty results so a transient parse failure isn't pinned
+            if cache_dir and extraction_result:
+                save_cache_entry(cache_dir, 'extract_results', result_key, extraction_result)
+
         else:
             raise ValueError(f"Unsupported file format: '{file_ext}'. Supported: .pdf, .epub")
 
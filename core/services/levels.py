@@ -0,0 +1,252 @@
+import os
+import json
+import math
+import numpy as np
+from scipy.signal import sosfilt
+
+# --- Configuration ---
+CHAPTER_LEVELS_SUFFIX = ".levels.json" # Sidecar next to a chapter file written during synthesis
+TARGET_LOUDNESS_LUFS = -19.0 # Integrated loudness of the merged book (mono speech; inside ACX's -23..-18 range)
+LOUDNESS_PEAK_CEILING = 0.95 # Never raise the book's loudest sample above the peak-normalization level
+LOUDNESS_BLOCK_SECONDS = 0.4 # ITU-R BS.1770 gating block
+LOUDNESS_HOP_SECONDS = 0.1 # 75% block overlap
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+LOUDNESS_HISTOGRAM_STEP = 0.1 # LU per histogram bin; only the bin at the relative gate is approximate
+LIMITER_WINDOW_SECONDS = 0.005 # Gain reduction ramps in and out over this long around a peak
+
+# --- Chapter Levels Sidecar ---
+
+def chapter_levels_path(audio_path):
+    """Path of the levels sidecar for a chapter audio file (e.g. 01_Intro.flac.levels.json)."""
+    return audio_path + CHAPTER_LEVELS_SUFFIX
+
+def write_chapter_levels(audio_path, levels):
+    """
+    Save a chapter's levels: exact 'frames' and 'samplerate', the 'peak' of the
+    synthesized audio, the 'applied_gain' already baked into the stored samples
+    (stored = synthesized * applied_gain), the peak-normalization 'gain' the
+    merge falls back to, and the 'loudness' histogram (LoudnessMeter.histogram).
+    """
+    with open(chapter_levels_path(audio_path), 'w', encoding='utf-8') as f:
+        json.dump(levels, f, separators=(',', ':'))
+
+def read_chapter_levels(audio_path):
+    """
+    Load a chapter's levels sidecar.
+
+    Returns:
+        dict or None: The levels, or None for chapters without one (e.g. mp3 chapters).
+    """
+    path = chapter_levels_path(audio_path)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable levels file '{path}': {e}")
+        return None
+
+# --- Loudness Measurement (ITU-R BS.1770) ---
+
+def k_weighting_sos(samplerate):
+    """
+    The K-weighting pre-filter (high shelf + RLB high-pass) as second-order
+    sections for any sample rate; at 48 kHz these are the BS.1770 coefficients.
+    """
+    # Stage 1: +4 dB high shelf
+    gain_db, q, fc = 3.99984385397, 0.7071752369554193, 1681.974450955533
+    a = 10 ** (gain_db / 40)
+    w0 = 2 * math.pi * fc / samplerate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0, sqrt_a = math.cos(w0), math.sqrt(a)
+    shelf_b = [a * ((a + 1) + (a - 1) * cos_w0 + 2 * sqrt_a * alpha),
+               -2 * a * ((a - 1) + (a + 1) * cos_w0),
+               a * ((a + 1) + (a - 1) * cos_w0 - 2 * sqrt_a * alpha)]
+    shelf_a = [(a + 1) - (a - 1) * cos_w0 + 2 * sqrt_a * alpha,
+               2 * ((a - 1) - (a + 1) * cos_w0),
+               (a + 1) - (a - 1) * cos_w0 - 2 * sqrt_a * alpha]
+    # Stage 2: high-pass around 38 Hz (numerator fixed at [1, -2, 1] as in the standard)
+    q, fc = 0.5003270373253953, 38.13547087613982
+    w0 = 2 * math.pi * fc / samplerate
+    alpha = math.sin(w0) / (2 * q)
+    highpass_a = [1 + alpha, -2 * math.cos(w0), 1 - alpha]
+    return np.array([
+        [*(c / shelf_a[0] for c in shelf_b), *(c / shelf_a[0] for c in shelf_a)],
+        [1.0, -2.0, 1.0, *(c / highpass_a[0] for c in highpass_a)],
+    ])
+
+class LoudnessMeter:
+    """
+    Streaming integrated-loudness measurement for mono audio.
+
+    Chunks are K-weighted as they arrive (filter state carries over between
+    chunks) and reduced to one energy per 100 ms hop, so memory is about 80
+    bytes per second of audio. histogram() forms the gated 400 ms blocks.
+    """
+
+    def __init__(self, samplerate):
+        self.samplerate = samplerate
+        self._sos = k_weighting_sos(samplerate)
+        self._state = np.zeros((self._sos.shape[0], 2))
+        self._hop = max(1, round(samplerate * LOUDNESS_HOP_SECONDS))
+        self._remainder = np.zeros(0)
+        self._hop_energies = []
+
+    def add(self, audio):
+        """Feed the next chunk of float audio (nominal range -1..1)."""
+        weighted, self._state = sosfilt(self._sos, np.asarray(audio, dtype=np.float64).reshape(-1), zi=self._state)
+        squared = np.concatenate((self._remainder, weighted * weighted))
+        hops = len(squared) // self._hop
+        self._hop_energies.append(squared[:hops * self._hop].reshape(hops, self._hop).sum(axis=1))
+        self._remainder = squared[hops * self._hop:]
+
+    def histogram(self):
+        """
+        Gating blocks above ABSOLUTE_GATE_LUFS, binned by loudness.
+
+        Returns:
+            dict: {'step': LU per bin, 'bins': [[bin, block count, sum of block mean squares], ...]}.
+                  Histograms of several chapters can be pooled (integrated_loudness).
+        """
+        hop_energies = np.concatenate(self._hop_energies) if self._hop_energies else np.zeros(0)
+        hops_per_block = round(LOUDNESS_BLOCK_SECONDS / LOUDNESS_HOP_SECONDS)
+        if len(hop_energies) < hops_per_block:
+            return {'step': LOUDNESS_HISTOGRAM_STEP, 'bins': []}
+        mean_squares = np.convolve(hop_energies, np.ones(hops_per_block), 'valid') / (hops_per_block * self._hop)
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(mean_squares)
+        audible = block_loudness >= ABSOLUTE_GATE_LUFS
+        bins = np.floor(block_loudness[audible] / LOUDNESS_HISTOGRAM_STEP).astype(np.int64)
+        keys, inverse = np.unique(bins, return_inverse=True)
+        counts = np.bincount(inverse)
+        energies = np.bincount(inverse, weights=mean_squares[audible])
+        return {'step': LOUDNESS_HISTOGRAM_STEP,
+                'bins': [[int(k), int(c), float(e)] for k, c, e in zip(keys, counts, energies)]}
+
+def integrated_loudness(histograms):
+    """
+    Gated integrated loudness (LUFS) of the concatenation of the measured
+    chapters, or None if nothing is above the absolute gate.
+    """
+    pooled = {}
+    for histogram in histograms:
+        step = histogram['step']
+        for key, count, energy in histogram['bins']:
+            # Bins are labelled by their lower edge in LU, so differing steps still pool
+            total = pooled.setdefault((round(key * step, 6), step), [0, 0.0])
+            total[0] += count
+            total[1] += energy
+    blocks = sum(count for count, _ in pooled.values())
+    if not blocks:
+        return None
+    ungated = -0.691 + 10 * math.log10(sum(energy for _, energy in pooled.values()) / blocks)
+    threshold = ungated + RELATIVE_GATE_LU
+    kept = [total for (edge, step), total in pooled.items() if edge + step / 2 >= threshold]
+    return -0.691 + 10 * math.log10(sum(energy for _, energy in kept) / sum(count for count, _ in kept))
+
+def loudness_gains(chapter_levels, target=TARGET_LOUDNESS_LUFS, peak_ceiling=LOUDNESS_PEAK_CEILING):
+    """
+    Gains that bring every chapter, as synthesized, to `target` integrated
+    loudness, so there are no jumps between chapters. If that would push a
+    chapter's loudest sample past peak_ceiling, all chapters are lowered by
+    the same amount and stay level with each other. With peak_ceiling None
+    nothing is lowered; peaks are then left to limit_peaks.
+
+    Args:
+        chapter_levels (list): Levels sidecars of all chapters, in book order.
+
+    Returns:
+        tuple or None: (gains for the stored samples, book loudness before, book loudness after)
+            in LUFS; None if a chapter has no loudness measurement or the book is silent.
+    """
+    if not chapter_levels or any(not levels or 'loudness' not in levels for levels in chapter_levels):
+        return None
+    before = integrated_loudness([levels['loudness'] for levels in chapter_levels])
+    if before is None:
+        return None
+    gains = []
+    for levels in chapter_levels:
+        loudness = integrated_loudness([levels['loudness']])
+        gains.append(1.0 if loudness is None else 10 ** ((target - loudness) / 20)) # Silent chapters stay as they are
+    limit = min([1.0] + [peak_ceiling / (levels['peak'] * gain)
+                         for levels, gain in zip(chapter_levels, gains) if peak_ceiling and levels['peak'] > 0])
+    after = target + 20 * math.log10(limit)
+    return [gain * limit / levels.get('applied_gain', 1.0) for levels, gain in zip(chapter_levels, gains)], before, after
+
+# --- Peak Limiter ---
+
+def _sliding_min(values, width):
+    """Minimum over a centered window of odd `width` (edges repeat), in O(n) (van Herk/Gil-Werman)."""
+    radius = width // 2
+    padded = np.pad(values, (radius, radius), mode='edge')
+    size = -(-len(padded) // width) * width
+    blocks = np.pad(padded, (0, size - len(padded)), mode='edge').reshape(-1, width)
+    prefix = np.minimum.accumulate(blocks, axis=1).ravel()
+    suffix = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.minimum(suffix[:len(values)], prefix[width - 1:width - 1 + len(values)])
+
+def limit_peaks(audio, samplerate, ceiling=LOUDNESS_PEAK_CEILING, window_seconds=LIMITER_WINDOW_SECONDS):
+    """
+    Look-ahead peak limiter: no sample of the result exceeds ceiling.
+
+    The gain each sample needs is held over a window around it and then
+    smoothed with a moving average half as wide, so the gain ramps down
+    before a peak and back up after it instead of clipping. Audio that stays
+    under the ceiling is returned unchanged. Blocks of a stream go through
+    PeakLimiter instead, which carries the envelope across them.
+    """
+    magnitude = np.abs(audio)
+    if not audio.size or magnitude.max() <= ceiling:
+        return audio
+    radius = max(1, round(window_seconds * samplerate / 2))
+    needed = np.minimum(1.0, ceiling / np.maximum(magnitude, 1e-12, dtype=np.float64))
+    held = _sliding_min(needed, 2 * radius + 1)
+    smooth = radius // 2
+    padded = np.concatenate(([0.0], np.cumsum(np.pad(held, (smooth, smooth), mode='edge'))))
+    gain = (padded[2 * smooth + 1:] - padded[:-(2 * smooth + 1)]) / (2 * smooth + 1)
+    return (audio * np.minimum(gain, needed)).astype(audio.dtype, copy=False)
+
+class PeakLimiter:
+    """
+    limit_peaks for audio that arrives in blocks.
+
+    Output lags input by the limiter's look-ahead (window_seconds * 3/4):
+    process() returns the samples whose look-ahead is complete and keeps the
+    rest, together with the already emitted samples the envelope still spans,
+    for the next block. After the last block, flush() returns the remainder.
+    The output is the same, sample for sample and in total length, as
+    limit_peaks on the whole stream, so the gain never jumps at a block boundary.
+    """
+
+    def __init__(self, samplerate, ceiling=LOUDNESS_PEAK_CEILING, window_seconds=LIMITER_WINDOW_SECONDS):
+        self.samplerate = samplerate
+        self.ceiling = ceiling
+        self.window_seconds = window_seconds
+        radius = max(1, round(window_seconds * samplerate / 2))
+        self.lookahead = radius + radius // 2 # Held window plus smoothing half-width, in samples
+        self._context = None # Last emitted input samples (up to lookahead)
+        self._pending = None # Input samples not emitted yet
+
+    def process(self, audio):
+        """Feed the next block; returns the limited samples that are ready (possibly none)."""
+        audio = np.asarray(audio).reshape(-1)
+        pending = audio if self._pending is None else np.concatenate((self._pending, audio))
+        return self._emit(pending, max(0, len(pending) - self.lookahead))
+
+    def flush(self):
+        """Limit and return the samples still held back."""
+        if self._pending is None:
+            return np.zeros(0, dtype=np.float32)
+        return self._emit(self._pending, len(self._pending))
+
+    def _emit(self, pending, ready):
+        context = self._context if self._context is not None else pending[:0]
+        stream = np.concatenate((context, pending))
+        # Windows of the first `ready` pending samples lie inside stream, so its edges don't matter
+        limited = limit_peaks(stream, self.samplerate, self.ceiling, self.window_seconds)
+        emitted = len(context) + ready
+        self._context = stream[max(0, emitted - self.lookahead):emitted].copy()
+        self._pending = pending[ready:].copy()
+        return limited[len(context):emitted]
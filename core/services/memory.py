@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import resource
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+# --- Configuration ---
+MEMORY_SAMPLE_SECONDS = 0.05 # RSS sampling interval while a stage is running
+MEMORY_HIGH_WATER = 0.85 # Stages apply backpressure above this fraction of the budget
+SPILL_BLOCK_FRAMES = 1 << 20 # Frames per block when reading spilled audio back
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_HAS_PROC = os.path.exists(f"/proc/{os.getpid()}/statm")
+
+# --- RSS Measurement ---
+
+def _pid_rss(pid):
+    with open(f"/proc/{pid}/statm", 'r') as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+def _child_pids(pid):
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children", 'r') as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass # Process exited, or the kernel has no children files
+    return children
+
+def process_tree_rss():
+    """
+    Resident memory in bytes of this process plus its child processes (e.g.
+    ffmpeg encoders), read from /proc. Elsewhere, this process's peak RSS.
+    """
+    if not _HAS_PROC:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    total, pending = 0, [os.getpid()]
+    while pending:
+        pid = pending.pop()
+        try:
+            total += _pid_rss(pid)
+        except (OSError, ValueError):
+            continue # Exited while we were looking
+        pending.extend(_child_pids(pid))
+    return total
+
+# --- Governor ---
+
+class MemoryGovernor:
+    """
+    Tracks peak RSS per pipeline stage against an optional memory budget.
+
+    Stages run inside stage(name); while any stage is open a sampler thread
+    records the peak RSS of the process tree for each open stage (nested and
+    concurrent stages all see the peak). Stages call near_budget() to decide
+    on backpressure: fewer queued items, no new tasks, spilling to disk.
+    """
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes
+        self.peaks = {} # stage -> peak RSS in bytes
+        self._active = {} # stage -> nesting depth
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def set_budget(self, megabytes):
+        """Set the budget in MB; None removes it."""
+        self.budget_bytes = int(megabytes * 1024 * 1024) if megabytes else None
+
+    def near_budget(self):
+        """True when RSS is above MEMORY_HIGH_WATER of the budget (never without a budget)."""
+        return bool(self.budget_bytes) and self._record(process_tree_rss()) >= MEMORY_HIGH_WATER * self.budget_bytes
+
+    def _record(self, rss):
+        with self._lock:
+            for name in self._active:
+                self.peaks[name] = max(self.peaks.get(name, 0), rss)
+        return rss
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+            self._record(process_tree_rss())
+            time.sleep(MEMORY_SAMPLE_SECONDS)
+
+    @contextmanager
+    def stage(self, name):
+        """Record the peak RSS while the block runs under `name`."""
+        with self._lock:
+            self._active[name] = self._active.get(name, 0) + 1
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='memory-sampler', daemon=True)
+                self._sampler.start()
+        self._record(process_tree_rss())
+        try:
+            yield
+        finally:
+            self._record(process_tree_rss())
+            with self._lock:
+                self._active[name] -= 1
+                if not self._active[name]:
+                    del self._active[name]
+
+    def report(self):
+        """Peaks in MB, for the run metadata."""
+        with self._lock:
+            peaks = dict(self.peaks)
+        return {
+            'budget_mb': round(self.budget_bytes / 2 ** 20) if self.budget_bytes else None,
+            'stage_peak_mb': {name: round(peak / 2 ** 20, 1) for name, peak in peaks.items()},
+        }
+
+governor = MemoryGovernor() # Process-wide; main sets the budget from --memory-budget
+
+# --- Spilling ---
+
+class SpillBuffer:
+    """
+    Float32 mono audio collected chunk by chunk.
+
+    Chunks stay in memory until the governor nears its budget; from then on
+    everything is appended to a temp file in spill_dir and read back block by
+    block, so a long chapter no longer has to fit in RAM.
+    """
+
+    def __init__(self, spill_dir=None, memory_governor=governor):
+        self.spill_dir = spill_dir
+        self.governor = memory_governor
+        self.frames = 0
+        self._chunks = []
+        self._spill_file = None
+
+    @property
+    def spilled(self):
+        return self._spill_file is not None
+
+    def append(self, audio):
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        self.frames += len(audio)
+        if self._spill_file is None and self.governor.near_budget():
+            self._spill_file = tempfile.NamedTemporaryFile(dir=self.spill_dir, suffix='.f32.spill')
+            for chunk in self._chunks:
+                self._spill_file.write(chunk.tobytes())
+            self._chunks = []
+            print(f"      Memory near budget: spilling audio to '{self._spill_file.name}'")
+        if self._spill_file is not None:
+            self._spill_file.write(audio.tobytes())
+        else:
+            self._chunks.append(audio)
+
+    def blocks(self):
+        """Yield the audio in order, as float32 arrays."""
+        if self._spill_file is None or not self.frames:
+            yield from self._chunks
+            return
+        self._spill_file.flush()
+        spilled = np.memmap(self._spill_file.name, dtype=np.float32, mode='r')
+        for start in range(0, len(spilled), SPILL_BLOCK_FRAMES):
+            yield np.array(spilled[start:start + SPILL_BLOCK_FRAMES])
+        del spilled
+
+    def close(self):
+        """Drop the audio and delete the spill file."""
+        self._chunks = []
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
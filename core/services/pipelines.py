@@ -0,0 +1,113 @@
+import gc
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from core.services.memory import governor, process_tree_rss
+
+# --- Configuration ---
+PIPELINE_POOL_MAX_MB = 2048 # Idle pipelines are evicted while the pool holds more than this
+
+class PipelinePool:
+    """
+    Process-wide pool of expensive-to-build objects (e.g. KPipeline), keyed by their settings.
+
+    acquire(*key) hands out an idle instance built for the same key, or builds
+    a new one with factory(*key); release() returns it. Concurrent callers never
+    share an instance, so an instance needs no locking of its own. Idle
+    instances are evicted least recently used first while the pool holds more
+    than max_bytes, or whenever the memory governor is near its budget.
+
+    An instance's size is size_of(instance) if that returns a number, else the
+    growth in RSS while it was built.
+    """
+
+    def __init__(self, factory, max_bytes=PIPELINE_POOL_MAX_MB * 2 ** 20, size_of=None, memory_governor=governor):
+        self.factory = factory
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.governor = memory_governor
+        self._idle = OrderedDict() # id(instance) -> instance, least recently used first
+        self._entries = {} # id(instance) -> {'key', 'bytes', 'init_seconds'}
+        self._lock = threading.Lock()
+        self._stats = {'built': 0, 'reused': 0, 'evicted': 0, 'init_seconds': 0.0, 'saved_seconds': 0.0}
+
+    def acquire(self, *key):
+        """
+        Return an instance for key, warm if one is idle. Pass it to release() when done.
+
+        Returns:
+            tuple: (instance, seconds of initialization this call saved; 0.0 if it was built)
+        """
+        with self._lock:
+            for instance_id, instance in reversed(self._idle.items()): # Most recently used first
+                entry = self._entries[instance_id]
+                if entry['key'] == key:
+                    del self._idle[instance_id]
+                    self._stats['reused'] += 1
+                    self._stats['saved_seconds'] += entry['init_seconds']
+                    return instance, entry['init_seconds']
+        # Build outside the lock so other keys (and warm hits) are not held up
+        rss_before = process_tree_rss()
+        start = time.perf_counter()
+        instance = self.factory(*key)
+        init_seconds = time.perf_counter() - start
+        size = self.size_of(instance) if self.size_of else None
+        if size is None:
+            size = max(0, process_tree_rss() - rss_before)
+        with self._lock:
+            self._entries[id(instance)] = {'key': key, 'bytes': size, 'init_seconds': init_seconds}
+            self._stats['built'] += 1
+            self._stats['init_seconds'] += init_seconds
+        return instance, 0.0
+
+    def release(self, instance):
+        """Return an instance to the pool (it may be evicted right away)."""
+        with self._lock:
+            if id(instance) not in self._entries:
+                return
+            self._idle[id(instance)] = instance
+            self._evict()
+
+    @contextmanager
+    def lease(self, *key):
+        """`with pool.lease(*key) as instance:` acquire and release around a block."""
+        instance, _ = self.acquire(*key)
+        try:
+            yield instance
+        finally:
+            self.release(instance)
+
+    def _evict(self):
+        """Drop idle instances, least recently used first, while over max_bytes or near the memory budget. Call with _lock held."""
+        evicted = False
+        while self._idle and (self._bytes() > self.max_bytes or self.governor.near_budget()):
+            instance_id, _ = self._idle.popitem(last=False)
+            entry = self._entries.pop(instance_id)
+            self._stats['evicted'] += 1
+            evicted = True
+            print(f"  Pipeline pool: evicted idle {entry['key']} ({entry['bytes'] / 2 ** 20:.0f} MB)")
+        if evicted:
+            gc.collect()
+
+    def _bytes(self):
+        return sum(entry['bytes'] for entry in self._entries.values())
+
+    def clear(self):
+        """Drop every idle instance."""
+        with self._lock:
+            while self._idle:
+                instance_id, _ = self._idle.popitem(last=False)
+                del self._entries[instance_id]
+        gc.collect()
+
+    def stats(self):
+        """Counts, sizes and initialization seconds spent and saved, e.g. for a run report."""
+        with self._lock:
+            return {
+                **self._stats,
+                'idle': len(self._idle),
+                'in_use': len(self._entries) - len(self._idle),
+                'mb': round(self._bytes() / 2 ** 20, 1),
+            }
@@ -0,0 +1,107 @@
+import copy
+
+# --- Configuration ---
+DEFAULT_PROFILE = "standard"
+
+# Stages:
+#   audio  - the merged book audio when encoded to mp3 (merge or streaming encoder)
+#   aac    - AAC streams: the encode-once .m4a, the M4B and video soundtracks
+#   video  - x264 for the full-length videos
+#   shorts - x264 and the audio segments for shorts
+# None means "ffmpeg's default" (e.g. keep the source sample rate, pick thread count;
+# libmp3lame's default for 24 kHz mono is 32k).
+# 'standard' keeps the settings the audio, M4B, videos and shorts used before profiles
+# (x264's default preset, medium, for the videos; 'fast' for shorts).
+ENCODING_PROFILES = {
+    'draft': {
+        'audio': {'codec': 'libmp3lame', 'bitrate': '24k', 'sample_rate': 16000, 'threads': None},
+        'aac': {'codec': 'aac', 'bitrate': '48k', 'sample_rate': 16000, 'threads': None},
+        'video': {'codec': 'libx264', 'preset': 'ultrafast', 'crf': 32, 'threads': None},
+        'shorts': {'codec': 'libx264', 'preset': 'ultrafast', 'crf': 32, 'threads': None},
+    },
+    'standard': {
+        'audio': {'codec': 'libmp3lame', 'bitrate': None, 'sample_rate': None, 'threads': None},
+        'aac': {'codec': 'aac', 'bitrate': '128k', 'sample_rate': None, 'threads': None},
+        'video': {'codec': 'libx264', 'preset': None, 'crf': None, 'threads': None},
+        'shorts': {'codec': 'libx264', 'preset': 'fast', 'crf': None, 'threads': None},
+    },
+    'archive': {
+        'audio': {'codec': 'libmp3lame', 'bitrate': '160k', 'sample_rate': None, 'threads': None}, # MPEG-2 maximum at Kokoro's 24 kHz
+        'aac': {'codec': 'aac', 'bitrate': '256k', 'sample_rate': None, 'threads': None},
+        'video': {'codec': 'libx264', 'preset': 'slow', 'crf': 18, 'threads': None},
+        'shorts': {'codec': 'libx264', 'preset': 'medium', 'crf': 20, 'threads': None},
+    },
+}
+STAGES = ('audio', 'aac', 'video', 'shorts')
+
+def parse_profile_spec(spec):
+    """
+    Parse a command-line profile selection.
+
+    'draft' selects one profile for every stage; 'audio:archive,video:draft'
+    selects per stage (unlisted stages use DEFAULT_PROFILE).
+
+    Returns:
+        str or dict: Suitable for the `profile` argument of the output functions.
+
+    Raises:
+        ValueError: On unknown profiles or stages.
+    """
+    if ':' not in spec:
+        if spec not in ENCODING_PROFILES:
+            raise ValueError(f"Unknown encoding profile '{spec}'. Choose from: {', '.join(ENCODING_PROFILES)}")
+        return spec
+    selection = {}
+    for item in spec.split(','):
+        stage, _, name = item.partition(':')
+        if stage not in STAGES or name not in ENCODING_PROFILES:
+            raise ValueError(f"Invalid stage profile '{item}'. Stages: {', '.join(STAGES)}; profiles: {', '.join(ENCODING_PROFILES)}")
+        selection[stage] = name
+    return selection
+
+def stage_settings(profile, stage):
+    """
+    Encoder settings for one stage.
+
+    Args:
+        profile (str or dict or None): Profile name, or a {stage: profile name}
+            mapping; None and unlisted stages use DEFAULT_PROFILE.
+        stage (str): One of STAGES.
+
+    Returns:
+        dict: A copy of the settings, safe to modify.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown encoding stage '{stage}'")
+    name = profile.get(stage, DEFAULT_PROFILE) if isinstance(profile, dict) else (profile or DEFAULT_PROFILE)
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile '{name}'. Choose from: {', '.join(ENCODING_PROFILES)}")
+    return copy.deepcopy(ENCODING_PROFILES[name][stage])
+
+def audio_codec_args(settings):
+    """ffmpeg output arguments for an audio stage."""
+    args = ["-c:a", settings['codec']]
+    if settings.get('bitrate'):
+        args += ["-b:a", settings['bitrate']]
+    if settings.get('sample_rate'):
+        args += ["-ar", str(settings['sample_rate'])]
+    if settings.get('threads'):
+        args += ["-threads", str(settings['threads'])]
+    return args
+
+def mp3_codec_args(output_file, profile):
+    """The 'audio' stage arguments if output_file is an mp3, else none (ffmpeg picks the codec from the extension)."""
+    if output_file.lower().endswith('.mp3'):
+        return audio_codec_args(stage_settings(profile, 'audio'))
+    return []
+
+def video_codec_args(settings, threads=None):
+    """ffmpeg output arguments for a video stage; threads (e.g. from the CPU budget) overrides the profile."""
+    args = ["-c:v", settings['codec']]
+    if settings.get('preset'):
+        args += ["-preset", settings['preset']]
+    if settings.get('crf') is not None:
+        args += ["-crf", str(settings['crf'])]
+    if threads or settings.get('threads'):
+        args += ["-threads", str(threads or settings['threads'])]
+    return args
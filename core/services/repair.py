@@ -0,0 +1,195 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from core.services.cache import make_cache_key, load_cache_entry, save_cache_entry
+
+# --- Configuration ---
+REPAIR_CACHE_NAMESPACE = "text_repair" # One cache entry per repaired paragraph
+REPAIR_PROMPT_VERSION = 3 # Bump when REPAIR_SYSTEM_PROMPT or the batch format changes
+REPAIR_BATCH_CHARS = 3000 # Paragraph characters per request
+REPAIR_CHARS_PER_TOKEN = 3 # Conservative for English prose, so max_tokens never cuts an answer short
+REPAIR_TOKEN_OVERHEAD = 64 # Markers and whitespace per batch
+REPAIR_MAX_WORKERS = 4 # Requests in flight at once
+REPAIR_REQUESTS_PER_MINUTE = 30 # Provider rate limit (Groq's free tier)
+REPAIR_MIN_CHARS = 40 # Headings and other short lines are never sent
+REPAIR_MAX_LENGTH_CHANGE = 0.3 # Answers changing a paragraph's length by more than this are rejected
+PARAGRAPH_MARKER = "<<<P{}>>>"
+PARAGRAPH_MARKER_PATTERN = re.compile(r'<<<P(\d+)>>>')
+END_MARKER = "<<<END>>>" # Closes a complete answer; an answer cut off at max_tokens lacks it
+REPAIR_SYSTEM_PROMPT = (
+    "You repair text extracted from scanned or PDF books before it is read aloud. "
+    "Fix OCR errors and words split by hyphenation or stray spaces. "
+    "Do not reword, summarize, translate or add anything. "
+    "The text is already formatted for speech synthesis; keep that formatting exactly: "
+    "one sentence per line (never join or split lines), the space before punctuation marks, "
+    "and numbers written out as words. "
+    "Each paragraph starts with a marker like <<<P1>>>. Return every marker, in order, "
+    "each followed by its repaired paragraph, then <<<END>>> on its own line, and nothing else."
+)
+
+class RateLimiter:
+    """Spaces out request starts across threads to at most `per_minute` per minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+# --- Paragraph Batches ---
+
+def paragraph_hash(paragraph):
+    """SHA-256 of a paragraph's text, the unit of caching and deduplication."""
+    return hashlib.sha256(paragraph.encode('utf-8')).hexdigest()
+
+def _model_name(model):
+    return getattr(model, 'model', type(model).__name__)
+
+def _cache_key(model, digest):
+    return make_cache_key(REPAIR_CACHE_NAMESPACE, REPAIR_PROMPT_VERSION, _model_name(model), digest)
+
+def make_batches(paragraphs, batch_chars=REPAIR_BATCH_CHARS):
+    """Group (digest, text) pairs into batches of at most batch_chars characters (a longer paragraph goes alone)."""
+    batches, batch, size = [], [], 0
+    for digest, text in paragraphs:
+        if batch and size + len(text) > batch_chars:
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append((digest, text))
+        size += len(text)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def batch_messages(batch):
+    """Chat messages asking the model to repair one batch."""
+    body = "\n\n".join(f"{PARAGRAPH_MARKER.format(number)}\n{text}" for number, (_, text) in enumerate(batch, start=1))
+    return [
+        {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+        {"role": "user", "content": body},
+    ]
+
+def batch_max_tokens(batch):
+    """Completion token limit with room for every paragraph to grow by REPAIR_MAX_LENGTH_CHANGE."""
+    chars = sum(len(text) for _, text in batch) * (1 + REPAIR_MAX_LENGTH_CHANGE)
+    return int(chars / REPAIR_CHARS_PER_TOKEN) + REPAIR_TOKEN_OVERHEAD * len(batch)
+
+def parse_batch_response(batch, response):
+    """
+    Match a model answer back to the batch's paragraphs.
+
+    An answer without END_MARKER was cut off (e.g. at max_tokens) and is
+    rejected whole: its last paragraph could be truncated yet still pass
+    the length check.
+
+    Returns:
+        dict: digest -> repaired text for every paragraph whose marker came back,
+              whose length stayed within REPAIR_MAX_LENGTH_CHANGE and whose line
+              count (clean_pipeline puts one sentence per line) is unchanged.
+    """
+    response, ended, _ = (response or "").partition(END_MARKER)
+    if not ended:
+        return {}
+    parts = PARAGRAPH_MARKER_PATTERN.split(response)
+    answers = {int(number): text.strip() for number, text in zip(parts[1::2], parts[2::2])}
+    repaired = {}
+    for number, (digest, text) in enumerate(batch, start=1):
+        answer = answers.get(number)
+        if (answer and abs(len(answer) - len(text)) <= REPAIR_MAX_LENGTH_CHANGE * len(text)
+                and answer.count('\n') == text.count('\n')):
+            repaired[digest] = answer
+    return repaired
+
+def _repair_batch(model, limiter, batch):
+    limiter.wait()
+    response = model.generate_response(batch_messages(batch), max_tokens=batch_max_tokens(batch))
+    return parse_batch_response(batch, response)
+
+# --- Repair Stage ---
+
+def repair_book_text(text_dir, model, cache_dir=None, max_workers=REPAIR_MAX_WORKERS,
+                     requests_per_minute=REPAIR_REQUESTS_PER_MINUTE, batch_chars=REPAIR_BATCH_CHARS):
+    """
+    Fix OCR and hyphenation damage in extracted chapter files with an LLM.
+
+    Chapters (the .txt files in text_dir) are split into paragraphs. Each
+    distinct paragraph is looked up in the cache by its hash; the rest are
+    sent once, in batches, by max_workers threads with request starts spaced
+    to requests_per_minute. Answers are cached as they arrive and the
+    chapter files are rewritten in place. A batch whose request fails or
+    whose answer doesn't match the paragraphs keeps the original text and is
+    not cached, so it is tried again on the next run.
+
+    Args:
+        text_dir (str): Directory of chapter .txt files (extract_book output).
+        model: Any object with generate_response(messages, max_tokens=...) -> str, e.g. GroqModel.
+        cache_dir (str, optional): Cache directory; None disables caching.
+        requests_per_minute (int, optional): Provider rate limit; None for no limit.
+
+    Returns:
+        dict: Counts of 'paragraphs', 'cached', 'sent', 'repaired', 'requests' and 'failed_batches'.
+    """
+    print(f"\n--- Repairing Text ({_model_name(model)}) ---")
+    chapters = {}
+    for filename in sorted(f for f in os.listdir(text_dir) if f.endswith('.txt')):
+        with open(os.path.join(text_dir, filename), 'r', encoding='utf-8') as f:
+            chapters[filename] = f.read().split("\n\n")
+
+    repaired, pending = {}, {}
+    stats = {'paragraphs': 0, 'cached': 0, 'sent': 0, 'repaired': 0, 'requests': 0, 'failed_batches': 0}
+    for paragraphs in chapters.values():
+        for paragraph in paragraphs:
+            text = paragraph.strip()
+            if len(text) < REPAIR_MIN_CHARS:
+                continue
+            stats['paragraphs'] += 1
+            digest = paragraph_hash(text)
+            if digest in repaired or digest in pending:
+                continue # Repeated paragraphs (e.g. running headers) are handled once
+            entry = load_cache_entry(cache_dir, REPAIR_CACHE_NAMESPACE, _cache_key(model, digest))
+            if entry is not None:
+                repaired[digest] = entry['text']
+                stats['cached'] += 1
+            else:
+                pending[digest] = text
+
+    batches = make_batches(pending.items(), batch_chars)
+    stats['sent'] = len(pending)
+    print(f"  {stats['paragraphs']} paragraphs, {stats['cached']} cached, "
+          f"sending {len(pending)} in {len(batches)} request(s)")
+    limiter = RateLimiter(requests_per_minute)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(_repair_batch, model, limiter, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            stats['requests'] += 1
+            try:
+                answers = future.result()
+            except Exception as e:
+                print(f"  Warning: Repair request failed: {e}")
+                answers = {}
+            if len(answers) < len(futures[future]):
+                stats['failed_batches'] += 1
+            for digest, text in answers.items():
+                save_cache_entry(cache_dir, REPAIR_CACHE_NAMESPACE, _cache_key(model, digest), {'text': text})
+            repaired.update(answers)
+
+    for filename, paragraphs in chapters.items():
+        fixed = [repaired.get(paragraph_hash(p.strip()), p) if len(p.strip()) >= REPAIR_MIN_CHARS else p
+                 for p in paragraphs]
+        changed = sum(a != b for a, b in zip(fixed, paragraphs))
+        if changed:
+            stats['repaired'] += changed
+            with open(os.path.join(text_dir, filename), 'w', encoding='utf-8') as f:
+                f.write("\n\n".join(fixed))
+    print(f"  Repaired {stats['repaired']} paragraph(s); {stats['failed_batches']} batch(es) kept the original text")
+    return stats
@@ -0,0 +1,110 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from core.services.memory import governor
+
+# --- Configuration ---
+DEFAULT_CPU_BUDGET = os.cpu_count() or 1 # CPUs shared by concurrently running tasks
+
+class Task:
+    """
+    One node of a task graph.
+
+    Args:
+        name (str): Unique task name; results and timings are keyed by it.
+        func (callable): Called with the results of `deps` as keyword arguments.
+        deps (iterable): Names of tasks that must finish first.
+        cpus (int): CPUs the task keeps busy (e.g. the -threads given to ffmpeg).
+            0 for I/O-only tasks. Capped at the budget, so a wide task runs alone.
+    """
+
+    def __init__(self, name, func, deps=(), cpus=1):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.cpus = cpus
+
+def run_task_graph(tasks, cpu_budget=None):
+    """
+    Run tasks on a thread pool as soon as their dependencies are done.
+
+    A task only starts while the CPUs of the running tasks plus its own fit in
+    cpu_budget (default DEFAULT_CPU_BUDGET), and, while the process tree is near
+    the memory budget (core.services.memory), only when nothing else runs.
+    Each task is a memory-governor stage, so its peak RSS is recorded. Tasks
+    do their heavy work in subprocesses (ffmpeg) or I/O, so threads are
+    enough. After the first failure no new tasks start; running ones finish
+    and the error is re-raised.
+
+    Returns:
+        tuple: (results, timings). results maps task name -> return value.
+               timings maps task name -> {'start', 'end', 'seconds', 'cpus'}
+               (seconds relative to the start of the graph), plus
+               '_total' -> {'seconds', 'task_seconds', 'cpu_budget'}.
+
+    Raises:
+        ValueError: On unknown dependencies or a dependency cycle.
+    """
+    budget = max(1, cpu_budget or DEFAULT_CPU_BUDGET)
+    pending = {task.name: task for task in tasks}
+    for task in tasks:
+        missing = [dep for dep in task.deps if dep not in pending]
+        if missing:
+            raise ValueError(f"Task '{task.name}' depends on unknown task(s): {', '.join(missing)}")
+
+    results, timings = {}, {}
+    running = {}
+    cpus_in_use = 0
+    error = None
+    graph_start = time.perf_counter()
+
+    def timed(task, kwargs):
+        start = time.perf_counter()
+        try:
+            with governor.stage(task.name):
+                return task.func(**kwargs)
+        finally:
+            end = time.perf_counter()
+            timings[task.name] = {
+                'start': round(start - graph_start, 3),
+                'end': round(end - graph_start, 3),
+                'seconds': round(end - start, 3),
+                'cpus': min(task.cpus, budget),
+            }
+
+    with ThreadPoolExecutor(max_workers=max(1, len(tasks))) as executor:
+        while (pending and error is None) or running:
+            if error is None:
+                for task in list(pending.values()):
+                    if not all(dep in results for dep in task.deps):
+                        continue
+                    cpus = min(task.cpus, budget)
+                    if running and cpus_in_use + cpus > budget:
+                        continue
+                    if running and governor.near_budget():
+                        break # Backpressure: let running tasks drain first
+                    del pending[task.name]
+                    cpus_in_use += cpus
+                    kwargs = {dep: results[dep] for dep in task.deps}
+                    running[executor.submit(timed, task, kwargs)] = task
+            if not running:
+                raise ValueError(f"Dependency cycle between tasks: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                cpus_in_use -= min(task.cpus, budget)
+                try:
+                    results[task.name] = future.result()
+                except Exception as e:
+                    print(f"Task '{task.name}' failed: {e}")
+                    error = error or e
+
+    if error is not None:
+        raise error
+    timings['_total'] = {
+        'seconds': round(time.perf_counter() - graph_start, 3),
+        'task_seconds': round(sum(t['seconds'] for t in timings.values()), 3),
+        'cpu_budget': budget,
+    }
+    return results, timings
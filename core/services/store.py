@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+
+from core.services.cache import file_content_hash
+
+# --- Configuration ---
+DEFAULT_STORE_DIR = "io/output_pool/store" # Content-addressed blobs live under <store>/objects
+MANIFEST_NAME = "manifest.json" # Per-book file listing the blobs it references
+MANIFEST_FORMAT_VERSION = 1
+STORE_GC_GRACE_SECONDS = 3600 # Unreferenced blobs/temp files younger than this survive GC (publishes in flight)
+
+# --- Durable File Helpers ---
+
+def _default_file_mode():
+    """Mode a plainly created file would get; NamedTemporaryFile always uses 0600."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+def _fsync_path(path):
+    """Flush a file's data, or a directory's entries, to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass # Some filesystems don't support fsync on directories
+    finally:
+        os.close(fd)
+
+def _atomic_write_bytes(path, data):
+    """Write bytes to a temp file next to path, fsync it and rename it into place."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as temp_file:
+        temp_file.write(data)
+        os.chmod(temp_file.name, _default_file_mode())
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_file.name, path)
+    _fsync_path(directory)
+
+# --- Blob Storage ---
+
+def blob_relpath(digest, ext=''):
+    """Blobs are fanned out by the first two hash characters, keeping the extension for players."""
+    return os.path.join('objects', digest[:2], f"{digest}{ext.lower()}")
+
+def put_file(src_path, store_dir=DEFAULT_STORE_DIR, move=False):
+    """
+    Add a file to the store under its SHA-256.
+
+    The content goes to a temp file in the blob's directory, is fsynced and is
+    renamed into place, so the blob path never shows a partial file. If a blob
+    with the same hash exists (e.g. an unchanged re-render), nothing is
+    written. With move=True the source is renamed in when possible, so large
+    outputs are never copied, and it is removed afterwards in every case.
+
+    Returns:
+        dict: {'sha256', 'size', 'blob'} with 'blob' relative to store_dir.
+    """
+    digest = file_content_hash(src_path)
+    size = os.path.getsize(src_path)
+    relpath = blob_relpath(digest, os.path.splitext(src_path)[1])
+    blob_path = os.path.join(store_dir, relpath)
+
+    if os.path.exists(blob_path):
+        print(f"  Store: {os.path.basename(src_path)} already stored as {digest[:12]}")
+        os.utime(blob_path) # Restart the GC grace period until a manifest references it
+        if move:
+            os.remove(src_path)
+        return {'sha256': digest, 'size': size, 'blob': relpath}
+
+    blob_dir = os.path.dirname(blob_path)
+    os.makedirs(blob_dir, exist_ok=True)
+    published = False
+    if move:
+        try:
+            _fsync_path(src_path) # Data written by ffmpeg may still be in the page cache
+            os.replace(src_path, blob_path)
+            published = True
+        except OSError:
+            pass # Different filesystem: fall back to copying
+    if not published:
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=blob_dir, suffix='.tmp', delete=False) as temp_file:
+                temp_path = temp_file.name
+                with open(src_path, 'rb') as src:
+                    shutil.copyfileobj(src, temp_file, 1024 * 1024)
+                os.chmod(temp_path, _default_file_mode())
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, blob_path)
+        except Exception:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if move:
+            os.remove(src_path)
+    os.utime(blob_path) # A moved file keeps its old mtime; see STORE_GC_GRACE_SECONDS
+    _fsync_path(blob_dir)
+    print(f"  Store: {os.path.basename(src_path)} -> {relpath}")
+    return {'sha256': digest, 'size': size, 'blob': relpath}
+
+def _link_into(book_dir, name, blob_path):
+    """
+    Atomically make book_dir/name refer to a blob.
+
+    A relative symlink is preferred; filesystems without symlinks get a hard
+    link, and as a last resort a copy. The new entry is created under a temp
+    name and renamed over the old one, so readers see the old or the new file.
+    """
+    final_path = os.path.join(book_dir, name)
+    temp_path = os.path.join(book_dir, f".{name}.{os.getpid()}.tmp")
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.symlink(os.path.relpath(blob_path, book_dir), temp_path)
+    except OSError:
+        try:
+            os.link(blob_path, temp_path)
+        except OSError:
+            shutil.copy2(blob_path, temp_path)
+    os.replace(temp_path, final_path)
+
+def link_out(blob_path, dest_path):
+    """
+    Atomically make dest_path (outside the store) refer to a blob.
+
+    A hard link is preferred: it costs no space and outlives the blob's
+    garbage collection. A symlink is tried next, and only then a copy.
+    Whoever writes dest_path again must remove it first rather than
+    overwrite it, or the blob would be rewritten through the link.
+    """
+    directory = os.path.dirname(dest_path) or '.'
+    temp_path = os.path.join(directory, f".{os.path.basename(dest_path)}.{os.getpid()}.tmp")
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(blob_path, temp_path)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(blob_path), temp_path)
+        except OSError:
+            shutil.copy2(blob_path, temp_path)
+    os.replace(temp_path, dest_path)
+
+# --- Book Manifests ---
+
+def read_manifest(book_dir):
+    """Return a book directory's manifest, or None if it has none."""
+    path = os.path.join(book_dir, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def publish_book_files(book_dir, files, store_dir=DEFAULT_STORE_DIR, keep_existing=False):
+    """
+    Store files and reference them by hash from a book directory.
+
+    Args:
+        book_dir (str): Per-book directory (e.g. io/output_pool/book/<name>).
+        files (list): (src_path, move) pairs; each file appears in book_dir under its basename.
+        store_dir (str): Content-addressed store root.
+        keep_existing (bool): Add to the files already published (e.g. a preview) instead of
+            replacing them.
+
+    Returns:
+        dict: The manifest written to book_dir/manifest.json.
+    """
+    os.makedirs(book_dir, exist_ok=True)
+    previous = read_manifest(book_dir) or {'files': {}}
+    entries = dict(previous['files']) if keep_existing else {}
+    for src_path, move in files:
+        name = os.path.basename(src_path)
+        entry = put_file(src_path, store_dir, move=move)
+        _link_into(book_dir, name, os.path.join(store_dir, entry['blob']))
+        entries[name] = entry
+
+    # Names from an earlier render that this one no longer produces
+    for name in set(previous['files']) - set(entries):
+        stale_path = os.path.join(book_dir, name)
+        if os.path.lexists(stale_path):
+            os.remove(stale_path)
+
+    manifest = {
+        'format_version': MANIFEST_FORMAT_VERSION,
+        'store_dir': os.path.relpath(store_dir, book_dir),
+        'published': time.time(),
+        'files': entries,
+    }
+    _atomic_write_bytes(os.path.join(book_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+# --- Garbage Collection ---
+
+def referenced_blobs(books_dir):
+    """Blob paths (relative to the store) referenced by any book manifest under books_dir."""
+    referenced = set()
+    if not os.path.isdir(books_dir):
+        return referenced
+    for entry in os.scandir(books_dir):
+        if not entry.is_dir():
+            continue
+        try:
+            manifest = read_manifest(entry.path)
+        except (OSError, ValueError) as e:
+            # An unreadable manifest makes GC unsafe: its blobs would look unreferenced
+            raise RuntimeError(f"Cannot read manifest in '{entry.path}': {e}")
+        if manifest:
+            referenced.update(file_entry['blob'] for file_entry in manifest['files'].values())
+    return referenced
+
+def collect_garbage(books_dir, store_dir=DEFAULT_STORE_DIR, grace_seconds=STORE_GC_GRACE_SECONDS):
+    """
+    Delete blobs no book manifest references, plus abandoned temp files.
+
+    Anything modified within grace_seconds is kept, so a blob published by a
+    concurrent run whose manifest isn't written yet is not collected.
+
+    Returns:
+        dict: {'removed': count, 'freed_bytes': bytes}.
+    """
+    objects_dir = os.path.join(store_dir, 'objects')
+    removed, freed = 0, 0
+    if not os.path.isdir(objects_dir):
+        return {'removed': removed, 'freed_bytes': freed}
+    referenced = referenced_blobs(books_dir)
+    cutoff = time.time() - grace_seconds
+    for fan_dir in os.scandir(objects_dir):
+        if not fan_dir.is_dir():
+            continue
+        for blob in os.scandir(fan_dir.path):
+            relpath = os.path.join('objects', fan_dir.name, blob.name)
+            stat = blob.stat(follow_symlinks=False)
+            if relpath in referenced or stat.st_mtime > cutoff:
+                continue
+            os.remove(blob.path)
+            removed += 1
+            freed += stat.st_size
+    if removed:
+        print(f"  Store GC: removed {removed} unreferenced blob(s), freed {freed / 1e6:.1f} MB")
+    return {'removed': removed, 'freed_bytes': freed}
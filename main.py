@@ -1,10 +1,17 @@
 import os
 import sys
+import time
+import subprocess
 from pathlib import Path
 from shutil import copy2
 from core.services.extract import extract_book
 from core.providers.kokoro import generate_audiobooks_kokoro
-from output import process_output
+from output import process_output, PreviewPublisher
+from core.services.encoder import StreamingBookEncoder
+from core.services.profiles import parse_profile_spec
+from core.services.repair import repair_book_text
+from core.services.memory import governor
+from core.services.distributed import create_job, wait_for_job, job_audio_dir, run_worker
 
 def ensure_directories():
     """Create required directories if they don't exist."""
@@ -16,17 +23,45 @@ def ensure_directories():
         'io/output_pool/book_audio',
         'io/output_pool/metadata',
         'io/output_pool/timestamps',
-        'io/output_pool/book'
+        'io/output_pool/book',
+        'io/output_pool/store',
+        'io/cache'
     ]
     for dir_path in directories:
         os.makedirs(dir_path, exist_ok=True)
 
-def process_book(pdf_path, thumbnail_path):
-    """Process a PDF file into an audiobook."""
+def process_book(pdf_path, thumbnail_path, encode_once=False, full_video=False, shorts=False, cpu_budget=None, profile=None, chapter_format='.flac',
+                 m4b=False, repair_text=False, memory_budget=None, distribute=None, local_workers=0, preview=False, preview_minutes=None):
+    """
+    Process a PDF file into an audiobook.
+
+    With encode_once, synthesized audio streams into a single encoder that writes
+    the final mp3 and an AAC stream for the video, instead of per-chapter WAVs that
+    are merged and re-encoded later. Otherwise chapters are written in
+    chapter_format ('.flac', '.opus' or '.wav') while they are synthesized.
+    A chaptered M4B is always made in encode-once mode, where it is a remux of
+    the encoder's AAC stream; otherwise only with m4b, as it re-encodes the book
+    unless an earlier encode-once AAC of the same audio is still there.
+    full_video, shorts, cpu_budget and the encoding profile are passed to
+    process_output. repair_text runs the extracted chapters through an LLM
+    (GroqModel) to fix OCR and hyphenation damage before synthesis.
+    memory_budget (MB) makes the stages apply backpressure near that much RSS;
+    each stage's peak is saved in the book metadata either way.
+    With distribute (a directory every worker host mounts), this process is the
+    coordinator: chapters become a job there, synthesized by any number of
+    `main.py --worker=DIR` processes (local_workers of them started here), and
+    the output is built once every chapter is committed.
+    With preview, the opening chapter (or the first preview_minutes of audio)
+    is published as <book>_preview.mp3 as soon as it is synthesized, while the
+    rest of the book continues; the time to first audio is saved as 'latency'
+    in the metadata either way.
+    """
     if not os.path.exists(pdf_path):
         print(f"Error: File not found - {pdf_path}")
         return False
 
+    submitted_at = time.time()
+    governor.set_budget(memory_budget)
     try:
         # Step 1 & 2: Copy PDF to input pool
         filename = os.path.basename(pdf_path)
@@ -36,15 +71,22 @@ def process_book(pdf_path, thumbnail_path):
 
         # Step 3: Extract text from PDF
         book_text_dir = 'io/input_pool/book_text'
-        extract_result = extract_book(
-            input_book_path,
-            use_toc=True,
-            extract_mode="chapters",
-            output_dir=book_text_dir,
-            progress_callback=lambda p: print(f"Extraction progress: {p}%") if p else None
-        )
+        with governor.stage('extract'):
+            extract_result = extract_book(
+                input_book_path,
+                use_toc=True,
+                extract_mode="chapters",
+                output_dir=book_text_dir,
+                cache_dir='io/cache',
+                progress_callback=lambda p: print(f"Extraction progress: {p}%") if p else None
+            )
         print("Text extraction completed")
 
+        if repair_text:
+            from core.models.groq import GroqModel # Provider SDK is only imported when the stage runs
+            with governor.stage('repair'):
+                repair_book_text(book_text_dir, GroqModel(), cache_dir='io/cache')
+
         # Step 4-5: Generate audio for chapters
         chapter_audio_dir = 'io/input_pool/chapter_audio'
         book_name = os.path.splitext(filename)[0]
@@ -53,15 +95,63 @@ def process_book(pdf_path, thumbnail_path):
         voice = "af_heart"  # Default voice
         lang_code = "a"    # English
         
+        # Encode-once mode: one encoder for the whole book, fed during synthesis
+        encoder = None
+        if encode_once:
+            book_audio_base = os.path.join('io/output_pool/book_audio', book_name)
+            encoder = StreamingBookEncoder(f"{book_audio_base}.mp3", aac_output=f"{book_audio_base}.m4a", profile=profile)
+
+        # Preview mode: publish the opening of the book while the rest is synthesized
+        preview_seconds = preview_minutes * 60 if preview_minutes else None
+        publisher = None
+        if preview:
+            chapter_names = sorted(os.path.splitext(f)[0] for f in os.listdir(book_text_dir) if f.lower().endswith('.txt'))
+            publisher = PreviewPublisher(book_name, chapter_names, output_base_dir='io/output_pool', max_seconds=preview_seconds,
+                                         profile=profile, submitted_at=submitted_at)
+        chapter_ready = publisher.chapter_ready if publisher else None
+
         # Generate audio
-        generate_audiobooks_kokoro(
-            input_dir=book_text_dir,
-            output_dir=chapter_audio_dir,
-            voice=voice,
-            lang_code=lang_code,
-            progress_callback=lambda p, f, i, t: print(f"Audio generation: {p}%") if p else None
-        )
+        if distribute:
+            create_job(distribute, book_text_dir, book_name, voice, lang_code, audio_format=chapter_format,
+                       priority_seconds=(preview_seconds or 0) if preview else None)
+            workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), f"--worker={distribute}"])
+                       for _ in range(local_workers)]
+            try:
+                with governor.stage('synthesis'):
+                    status = wait_for_job(distribute, workers=workers, chapter_callback=chapter_ready)
+            finally:
+                for worker in workers:
+                    worker.wait()
+            if status['pending']:
+                raise RuntimeError(f"{len(status['pending'])} chapter(s) were not synthesized")
+            if status['failed']:
+                # A book with chapters missing would shift every later timestamp; rerunning retries them
+                raise RuntimeError(f"{len(status['failed'])} chapter(s) failed: {', '.join(status['failed'])}")
+            chapter_audio_dir = job_audio_dir(distribute)
+            encoded_audio = None
+        else:
+            try:
+                with governor.stage('synthesis'):
+                    generated_files = generate_audiobooks_kokoro(
+                        input_dir=book_text_dir,
+                        output_dir=chapter_audio_dir,
+                        voice=voice,
+                        lang_code=lang_code,
+                        audio_format=chapter_format,
+                        progress_callback=lambda p, f, i, t: print(f"Audio generation: {p}%") if p else None,
+                        encoder=encoder,
+                        chapter_callback=chapter_ready
+                    )
+                    # Errors and cancellation are reported, not raised; never publish a truncated book
+                    chapter_count = len([f for f in os.listdir(book_text_dir) if f.lower().endswith('.txt')])
+                    if len(generated_files) != chapter_count:
+                        raise RuntimeError(f"Only {len(generated_files)} of {chapter_count} chapter(s) were synthesized")
+                    encoded_audio = encoder.close() if encoder else None
+            except Exception:
+                if encoder: encoder.abort()
+                raise
         print("Audio generation completed")
+        latency = publisher.wait() if publisher else None
         
         # Step 6: Process output
         process_output(
@@ -69,7 +159,16 @@ def process_book(pdf_path, thumbnail_path):
             chapter_audio_dir,
             book_name,
             output_base_dir='io/output_pool',
-            format='mp3'  # or 'wav' if preferred
+            format='mp3',  # or 'wav' if preferred
+            encoded_audio=encoded_audio,
+            m4b=m4b or encode_once,  # A pure remux in encode-once mode, usually a full AAC encode otherwise
+            full_video=full_video,
+            shorts=shorts,
+            cpu_budget=cpu_budget,
+            profile=profile,
+            submitted_at=submitted_at,
+            latency=latency,
+            chapter_format=chapter_format
         )
         print("Output processing completed")   
 
@@ -81,21 +180,62 @@ def process_book(pdf_path, thumbnail_path):
 
 def main():
     """Main entry point."""
-    if len(sys.argv) != 3:
-        print("Usage: python main.py <path_to_pdf> <path_to_thumbnail>")
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = dict(flag.split('=', 1) for flag in flags if '=' in flag)
+    switches = {flag for flag in flags if '=' not in flag}
+    if '--worker' in options:
+        # Worker mode: synthesize chapters of a coordinator's job until none are left
+        if args or switches or set(options) != {'--worker'}:
+            print("Usage: python main.py --worker=<job_dir>")
+            sys.exit(1)
+        run_worker(options['--worker'])
+        return
+    if (len(args) != 2 or switches - {'--encode-once', '--m4b', '--full-video', '--shorts', '--repair-text', '--preview'}
+            or set(options) - {'--cpu-budget', '--profile', '--chapter-format', '--memory-budget', '--distribute', '--local-workers', '--preview'}
+            or not options.get('--preview', '1').isdigit()
+            or ('--encode-once' in switches and ('--preview' in switches or '--preview' in options))
+            or not options.get('--cpu-budget', '1').isdigit()
+            or not options.get('--memory-budget', '1').isdigit()
+            or not options.get('--local-workers', '0').isdigit()
+            or ('--local-workers' in options and '--distribute' not in options)
+            or ('--encode-once' in switches and '--distribute' in options)
+            or options.get('--chapter-format', 'flac') not in ('flac', 'opus', 'wav')):
+        print("Usage: python main.py <path_to_pdf> <path_to_thumbnail> [--encode-once] [--m4b] [--full-video] [--shorts] [--repair-text] [--cpu-budget=N] [--memory-budget=MB]"
+              " [--profile=draft|standard|archive|stage:profile,...] [--chapter-format=flac|opus|wav] [--distribute=<job_dir> [--local-workers=N]] [--preview[=MINUTES]]")
+        print("       python main.py --worker=<job_dir>")
+        sys.exit(1)
+    try:
+        profile = parse_profile_spec(options['--profile']) if '--profile' in options else None
+    except ValueError as e:
+        print(f"Error: {e}")
         sys.exit(1)
 
-    pdf_path = sys.argv[1]
+    pdf_path = args[0]
     print(f"Processing PDF: {pdf_path}")
 
-    thumbnail_path = sys.argv[2]
+    thumbnail_path = args[1]
     print(f"Processing Thumbnail: {thumbnail_path}")
 
     # Ensure all required directories exist
     ensure_directories()
 
     # Process the book
-    if process_book(pdf_path, thumbnail_path):
+    cpu_budget = int(options['--cpu-budget']) if '--cpu-budget' in options else None
+    if process_book(pdf_path, thumbnail_path,
+                    encode_once='--encode-once' in switches,
+                    full_video='--full-video' in switches,
+                    shorts='--shorts' in switches,
+                    cpu_budget=cpu_budget,
+                    profile=profile,
+                    chapter_format=f".{options.get('--chapter-format', 'flac')}",
+                    m4b='--m4b' in switches,
+                    repair_text='--repair-text' in switches,
+                    memory_budget=int(options['--memory-budget']) if '--memory-budget' in options else None,
+                    distribute=options.get('--distribute'),
+                    local_workers=int(options.get('--local-workers', '0')),
+                    preview='--preview' in switches or '--preview' in options,
+                    preview_minutes=int(options['--preview']) if '--preview' in options else None):
         print("Processing completed successfully")
     else:
         print("Processing failed")
@@ -1,35 +1,205 @@
 import os
+import re
 import json
 from pathlib import Path
-from pydub import AudioSegment
 from datetime import datetime
-import shutil
 import subprocess
-from moviepy.editor import AudioFileClip, TextClip, CompositeVideoClip, ColorClip
+import glob
+import tempfile
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from core.services.scheduler import Task, run_task_graph, DEFAULT_CPU_BUDGET
+from core.services.memory import governor
+from core.services.store import publish_book_files, collect_garbage, link_out
+from core.services.profiles import stage_settings, audio_codec_args, video_codec_args, mp3_codec_args
+from core.services.levels import read_chapter_levels, loudness_gains, TARGET_LOUDNESS_LUFS
+from core.services.alignment import rebase_chapter_segments, write_seek_index, write_srt, write_vtt
 import math
-def merge_audio_files(chapter_audio_dir, output_file, format='wav'):
-    """Merge multiple audio files into a single file while tracking chapter timestamps."""
+
+MERGE_BLOCK_FRAMES = 65536 # Frames copied per read/write when streaming PCM
+SOUNDFILE_OUTPUT_FORMATS = {'wav', 'flac', 'ogg'} # Outputs written directly with soundfile
+CHAPTER_AUDIO_EXTENSIONS = ('wav', 'flac', 'opus', 'mp3') # Chapter formats merge_audio_files picks up
+PREVIEW_SUFFIX = "_preview" # <book>_preview.mp3, published before the full book
+AAC_REUSE_TOLERANCE_SECONDS = 0.25 # An encode-once .m4a is reused for the M4B if its length is this close to the book's
+
+def probe_audio_file(audio_path):
+    """
+    Read duration information from an audio file's header without decoding it.
+
+    Returns:
+        dict: {'duration_ms', 'frames', 'samplerate', 'channels', 'subtype'}.
+              'frames'/'subtype' are None for formats soundfile can't open
+              (e.g. mp3 on older libsndfile), which are probed with ffprobe.
+    """
+    try:
+        info = sf.info(audio_path)
+        return {
+            # Same rounding as pydub's len(AudioSegment), so timestamps stay identical
+            'duration_ms': round(1000 * info.frames / info.samplerate),
+            'frames': info.frames,
+            'samplerate': info.samplerate,
+            'channels': info.channels,
+            'subtype': info.subtype,
+        }
+    except RuntimeError:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=sample_rate,channels:format=duration",
+             "-of", "json", audio_path],
+            capture_output=True, text=True, check=True
+        )
+        probe = json.loads(result.stdout)
+        stream = (probe.get('streams') or [{}])[0]
+        return {
+            'duration_ms': round(float(probe['format']['duration']) * 1000),
+            'frames': None,
+            'samplerate': int(stream.get('sample_rate', 0)) or None,
+            'channels': stream.get('channels'),
+            'subtype': None,
+        }
+
+def audio_duration_seconds(audio_file, timestamps=None):
+    """
+    Total duration of a book's audio, in seconds.
+
+    Uses the end of the last chapter when timestamps (as returned by
+    merge_audio_files or StreamingBookEncoder) are given, otherwise reads the
+    file header with probe_audio_file.
+    """
+    if timestamps:
+        return timestamps[-1]['end_time']
+    return probe_audio_file(audio_file)['duration_ms'] / 1000.0
+
+def _chapter_blocks(audio_path, gain, dtype):
+    """Read a chapter block by block, applying its gain (from the levels sidecar) if it has one."""
+    for block in sf.blocks(audio_path, blocksize=MERGE_BLOCK_FRAMES, dtype=dtype, always_2d=True):
+        if gain != 1.0:
+            block = np.clip(block * gain, -1.0, 1.0)
+        yield block
+
+def _stream_pcm_merge(audio_paths, chapter_infos, output_file, export_format, profile=None, max_frames=None):
+    """
+    Append PCM blocks from each chapter straight to the output (file or encoder pipe).
+
+    Stops after max_frames if given. Returns the number of frames written.
+    """
+    samplerate = chapter_infos[0]['samplerate']
+    channels = chapter_infos[0]['channels']
+    gains = [info.get('gain', 1.0) for info in chapter_infos]
+    lossless_int16 = all(info['subtype'] == 'PCM_16' for info in chapter_infos) and all(g == 1.0 for g in gains)
+    dtype = 'int16' if lossless_int16 else 'float32'
+
+    def blocks():
+        remaining = max_frames
+        for audio_path, gain in zip(audio_paths, gains):
+            for block in _chapter_blocks(audio_path, gain, dtype):
+                if remaining is not None:
+                    block = block[:remaining]
+                    remaining -= len(block)
+                yield block
+                if remaining == 0:
+                    return
+
+    frames = 0
+    if export_format in SOUNDFILE_OUTPUT_FORMATS:
+        # Gained chapters are normalized like the int16 WAVs of the legacy path
+        wav_subtype = 'PCM_16' if lossless_int16 or any(g != 1.0 for g in gains) else 'FLOAT'
+        subtype = {'wav': wav_subtype, 'flac': 'PCM_16', 'ogg': 'VORBIS'}[export_format]
+        with sf.SoundFile(output_file, 'w', samplerate=samplerate, channels=channels,
+                          format=export_format.upper(), subtype=subtype) as out:
+            for block in blocks():
+                out.write(block)
+                frames += len(block)
+        return frames
+
+    # Compressed output: feed raw PCM into a single long-lived ffmpeg encoder
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "s16le" if lossless_int16 else "f32le",
+        "-ar", str(samplerate), "-ac", str(channels),
+        "-i", "pipe:0",
+        *mp3_codec_args(output_file, profile),
+        output_file
+    ]
+    encoder = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for block in blocks():
+            encoder.stdin.write(block.astype(f"<{'i2' if lossless_int16 else 'f4'}", copy=False).tobytes())
+            frames += len(block)
+    finally:
+        encoder.stdin.close()
+        return_code = encoder.wait()
+    if return_code != 0:
+        raise RuntimeError(f"ffmpeg encoder exited with code {return_code} while writing {output_file}")
+    return frames
+
+def _ffmpeg_concat_merge(audio_paths, output_file, stream_copy, profile=None):
+    """Concatenate encoded chapters with ffmpeg's concat demuxer, copying frames when possible."""
+    list_file = f"{output_file}.concat.txt"
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for audio_path in audio_paths:
+            escaped = os.path.abspath(audio_path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_file, "-vn"]
+    command += ["-c", "copy"] if stream_copy else mp3_codec_args(output_file, profile)
+    command.append(output_file)
+    try:
+        subprocess.run(command, check=True)
+    finally:
+        os.remove(list_file)
+
+def merge_audio_files(chapter_audio_dir, output_file, format='wav', profile=None, chapter_format=None):
+    """
+    Merge multiple audio files into a single file while tracking chapter timestamps.
+
+    Chapter durations come from file headers, and audio is streamed to the
+    output instead of being decoded into memory: PCM chapters are appended
+    block by block (to a soundfile writer or a single ffmpeg encoder), and
+    encoded chapters already in the output format are stream-copied with
+    ffmpeg's concat demuxer. Memory use is constant and time is linear in
+    the total audio length. mp3 encoding uses the profile's 'audio' stage;
+    stream-copied and soundfile outputs are not re-encoded.
+
+    Chapters may be WAV, FLAC, Opus or mp3. Chapters written during synthesis
+    have a levels sidecar with exact frame counts and a loudness histogram.
+    When every chapter has one, each chapter is brought to the same integrated
+    loudness (TARGET_LOUDNESS_LUFS, lowered for the whole book if a chapter's
+    peak requires it) by a gain applied while streaming; otherwise each
+    chapter's peak-normalization gain from its sidecar is used.
+
+    chapter_format (e.g. '.flac') names the format the chapters were just
+    synthesized in; only those files are merged. Without it the directory
+    must hold a single chapter format (or the output format among several),
+    so stale chapters of an earlier run are never merged by guesswork.
+    """
     print(f"\n--- Merging Audio Files ---")
     
     # Validate directory
     if not os.path.isdir(chapter_audio_dir):
         raise ValueError(f"Audio directory not found: {chapter_audio_dir}")
     
-    # First, check for both possible formats to handle potential mismatches
-    wav_files = sorted([f for f in os.listdir(chapter_audio_dir) if f.endswith('.wav')])
-    mp3_files = sorted([f for f in os.listdir(chapter_audio_dir) if f.endswith('.mp3')])
+    # First, check for all possible formats to handle potential mismatches
+    files_by_format = {
+        ext: sorted([f for f in os.listdir(chapter_audio_dir) if f.endswith(f'.{ext}')])
+        for ext in CHAPTER_AUDIO_EXTENSIONS
+    }
+    present = [ext for ext in CHAPTER_AUDIO_EXTENSIONS if files_by_format[ext]]
     
-    # Use whichever format has files
-    if mp3_files and not wav_files:
-        audio_files = mp3_files
-        actual_format = 'mp3'
-    elif wav_files and not mp3_files:
-        audio_files = wav_files
-        actual_format = 'wav'
-    else:
-        # If both or neither exist, prefer the specified format
-        audio_files = wav_files if format == 'wav' else mp3_files
+    # Use the format just synthesized, else whichever format has files
+    if chapter_format:
+        actual_format = chapter_format.lstrip('.')
+    elif len(present) == 1:
+        actual_format = present[0]
+    elif format in present or not present:
+        # If several or none exist, prefer the specified format
         actual_format = format
+    else:
+        raise ValueError(f"Chapter audio in several formats ({', '.join(present)}) in {chapter_audio_dir}; "
+                         f"pass the chapter format to merge")
+    audio_files = files_by_format.get(actual_format, [])
     
     print(f"Found {len(audio_files)} {actual_format} files to merge")
     
@@ -39,52 +209,75 @@ def merge_audio_files(chapter_audio_dir, output_file, format='wav'):
         print("\n".join(os.listdir(chapter_audio_dir)))
         raise ValueError(f"No audio files found in {chapter_audio_dir}")
     
+    # --- Read durations from headers ---
     timestamps = []
-    combined = None
+    audio_paths = []
+    chapter_infos = []
+    chapter_levels = []
     current_position = 0  # In milliseconds
-    
+
     for audio_file in audio_files:
         # Extract chapter info from filename
         chapter_info = os.path.splitext(audio_file)[0]
-        
-        # Load the audio file
         audio_path = os.path.join(chapter_audio_dir, audio_file)
         try:
-            # Let pydub detect format automatically if possible
-            chapter_audio = AudioSegment.from_file(audio_path)
+            info = probe_audio_file(audio_path)
         except Exception as e:
             print(f"Error loading {audio_file}: {e}")
             continue
-            
-        # Initialize or append
-        if combined is None:
-            combined = chapter_audio
-        else:
-            combined += chapter_audio
-            
+        levels = read_chapter_levels(audio_path)
+        chapter_levels.append(levels)
+        if levels:
+            info['gain'] = levels.get('gain', 1.0)
+            if info['frames'] is not None and info['frames'] != levels['frames']:
+                print(f"Warning: {audio_file} has {info['frames']} frames, levels file says {levels['frames']}")
+
         # Record timestamp
         timestamp = {
             'chapter': chapter_info,
             'start_time': current_position / 1000.0,
-            'end_time': (current_position + len(chapter_audio)) / 1000.0,
-            'duration': len(chapter_audio) / 1000.0
+            'end_time': (current_position + info['duration_ms']) / 1000.0,
+            'duration': info['duration_ms'] / 1000.0,
+            # Exact length in samples; segment indexes are rebased with it
+            'frames': info['frames'] if info['frames'] is not None else round(info['duration_ms'] * (info['samplerate'] or 0) / 1000)
         }
         timestamps.append(timestamp)
-        
-        current_position += len(chapter_audio)
+        audio_paths.append(audio_path)
+        chapter_infos.append(info)
+
+        current_position += info['duration_ms']
         print(f"Added {audio_file} - Duration: {timestamp['duration']:.2f}s")
-    
-    if combined is None:
+
+    if not audio_paths:
         raise ValueError("No audio files were successfully loaded")
-    
+
+    loudness = loudness_gains(chapter_levels)
+    if loudness:
+        gains, before, after = loudness
+        for info, gain in zip(chapter_infos, gains):
+            info['gain'] = gain
+        print(f"Book loudness: {before:.1f} LUFS -> {after:.1f} LUFS (target {TARGET_LOUDNESS_LUFS:.0f} LUFS)")
+
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    
-    # Export in requested format
+    if os.path.lexists(output_file):
+        os.remove(output_file) # A link into the store from the last publish; never write through it
+
+    # --- Stream chapters into the output ---
     print(f"Exporting combined audio to: {output_file}")
-    export_format = os.path.splitext(output_file)[1].lstrip('.')
-    combined.export(output_file, format=export_format)
-    
+    export_format = os.path.splitext(output_file)[1].lstrip('.').lower()
+    decodable = all(info['frames'] is not None for info in chapter_infos)
+    uniform = len({(info['samplerate'], info['channels']) for info in chapter_infos}) == 1
+    gained = any(info.get('gain', 1.0) != 1.0 for info in chapter_infos)
+    if uniform and not gained and actual_format == export_format and export_format not in SOUNDFILE_OUTPUT_FORMATS:
+        # Encoded chapters already in the output codec (e.g. mp3): copy frames, no re-encode
+        _ffmpeg_concat_merge(audio_paths, output_file, stream_copy=True)
+    elif uniform and decodable:
+        _stream_pcm_merge(audio_paths, chapter_infos, output_file, export_format, profile)
+    else:
+        # Mixed sample rates/channels or undecodable inputs: let ffmpeg re-encode
+        _ffmpeg_concat_merge(audio_paths, output_file, stream_copy=False, profile=profile)
+
     return timestamps
 
 def create_metadata(book_name, timestamps, output_dir):
@@ -123,9 +316,53 @@ def create_metadata(book_name, timestamps, output_dir):
     
     return metadata_file, timestamp_file
 
-def organize_final_files(book_name, audio_file, metadata_file, timestamp_file, final_dir):
+def create_subtitles(book_name, timestamps, output_dir, chapter_audio_dir=None, encoded_audio=None):
+    """
+    Write the seek index and SRT/VTT subtitles from the segments recorded during synthesis.
+
+    Segments come from the streaming encoder (encode-once mode) or from the
+    per-chapter indexes in chapter_audio_dir, rebased into book time.
+
+    Returns:
+        list: Paths of the written files; empty if no segments were recorded.
+    """
+    print(f"\n--- Creating Seek Index and Subtitles ---")
+    if encoded_audio:
+        samplerate, segments = encoded_audio.get('samplerate'), encoded_audio.get('segments') or []
+    else:
+        samplerate, segments = rebase_chapter_segments(chapter_audio_dir, timestamps)
+    if not segments:
+        print("No segment indexes found; skipping subtitles")
+        return []
+    base = os.path.join(output_dir, book_name)
+    paths = [
+        write_seek_index(f"{base}_seek_index.json", book_name, timestamps, samplerate, segments),
+        write_srt(f"{base}.srt", samplerate, segments),
+        write_vtt(f"{base}.vtt", samplerate, segments),
+    ]
+    print(f"Indexed {len(segments)} segments: {', '.join(os.path.basename(path) for path in paths)}")
+    return paths
+
+def update_metadata(metadata_file, fields):
+    """Merge extra fields (e.g. output stage timings) into an existing metadata file."""
+    with open(metadata_file, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    metadata.update(fields)
+    with open(metadata_file, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+
+def organize_final_files(book_name, audio_file, metadata_file, timestamp_file, final_dir, extra_files=(), store_dir=None):
     """
-    Move all final files to their designated output location.
+    Publish all final files to their designated output location.
+
+    Files are added to the content-addressed store (default: 'store' next to
+    final_dir) and referenced by hash from final_dir/<book_name>, with a
+    manifest.json listing them. The merged audio is moved into the store and
+    linked back to its path (store.link_out), so io/output_pool/book_audio
+    keeps it without a second copy; the small metadata and timestamp files
+    are copied, so io/output_pool/metadata and timestamps keep theirs; extra
+    outputs, which have no other home, are moved. Blobs no book references
+    any more (e.g. from an earlier render) are then removed.
     
     Args:
         book_name (str): Name of the book
@@ -133,33 +370,261 @@ def organize_final_files(book_name, audio_file, metadata_file, timestamp_file, f
         metadata_file (str): Path to the metadata JSON file
         timestamp_file (str): Path to the timestamp JSON file
         final_dir (str): Final output directory
+        extra_files (iterable): More large outputs to move in (e.g. the M4B)
+        store_dir (str, optional): Content-addressed store root
     """
     print(f"\n--- Organizing Final Files ---")
-    
-    # Create final directory
+    store_dir = store_dir or os.path.join(os.path.dirname(os.path.normpath(final_dir)), 'store')
     book_dir = os.path.join(final_dir, book_name)
-    os.makedirs(book_dir, exist_ok=True)
     
-    # Copy/move files to final location
-    final_paths = []
-    for src_file in [audio_file, metadata_file, timestamp_file]:
-        if os.path.exists(src_file):
-            dest_file = os.path.join(book_dir, os.path.basename(src_file))
-            shutil.copy2(src_file, dest_file)
-            final_paths.append(dest_file)
-            print(f"Copied: {os.path.basename(src_file)}")
+    files = [(audio_file, True), (metadata_file, False), (timestamp_file, False)]
+    files += [(path, True) for path in extra_files]
+    files = [(path, move) for path, move in files if path and os.path.exists(path)]
+    manifest = publish_book_files(book_dir, files, store_dir)
+    if audio_file and audio_file in [path for path, _ in files]:
+        link_out(os.path.join(store_dir, manifest['files'][os.path.basename(audio_file)]['blob']), audio_file)
+    collect_garbage(final_dir, store_dir)
     
     return book_dir
     
+def create_preview(audio_paths, book_name, output_dir, max_seconds=None, profile=None):
+    """
+    Encode the opening chapters as an mp3 preview of the book.
+
+    Chapters are leveled like merge_audio_files levels them (from their
+    sidecars, to TARGET_LOUDNESS_LUFS) and the preview is cut at max_seconds
+    if given.
+
+    Returns:
+        tuple: (preview file path, seconds of audio in it)
+    """
+    chapter_infos = [probe_audio_file(audio_path) for audio_path in audio_paths]
+    chapter_levels = [read_chapter_levels(audio_path) for audio_path in audio_paths]
+    loudness = loudness_gains(chapter_levels)
+    for i, (info, levels) in enumerate(zip(chapter_infos, chapter_levels)):
+        info['gain'] = loudness[0][i] if loudness else (levels or {}).get('gain', 1.0)
+    samplerate = chapter_infos[0]['samplerate']
+    os.makedirs(output_dir, exist_ok=True)
+    preview_file = os.path.join(output_dir, f"{book_name}{PREVIEW_SUFFIX}.mp3")
+    max_frames = round(max_seconds * samplerate) if max_seconds else None
+    frames = _stream_pcm_merge(audio_paths, chapter_infos, preview_file, 'mp3', profile, max_frames=max_frames)
+    return preview_file, frames / samplerate
+
+def publish_preview(book_name, preview_file, final_dir, store_dir=None):
+    """
+    Publish a preview into final_dir/<book_name>, next to any files already there.
+
+    The full publish (organize_final_files) replaces it later.
+    """
+    store_dir = store_dir or os.path.join(os.path.dirname(os.path.normpath(final_dir)), 'store')
+    book_dir = os.path.join(final_dir, book_name)
+    publish_book_files(book_dir, [(preview_file, True)], store_dir, keep_existing=True)
+    return os.path.join(book_dir, os.path.basename(preview_file))
+
+class PreviewPublisher:
+    """
+    Publishes a preview as soon as the opening of the book is synthesized.
+
+    Synthesis reports each finished chapter with chapter_ready(). Once the
+    chapters at the start of the book are all ready and hold max_seconds of
+    audio (or just the first chapter without max_seconds), the preview is
+    encoded and published on a background thread while synthesis goes on.
+    The time from submitted_at to the publish is the time to first audio.
+    A chapter whose audio cannot be probed is left out; the preview then ends
+    before it.
+    """
+
+    def __init__(self, book_name, chapter_names, output_base_dir='io/output_pool', max_seconds=None,
+                 profile=None, submitted_at=None):
+        self.book_name = book_name
+        self.chapter_names = list(chapter_names)
+        self.output_base_dir = output_base_dir
+        self.max_seconds = max_seconds
+        self.profile = profile
+        self.submitted_at = submitted_at or time.time()
+        self.latency = {}
+        self._ready = {} # chapter name -> (audio path, seconds), or None if it could not be probed
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def chapter_ready(self, chapter_name, audio_path):
+        with self._lock:
+            if self._thread is not None:
+                return
+            try:
+                self._ready[chapter_name] = (audio_path, probe_audio_file(audio_path)['duration_ms'] / 1000.0)
+            except Exception as e:
+                print(f"Warning: Could not probe '{audio_path}' for the preview, skipping it: {e}")
+                self._ready[chapter_name] = None
+            opening, seconds, ended = [], 0.0, False
+            for name in self.chapter_names:
+                if name not in self._ready:
+                    break
+                if self._ready[name] is None:
+                    ended = True # Nothing after a skipped chapter can join the preview
+                    break
+                opening.append(self._ready[name][0])
+                seconds += self._ready[name][1]
+            if not opening:
+                return
+            if self.max_seconds and seconds < self.max_seconds and len(opening) < len(self.chapter_names) and not ended:
+                return
+            self._thread = threading.Thread(target=self._publish, args=(opening,), name='preview', daemon=True)
+            self._thread.start()
+
+    def _publish(self, audio_paths):
+        try:
+            preview_file, seconds = create_preview(audio_paths, self.book_name, os.path.join(self.output_base_dir, 'book_audio'),
+                                                   self.max_seconds, self.profile)
+            published = publish_preview(self.book_name, preview_file, os.path.join(self.output_base_dir, 'book'))
+        except Exception as e:
+            print(f"Warning: Could not publish a preview: {e}") # The full book is still produced
+            return
+        self.latency = {
+            'time_to_first_audio': round(time.time() - self.submitted_at, 2),
+            'preview_seconds': round(seconds, 2),
+            'preview_chapters': len(audio_paths),
+        }
+        print(f"\n--- Preview published after {self.latency['time_to_first_audio']:.1f}s: {published} ({seconds:.0f}s of audio) ---")
+
+    def wait(self):
+        """Wait for a running publish. Returns the latency fields for the metadata ({} if nothing was published)."""
+        if self._thread is not None:
+            self._thread.join()
+        return self.latency
+
+def chapter_display_title(chapter_name):
+    """Turn a chapter file stem like '03_L1_The_Red_Room' into 'The Red Room'."""
+    title = re.sub(r'^\d+_(?:L\d+_)?', '', chapter_name).replace('_', ' ').strip()
+    return title or chapter_name
+
+def _escape_ffmetadata(value):
+    """Escape special characters for ffmpeg's FFMETADATA format."""
+    return re.sub(r'([=;#\\\n])', r'\\\1', str(value))
+
+def write_ffmetadata(book_name, timestamps, metadata_path):
+    """
+    Write an FFMETADATA1 file with book tags and one [CHAPTER] per timestamp entry.
+
+    Args:
+        book_name (str): Used as title and album tag
+        timestamps (list): Chapter timestamp dicts from merge_audio_files
+        metadata_path (str): Where to write the metadata file
+    """
+    lines = [
+        ";FFMETADATA1",
+        f"title={_escape_ffmetadata(book_name)}",
+        f"album={_escape_ffmetadata(book_name)}",
+        "genre=Audiobook",
+    ]
+    for timestamp in timestamps:
+        lines += [
+            "[CHAPTER]",
+            "TIMEBASE=1/1000",
+            f"START={round(timestamp['start_time'] * 1000)}",
+            f"END={round(timestamp['end_time'] * 1000)}",
+            f"title={_escape_ffmetadata(chapter_display_title(timestamp['chapter']))}",
+        ]
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    return metadata_path
+
+def _matching_encoded_aac(audio_file, timestamps):
+    """
+    The encode-once AAC stream (<name>.m4a next to audio_file) if it holds this book's audio.
+
+    Its length must match the timestamps, so an .m4a left by an earlier render
+    of different text is not reused. Returns None otherwise.
+    """
+    candidate = os.path.splitext(audio_file)[0] + '.m4a'
+    if candidate == audio_file or not os.path.isfile(candidate) or not timestamps:
+        return None
+    try:
+        duration = audio_duration_seconds(candidate)
+    except Exception:
+        return None
+    if abs(duration - audio_duration_seconds(audio_file, timestamps)) > AAC_REUSE_TOLERANCE_SECONDS:
+        return None
+    return candidate
+
+def create_m4b_audiobook(audio_file, timestamps, book_name, output_dir, thumbnail_file=None, aac_audio_file=None, profile=None):
+    """
+    Create an M4B audiobook with embedded chapter atoms, title and cover art.
+
+    The audio is remuxed, not re-encoded, whenever an AAC stream is available
+    (aac_audio_file from the encode-once path, an encode-once .m4a left next to
+    audio_file whose length matches the timestamps, or an .m4a/.aac
+    audio_file), so adding chapters costs seconds. Otherwise the whole book is
+    encoded to AAC: a full-length CPU encode, and for an mp3 source a second
+    lossy generation (audible at low 'aac' bitrates). The cover image is
+    attached as-is for JPEG/PNG thumbnails.
+
+    Args:
+        audio_file (str): Path to the merged audio file
+        timestamps (list): Chapter timestamp dicts from merge_audio_files
+        book_name (str): Name of the book
+        output_dir (str): Directory to save the .m4b in
+        thumbnail_file (str, optional): Cover image
+        aac_audio_file (str, optional): Already encoded AAC stream to remux
+        profile (str or dict, optional): Encoding profile; its 'aac' stage applies when encoding
+
+    Returns:
+        str: Path to the .m4b file
+    """
+    print(f"\n--- Creating Chaptered M4B ---")
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, f"{book_name}.m4b")
+    if not aac_audio_file:
+        aac_audio_file = _matching_encoded_aac(audio_file, timestamps)
+    source = aac_audio_file or audio_file
+    remux = bool(aac_audio_file) or os.path.splitext(source)[1].lower() in ('.m4a', '.aac', '.m4b')
+    if remux:
+        print(f"Remuxing {os.path.basename(source)} (no re-encode)")
+    else:
+        print(f"Warning: no encoded AAC stream available; re-encoding all of {os.path.basename(source)} to AAC "
+              f"(a full CPU encode and a second lossy generation; use --encode-once for a remux)")
+
+    metadata_path = write_ffmetadata(book_name, timestamps, f"{output_path}.ffmetadata")
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-i", source, "-i", metadata_path]
+    has_cover = bool(thumbnail_file) and os.path.isfile(thumbnail_file)
+    if has_cover:
+        command += ["-i", thumbnail_file]
+    command += ["-map", "0:a", "-map_metadata", "1", "-map_chapters", "1"]
+    command += ["-c:a", "copy"] if remux else audio_codec_args(stage_settings(profile, 'aac'))
+    if has_cover:
+        cover_is_copyable = os.path.splitext(thumbnail_file)[1].lower() in ('.jpg', '.jpeg', '.png')
+        command += ["-map", "2:v", "-c:v", "copy" if cover_is_copyable else "mjpeg", "-disposition:v:0", "attached_pic"]
+    command += ["-f", "mp4", "-movflags", "+faststart", output_path]
+    try:
+        subprocess.run(command, check=True)
+    finally:
+        os.remove(metadata_path)
+    print(f"Saved M4B with {len(timestamps)} chapters to: {output_path}")
+    return output_path
+
 FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+STILL_VIDEO_FPS = 1 # Frame rate of still-image videos (the picture never changes)
+STILL_VIDEO_KEYFRAME_SECONDS = 10 # Keyframe interval, keeps seeking responsive
+MP4_COPYABLE_AUDIO_EXTENSIONS = ('.m4a', '.aac', '.mp3') # Audio muxed into MP4 without re-encoding
+SHORT_LENGTH = 60 # Seconds of audio per short
+SHORTS_SIZE = "1080x1920"
+SHORTS_FPS = 1 # Shorts are two still frames, like the thumbnail video
+SHORTS_CTA_START = 50 # Second at which the call-to-action text appears
+SHORTS_MAX_WORKERS = min(4, os.cpu_count() or 1) # Concurrent short encodes
 
 def ffmpeg_run(cmd):
     subprocess.run(cmd, shell=True, check=True)
 
-def create_full_video(audio_file, book_name, output_dir):
-    """Create full video with audio and centered text."""
-    audio = AudioFileClip(audio_file)
-    duration = audio.duration
+def create_full_video(audio_file, book_name, output_dir, duration=None, threads=None, profile=None):
+    """
+    Create full video with audio and centered text.
+
+    duration (seconds) is probed from the file if not given; threads caps x264's threads.
+    Encoder settings come from the profile's 'video' and 'aac' stages.
+    """
+    if duration is None:
+        duration = audio_duration_seconds(audio_file)
+    os.makedirs(output_dir, exist_ok=True)
     
     # Create output path with extension
     output_path = os.path.join(output_dir, f"{book_name}_full.mp4")
@@ -170,113 +635,349 @@ def create_full_video(audio_file, book_name, output_dir):
         "-i", f"color=size=1920x1080:duration={duration}:color=black",
         "-i", audio_file,
         "-vf", f"drawtext=fontfile='{FONT}':text='{book_name}':fontsize=70:fontcolor=white:x=(w-text_w)/2:y=(h-text_h)/2",
-        "-c:v", "libx264",
-        "-c:a", "aac",
+        *video_codec_args(stage_settings(profile, 'video'), threads),
+        *audio_codec_args(stage_settings(profile, 'aac')),
         output_path
     ]
     subprocess.run(command, check=True)
     return output_path
 
-def create_shorts(audio_file, book_name, output_dir):
-    """Create vertical shorts from audio."""
-    audio = AudioFileClip(audio_file)
-    duration = audio.duration
+def _shorts_base_filter(book_name):
+    """Per-part layers: 'PART n' (n from the frame number) and the book title."""
+    return (
+        f"drawtext=fontfile='{FONT}':text='PART %{{eif\\:n+1\\:d}}':fontsize=60:fontcolor=white:x=(w-text_w)/2:y=200,"
+        f"drawtext=fontfile='{FONT}':text='{book_name}':fontsize=70:fontcolor=white:x=(w-text_w)/2:y=400"
+    )
+
+def _shorts_cta_filter():
+    """Call-to-action layer shown for the last seconds of every short."""
+    return (
+        f"drawtext=fontfile='{FONT}':text='Visit channel to listen to\\ncomplete audio book':fontsize=50:fontcolor=white:x=(w-text_w)/2:y=600"
+    )
+
+def render_shorts_overlays(book_name, count, work_dir):
+    """
+    Pre-render the still frames of all shorts with two ffmpeg runs.
+
+    Every part gets a frame with 'PART n' and the book title, and a second one
+    with the call-to-action added.
+
+    Returns:
+        tuple: (list of per-part frame PNGs, list of per-part call-to-action frame PNGs).
+    """
+    frame_pattern = os.path.join(work_dir, "part_%04d.png")
+    cta_pattern = os.path.join(work_dir, "part_cta_%04d.png")
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"color=size={SHORTS_SIZE}:rate=1:color=black",
+        "-frames:v", str(count), "-vf", _shorts_base_filter(book_name),
+        "-start_number", "0", frame_pattern
+    ], check=True)
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-start_number", "0", "-i", frame_pattern,
+        "-vf", _shorts_cta_filter(), "-start_number", "0", cta_pattern
+    ], check=True)
+    return [frame_pattern % i for i in range(count)], [cta_pattern % i for i in range(count)]
+
+def segment_shorts_audio(audio_file, work_dir, profile=None):
+    """Cut the book into SHORT_LENGTH-second AAC segments in one decoding pass."""
+    segment_pattern = os.path.join(work_dir, "segment_%04d.m4a")
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", audio_file, "-map", "0:a",
+        *audio_codec_args(stage_settings(profile, 'aac')), "-f", "segment", "-segment_time", str(SHORT_LENGTH),
+        "-reset_timestamps", "1", segment_pattern
+    ], check=True)
+    return sorted(glob.glob(os.path.join(work_dir, "segment_*.m4a")))
+
+def _encode_short(frame_path, cta_frame_path, segment_path, length, out, threads, profile=None):
+    """Encode one short: its two still frames, switching at SHORTS_CTA_START, over its audio segment."""
+    cta_start = min(SHORTS_CTA_START, length)
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-loop", "1", "-framerate", str(SHORTS_FPS), "-t", str(cta_start), "-i", frame_path,
+        "-loop", "1", "-framerate", str(SHORTS_FPS), "-t", str(max(length - cta_start, 1 / SHORTS_FPS)), "-i", cta_frame_path,
+        "-i", segment_path,
+        "-filter_complex", "[0:v][1:v]concat=n=2:v=1,format=yuv420p[v]",
+        "-map", "[v]", "-map", "2:a",
+        *video_codec_args(stage_settings(profile, 'shorts'), threads), "-tune", "stillimage",
+        "-c:a", "copy", "-t", str(length), "-movflags", "+faststart", out
+    ], check=True)
+    return out
+
+def create_shorts(audio_file, book_name, output_dir, single_pass=True, max_workers=None, duration=None, cpu_budget=None, profile=None):
+    """
+    Create vertical shorts from audio.
+
+    In single-pass mode (default) the book is decoded once and cut into AAC
+    segments, the text layers of every part are rendered once as still frames,
+    and the shorts are encoded at SHORTS_FPS with x264's stillimage tuning on a
+    pool of at most max_workers ffmpeg processes (default SHORTS_MAX_WORKERS),
+    sharing cpu_budget CPUs (default: all) between them.
+
+    Args:
+        single_pass (bool): False runs one full ffmpeg render per short, seeking
+            into the book each time (previous behaviour).
+        duration (float, optional): Book length in seconds; probed from the file if not given.
+        profile (str or dict, optional): Encoding profile; the 'shorts' stage sets x264,
+            the 'aac' stage the audio segments. The per-short loop ignores it.
+    """
+    if duration is None:
+        duration = audio_duration_seconds(audio_file)
     os.makedirs(output_dir, exist_ok=True)
-    n = math.ceil(duration/60)
+    n = math.ceil(duration/SHORT_LENGTH)
     shorts_paths = []
-    
-    for i in range(n):
-        start = i*60
-        out = os.path.join(output_dir, f"{book_name}_short_{i+1}.mp4")
-        vf = (
-            f"drawtext=fontfile='{FONT}':text='PART {i+1}':fontsize=60:fontcolor=white:x=(w-text_w)/2:y=200,"
-            f"drawtext=fontfile='{FONT}':text='{book_name}':fontsize=70:fontcolor=white:x=(w-text_w)/2:y=400,"
-            f"drawtext=fontfile='{FONT}':text='Visit channel to listen to\\ncomplete audio book':fontsize=50:fontcolor=white:x=(w-text_w)/2:y=600:enable='gte(t,50)'"
-        )
-        cmd = (
-            f"ffmpeg -y -f lavfi -i \"color=size=1080x1920:duration=60:color=black\" "
-            f"-ss {start} -i \"{audio_file}\" -t 60 -vf \"{vf}\" "
-            f"-c:v libx264 -preset fast -c:a aac \"{out}\""
-        )
-        ffmpeg_run(cmd)
-        shorts_paths.append(out)
-    
+
+    if not single_pass:
+        for i in range(n):
+            start = i*SHORT_LENGTH
+            out = os.path.join(output_dir, f"{book_name}_short_{i+1}.mp4")
+            vf = (
+                f"drawtext=fontfile='{FONT}':text='PART {i+1}':fontsize=60:fontcolor=white:x=(w-text_w)/2:y=200,"
+                f"drawtext=fontfile='{FONT}':text='{book_name}':fontsize=70:fontcolor=white:x=(w-text_w)/2:y=400,"
+                f"{_shorts_cta_filter()}:enable='gte(t,{SHORTS_CTA_START})'"
+            )
+            cmd = (
+                f"ffmpeg -y -f lavfi -i \"color=size={SHORTS_SIZE}:duration={SHORT_LENGTH}:color=black\" "
+                f"-ss {start} -i \"{audio_file}\" -t {SHORT_LENGTH} -vf \"{vf}\" "
+                f"-c:v libx264 -preset fast -c:a aac \"{out}\""
+            )
+            ffmpeg_run(cmd)
+            shorts_paths.append(out)
+        return shorts_paths
+
+    cpus = cpu_budget or os.cpu_count() or 1
+    workers = max(1, min(max_workers or SHORTS_MAX_WORKERS, n, cpus))
+    threads = max(1, cpus // workers)
+    with tempfile.TemporaryDirectory(dir=output_dir) as work_dir:
+        segments = segment_shorts_audio(audio_file, work_dir, profile)[:n] # Drops a trailing sliver from encoder padding
+        frames, cta_frames = render_shorts_overlays(book_name, len(segments), work_dir)
+        print(f"  Encoding {len(segments)} shorts with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for i, segment_path in enumerate(segments):
+                out = os.path.join(output_dir, f"{book_name}_short_{i+1}.mp4")
+                length = min(SHORT_LENGTH, duration - i*SHORT_LENGTH)
+                futures.append(executor.submit(_encode_short, frames[i], cta_frames[i], segment_path, length, out, threads, profile))
+            shorts_paths = [future.result() for future in futures]
+
     return shorts_paths
 
-def create_full_video_with_thumbnails(audio_file, thumbnail_file, book_name, output_dir):
-    """Create full video with audio, thumbnail image, and centered text."""
-    audio = AudioFileClip(audio_file)
-    duration = audio.duration
-    
-    # Create output path with extension
-    output_path = os.path.join(output_dir, f"{book_name}_full_thumbnail.mp4")
-    
+def thumbnail_video_filter(book_name):
+    """Filter chain that fits the thumbnail into a 1920x1080 frame and burns in the title."""
+    return (
+        f"scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2:black,"
+        f"drawtext=fontfile='{FONT}':text='{book_name}':fontsize=70:fontcolor=white:x=(w-text_w)/2:y=h-150"
+    )
+
+def render_thumbnail_frame(thumbnail_file, book_name, frame_path):
+    """Composite the scaled thumbnail and burned-in title once, as a lossless PNG."""
     command = [
-        "ffmpeg", "-y",
-        "-loop", "1",
+        "ffmpeg", "-y", "-loglevel", "error",
         "-i", thumbnail_file,
-        "-i", audio_file,
-        "-c:v", "libx264",
-        "-c:a", "aac",
-        "-t", str(duration),
-        "-pix_fmt", "yuv420p",
-        "-vf", f"scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2:black,drawtext=fontfile='{FONT}':text='{book_name}':fontsize=70:fontcolor=white:x=(w-text_w)/2:y=h-150",
-        output_path
+        "-vf", thumbnail_video_filter(book_name),
+        "-frames:v", "1",
+        frame_path
     ]
     subprocess.run(command, check=True)
-    return output_path
+    return frame_path
+
+def create_full_video_with_thumbnails(audio_file, thumbnail_file, book_name, output_dir, aac_audio_file=None, still_image=True, duration=None, threads=None, profile=None):
+    """
+    Create full video with audio, thumbnail image, and centered text.
+
+    In still-image mode (default) the frame is composited once by
+    render_thumbnail_frame and then encoded at STILL_VIDEO_FPS with x264's
+    stillimage tuning, instead of running scale/pad/drawtext and encoding
+    1920x1080 frames at 25 fps for the whole book. Audio that MP4 can carry
+    as-is (AAC or mp3) is muxed with -c:a copy; anything else is encoded to AAC.
+
+    If aac_audio_file (an already encoded AAC stream, e.g. from StreamingBookEncoder)
+    is given, it is used instead of audio_file.
 
-def process_output(thumbnail_path, chapter_audio_dir, book_name, output_base_dir='io/output_pool', format='wav'):
+    Args:
+        still_image (bool): False renders every frame through the filter chain (previous behaviour).
+        duration (float, optional): Book length in seconds; probed from the file if not given.
+        threads (int, optional): Caps x264's threads (default: the profile's, else ffmpeg's choice).
+        profile (str or dict, optional): Encoding profile ('video' and 'aac' stages).
     """
-    Process the chapter audio files into the final audiobook structure.
+    audio_source = aac_audio_file or audio_file
+    if duration is None:
+        duration = audio_duration_seconds(audio_source)
     
+    # Create output path with extension
+    output_path = os.path.join(output_dir, f"{book_name}_full_thumbnail.mp4")
+    copy_audio = bool(aac_audio_file) or os.path.splitext(audio_source)[1].lower() in MP4_COPYABLE_AUDIO_EXTENSIONS
+
+    if not still_image:
+        command = [
+            "ffmpeg", "-y",
+            "-loop", "1",
+            "-i", thumbnail_file,
+            "-i", audio_source,
+            *video_codec_args(stage_settings(profile, 'video'), threads),
+            *(["-c:a", "copy"] if aac_audio_file else audio_codec_args(stage_settings(profile, 'aac'))),
+            "-t", str(duration),
+            "-pix_fmt", "yuv420p",
+            "-vf", thumbnail_video_filter(book_name),
+            output_path
+        ]
+        subprocess.run(command, check=True)
+        return output_path
+
+    frame_path = f"{output_path}.frame.png"
+    try:
+        render_thumbnail_frame(thumbnail_file, book_name, frame_path)
+        command = [
+            "ffmpeg", "-y",
+            "-loop", "1", "-framerate", str(STILL_VIDEO_FPS),
+            "-i", frame_path,
+            "-i", audio_source,
+            "-map", "0:v", "-map", "1:a",
+            *video_codec_args(stage_settings(profile, 'video'), threads), "-tune", "stillimage",
+            "-r", str(STILL_VIDEO_FPS), "-g", str(STILL_VIDEO_FPS * STILL_VIDEO_KEYFRAME_SECONDS),
+            "-pix_fmt", "yuv420p",
+            *(["-c:a", "copy"] if copy_audio else audio_codec_args(stage_settings(profile, 'aac'))),
+            "-t", str(duration),
+            "-movflags", "+faststart",
+            output_path
+        ]
+        subprocess.run(command, check=True)
+    finally:
+        if os.path.exists(frame_path):
+            os.remove(frame_path)
+    return output_path
+
+def process_output(thumbnail_path, chapter_audio_dir, book_name, output_base_dir='io/output_pool', format='wav', encoded_audio=None, m4b=False, full_video=False, shorts=False, cpu_budget=None, profile=None,
+                   submitted_at=None, latency=None, chapter_format=None):
+    """
+    Process the chapter audio files into final outputs.
+
+    After the merge, metadata, subtitles, the M4B, the thumbnail video and
+    (optionally) the plain video and shorts run concurrently as a task graph, limited to
+    cpu_budget CPUs. Video encoders split the budget between them. Per-task
+    timings are saved as 'output_timings' in the book's metadata, and the
+    peak RSS of every stage seen so far (core.services.memory) as 'memory'.
+    With submitted_at, the time to first audio (the preview's, from latency,
+    or else the full book's) is saved as 'latency'.
+
     Args:
-        chapter_audio_dir (str): Directory containing individual chapter audio files
+        thumbnail_path (str): Path to the thumbnail image
+        chapter_audio_dir (str): Directory containing chapter audio files
         book_name (str): Name of the book
         output_base_dir (str): Base directory for all output
         format (str): Audio format to use (wav or mp3)
+        encoded_audio (dict, optional): Result of StreamingBookEncoder.close(). When given,
+            the book was encoded once during synthesis: merging is skipped and the
+            encoder's AAC stream is remuxed into the video.
+        m4b (bool): Also emit a chaptered .m4b (chapter atoms, title, thumbnail as cover)
+            into io/output_pool/book/<name>, remuxing the encoded AAC stream when available.
+            It is rendered next to the merged audio and moved into the store, never
+            written through a link in the book directory.
+        full_video (bool): Also render the plain full video into io/output_pool/videos.
+        shorts (bool): Also render shorts into io/output_pool/shorts.
+        cpu_budget (int, optional): CPUs the output stage may use (default: all).
+        profile (str or dict, optional): Encoding profile name, or {stage: profile name}
+            (see core.services.profiles); default 'standard'.
+        submitted_at (float, optional): time.time() when the book was submitted.
+        latency (dict, optional): PreviewPublisher.wait() of a preview published earlier.
+        chapter_format (str, optional): Extension the chapters were synthesized in (e.g. '.flac');
+            only chapters in that format are merged.
     
     Returns:
         str: Path to the final book directory
     """
     try:
-        # 1. Merge audio files
-        merged_audio_file = os.path.join(output_base_dir, 'book_audio', f'{book_name}.{format}')
-        timestamps = merge_audio_files(chapter_audio_dir, merged_audio_file, format)
-        
-        # 2. Create metadata and timestamp files
-        metadata_file, timestamp_file = create_metadata(
-            book_name, timestamps, output_base_dir
-        )
-        
-        # 3. Organize final files
+        budget = cpu_budget or DEFAULT_CPU_BUDGET
+        aac_audio_file = encoded_audio.get('aac_file') if encoded_audio else None
+        book_audio_dir = os.path.join(output_base_dir, 'book_audio')
+        video_threads = max(1, budget // (1 + full_video + shorts))
+
+        # 1. Merge audio files (already done by the streaming encoder in encode-once mode)
+        def merge():
+            if encoded_audio:
+                print(f"\n--- Using encode-once audio: {encoded_audio['audio_file']} ---")
+                return encoded_audio['audio_file'], encoded_audio['timestamps']
+            merged_audio_file = os.path.join(book_audio_dir, f'{book_name}.{format}')
+            return merged_audio_file, merge_audio_files(chapter_audio_dir, merged_audio_file, format, profile=profile,
+                                                         chapter_format=chapter_format)
+
+        def duration_of(merge):
+            # Known from the timestamps, no probe needed
+            return audio_duration_seconds(*merge)
+
+        tasks = [
+            Task('merge', merge, cpus=0 if encoded_audio else 1),
+            # 2. Create metadata and timestamp files
+            Task('metadata', lambda merge: create_metadata(book_name, merge[1], output_base_dir),
+                 deps=['merge'], cpus=0),
+            Task('subtitles', lambda merge: create_subtitles(
+                book_name, merge[1], os.path.join(output_base_dir, 'subtitles'),
+                chapter_audio_dir=chapter_audio_dir, encoded_audio=encoded_audio
+            ), deps=['merge'], cpus=0),
+            # 3. Full video with thumbnail
+            Task('thumbnail_video', lambda merge: create_full_video_with_thumbnails(
+                merge[0], thumbnail_path, book_name, output_base_dir,
+                aac_audio_file=aac_audio_file, duration=duration_of(merge), threads=video_threads,
+                profile=profile
+            ), deps=['merge'], cpus=video_threads),
+        ]
+        # 4. Chaptered M4B (a remux when an encode-once AAC stream exists)
+        if m4b:
+            tasks.append(Task('m4b', lambda merge: create_m4b_audiobook(
+                merge[0], merge[1], book_name, book_audio_dir,
+                thumbnail_file=thumbnail_path, aac_audio_file=aac_audio_file, profile=profile
+            ), deps=['merge'], cpus=0 if aac_audio_file else 1))
+        # 5. Plain full video
+        if full_video:
+            tasks.append(Task('full_video', lambda merge: create_full_video(
+                merge[0], book_name, os.path.join(output_base_dir, 'videos'),
+                duration=duration_of(merge), threads=video_threads, profile=profile
+            ), deps=['merge'], cpus=video_threads))
+        # 6. Shorts
+        if shorts:
+            tasks.append(Task('shorts', lambda merge: create_shorts(
+                merge[0], book_name, os.path.join(output_base_dir, 'shorts'),
+                duration=duration_of(merge), cpu_budget=video_threads, profile=profile
+            ), deps=['merge'], cpus=video_threads))
+
+        with governor.stage('output'):
+            results, timings = run_task_graph(tasks, budget)
+        merged_audio_file, _ = results['merge']
+        metadata_file, timestamp_file = results['metadata']
+        memory = governor.report()
+        fields = {'output_timings': timings, 'memory': memory}
+        if submitted_at:
+            # Without a preview the published book is the first audio (its metadata is written just before)
+            fields['latency'] = dict(latency or {'time_to_first_audio': round(time.time() - submitted_at, 2)})
+            fields['latency']['time_to_full_book'] = round(time.time() - submitted_at, 2)
+        update_metadata(metadata_file, fields)
+
+        # 7. Organize final files
         final_book_dir = organize_final_files(
             book_name,
             merged_audio_file,
             metadata_file,
             timestamp_file,
-            os.path.join(output_base_dir, 'book')
+            os.path.join(output_base_dir, 'book'),
+            extra_files=([results['m4b']] if m4b else []) + results['subtitles']
         )
         
-        # 4. Generate full video
-        # video_dir = os.path.join(output_base_dir, 'videos')
-        # os.makedirs(video_dir, exist_ok=True)
-        # video_path = create_full_video(merged_audio_file, book_name, video_dir)
-        
-        # 5. Generate shorts
-        # shorts_dir = os.path.join(output_base_dir, 'shorts')
-        # os.makedirs(shorts_dir, exist_ok=True)
-        # shorts_paths = create_shorts(merged_audio_file, book_name, shorts_dir)
-
-        # 6. Generate full video with thumbnail
-        video_path = create_full_video_with_thumbnails(merged_audio_file, thumbnail_path, book_name, output_base_dir)
-        
+        total = timings.pop('_total')
         print(f"\n=== Output Processing Complete ===")
+        for name, timing in timings.items():
+            print(f"  {name:<16} {timing['seconds']:8.1f}s  ({timing['cpus']} cpu)")
+        print(f"  wall {total['seconds']:.1f}s for {total['task_seconds']:.1f}s of tasks, budget {total['cpu_budget']} cpu")
+        if submitted_at: print(f"  time to first audio {fields['latency']['time_to_first_audio']:.1f}s, full book {fields['latency']['time_to_full_book']:.1f}s")
+        print("  peak RSS: " + ", ".join(f"{name} {peak:.0f} MB" for name, peak in memory['stage_peak_mb'].items()))
         print(f"Final book directory: {final_book_dir}")
-        print(f"Full video: {video_path}")
-        # print(f"Shorts generated: {len(shorts_paths)}")
+        print(f"Full video: {results['thumbnail_video']}")
+        if m4b: print(f"M4B audiobook: {os.path.join(final_book_dir, os.path.basename(results['m4b']))}")
+        if full_video: print(f"Plain video: {results['full_video']}")
+        if shorts: print(f"Shorts generated: {len(results['shorts'])}")
         return final_book_dir
         
     except Exception as e:
         print(f"Error processing output: {e}")
-        raise
\ No newline at end of file
+        raise